@@ -0,0 +1,286 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Optional, List, Dict, Any
+from urllib.parse import urlparse
+
+from sqlalchemy import select, update
+
+from database import SessionLocal, ensure_db
+from models import Alert, ScrapedTender, utcnow
+from page_cache import normalize_url
+from scraper_engine import scrape_dynamic_page, search_portal_keywords
+from tender_store import _insert_for, tender_fields, tender_hash
+
+logger = logging.getLogger(__name__)
+
+# Saved alerts are checked every ALERT_INTERVAL seconds (0 disables the monitor). All
+# alerts on one portal share a single session: each keyword goes through the portal's
+# native search with a random pause of up to ALERT_KEYWORD_PAUSE seconds between them.
+# Alerts with a max_depth above 1 also crawl the pages the result page links to.
+# Portal runs start after a random delay of up to ALERT_JITTER seconds and at most
+# ALERT_CONCURRENCY portals are searched at once.
+ALERT_INTERVAL = float(os.getenv("ALERT_INTERVAL", "3600"))
+ALERT_JITTER = float(os.getenv("ALERT_JITTER", "60"))
+ALERT_CONCURRENCY = int(os.getenv("ALERT_CONCURRENCY", "2"))
+ALERT_KEYWORD_PAUSE = float(os.getenv("ALERT_KEYWORD_PAUSE", "3"))
+HISTORY_LIMIT = 500
+
+
+def _alert_dict(alert: Alert) -> Dict[str, Any]:
+    return {
+        "id": alert.id,
+        "email": alert.email,
+        "keyword": alert.keyword,
+        "url": alert.url,
+        "max_depth": alert.max_depth,
+        "created_at": alert.created_at.isoformat() if alert.created_at else None,
+    }
+
+
+def list_alerts() -> List[Dict[str, Any]]:
+    ensure_db()
+    with SessionLocal() as session:
+        return [_alert_dict(a) for a in session.scalars(select(Alert).order_by(Alert.id))]
+
+
+def create_alert(email: str, keyword: str, url: str, max_depth: Optional[int] = 1) -> Dict[str, Any]:
+    ensure_db()
+    with SessionLocal() as session:
+        alert = Alert(email=email.strip(), keyword=keyword.strip(), url=url.strip(), max_depth=max_depth)
+        session.add(alert)
+        session.commit()
+        return _alert_dict(alert)
+
+
+def delete_alert(alert_id: int) -> bool:
+    ensure_db()
+    with SessionLocal() as session:
+        alert = session.get(Alert, alert_id)
+        if alert is None:
+            return False
+        # Tenders it found stay in the history
+        session.execute(update(ScrapedTender).where(ScrapedTender.alert_id == alert_id).values(alert_id=None))
+        session.delete(alert)
+        session.commit()
+        return True
+
+
+def recent_history(limit: int = HISTORY_LIMIT) -> List[Dict[str, Any]]:
+    """Tenders found by alerts, newest first, with the keyword that found them."""
+    ensure_db()
+    with SessionLocal() as session:
+        rows = session.execute(
+            select(ScrapedTender, Alert.keyword)
+            .outerjoin(Alert, ScrapedTender.alert_id == Alert.id)
+            .order_by(ScrapedTender.found_at.desc(), ScrapedTender.id.desc())
+            .limit(limit)
+        ).all()
+        return [
+            {
+                "id": tender.id,
+                "alert_id": tender.alert_id,
+                "keyword": keyword,
+                "tender_title": tender.tender_title,
+                "found_url": tender.found_url,
+                "found_at": tender.found_at.isoformat() if tender.found_at else None,
+            }
+            for tender, keyword in rows
+        ]
+
+
+def record_hits(url: str, alerts: List[Dict[str, Any]], hits: Dict[str, List[Dict[str, Any]]]) -> int:
+    """
+    Record the rows found for each alert's keyword in `scraped_tenders`, skipping any
+    tender_hash already recorded (by this or another alert, including one on another
+    URL of the same portal checked at the same time). Returns the number of new tenders.
+    """
+    portal = urlparse(url).netloc.lower()
+    candidates: Dict[str, Dict[str, Any]] = {}
+    for alert in alerts:
+        for row in hits.get(alert["keyword"], []):
+            fields = tender_fields(row, row.get("_details"))
+            key = tender_hash(portal, fields, row)
+            if key in candidates:
+                continue
+            title = fields["title"] or " ".join(str(v) for k, v in row.items() if not k.startswith('_'))
+            candidates[key] = {
+                "alert_id": alert["id"],
+                "tender_hash": key,
+                "tender_title": title,
+                "found_url": (fields["url"] or url)[:500],
+                "found_at": utcnow(),
+            }
+    if not candidates:
+        return 0
+
+    ensure_db()
+    added = 0
+    with SessionLocal() as session:
+        known = set()
+        hashes = list(candidates)
+        for start in range(0, len(hashes), 500):
+            known.update(session.scalars(
+                select(ScrapedTender.tender_hash).where(ScrapedTender.tender_hash.in_(hashes[start:start + 500]))
+            ))
+        dialect = session.get_bind().dialect.name
+        insert = _insert_for(dialect)
+        for key, tender in candidates.items():
+            if key in known:
+                continue
+            # A concurrent check of the same portal may have recorded it since the lookup
+            stmt = insert(ScrapedTender.__table__).values(**tender)
+            if dialect in ("mysql", "mariadb"):
+                stmt = stmt.prefix_with("IGNORE")
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=["tender_hash"])
+            if session.execute(stmt).rowcount:
+                added += 1
+                logger.info(f"New tender for alert {tender['alert_id']}: {tender['tender_title'][:120]}")
+        session.commit()
+    return added
+
+
+async def _crawl_keywords(url: str, keywords: List[str], max_depth: int) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Like search_portal_keywords, but each keyword's search result is crawled to
+    `max_depth`: returns the exactly matching rows of every page reached, per keyword.
+    """
+    result = await scrape_dynamic_page(url, search_keywords=keywords, max_depth=max_depth, keyword_concurrency=1)
+    hits: Dict[str, List[Dict[str, Any]]] = {}
+    for keyword, crawl in result.get("keywords", {}).items():
+        if "error" in crawl:
+            logger.error(f"Crawl for {keyword!r} on {url} failed")
+            continue
+        hits[keyword] = [row for page in crawl["pages"] for table in page["extracted_tables"] for row in table["data"]]
+        logger.info(f"Crawl for {keyword!r} on {url} (depth {max_depth}): {len(hits[keyword])} matching rows")
+    return hits
+
+
+class AlertMonitor:
+    """
+    Background scheduler for saved alerts. Each run groups the alerts by portal URL and
+    searches every portal once, all of its keywords in one session, so N alerts on a
+    portal cost one browser context rather than N crawls.
+    """
+
+    def __init__(
+        self,
+        interval: float = ALERT_INTERVAL,
+        jitter: float = ALERT_JITTER,
+        concurrency: int = ALERT_CONCURRENCY,
+        keyword_pause: float = ALERT_KEYWORD_PAUSE,
+    ):
+        self.interval = interval
+        self.jitter = jitter
+        self.keyword_pause = keyword_pause
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+        self._task: Optional[asyncio.Task] = None
+        self._manual: Optional[asyncio.Task] = None
+        self._run_lock = asyncio.Lock()
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    async def start(self):
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+        return self
+
+    async def close(self):
+        tasks = [t for t in (self._task, self._manual) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = self._manual = None
+
+    @property
+    def running(self) -> bool:
+        return self._run_lock.locked() or (self._manual is not None and not self._manual.done())
+
+    def trigger(self) -> bool:
+        """Start a run now, in the background and without jitter. False if one is already running."""
+        if self.running:
+            return False
+        self._manual = asyncio.create_task(self.run_once(jitter=0))
+        return True
+
+    async def run_once(self, jitter: Optional[float] = None) -> Dict[str, Any]:
+        """Check every saved alert now. Returns a summary of the run."""
+        async with self._run_lock:
+            started = time.time()
+            alerts = await asyncio.to_thread(list_alerts)
+            by_portal: Dict[str, List[Dict[str, Any]]] = {}
+            for alert in alerts:
+                by_portal.setdefault(normalize_url(alert["url"]), []).append(alert)
+
+            jitter = self.jitter if jitter is None else jitter
+            found = await asyncio.gather(
+                *(self._check_portal(url, portal_alerts, jitter) for url, portal_alerts in by_portal.items()),
+                return_exceptions=True,
+            )
+            for url, outcome in zip(by_portal, found):
+                if isinstance(outcome, Exception):
+                    logger.error(f"Alert check for {url} failed: {outcome}")
+            self.last_run = {
+                "started_at": started,
+                "duration_s": round(time.time() - started, 1),
+                "alerts": len(alerts),
+                "portals": len(by_portal),
+                "new_tenders": sum(n for n in found if isinstance(n, int)),
+            }
+            logger.info(f"Alert run finished: {self.last_run}")
+            return self.last_run
+
+    async def _check_portal(self, url: str, alerts: List[Dict[str, Any]], jitter: float) -> int:
+        # Spread portal visits out so scheduled runs do not hit every portal at once
+        await asyncio.sleep(random.uniform(0, jitter))
+        by_depth: Dict[int, List[str]] = {}
+        for alert in alerts:
+            keywords = by_depth.setdefault(max(1, alert["max_depth"] or 1), [])
+            if alert["keyword"] not in keywords:
+                keywords.append(alert["keyword"])
+        hits: Dict[str, List[Dict[str, Any]]] = {}
+        async with self._slots:
+            logger.info(f"Checking {len(alerts)} alerts on {url} (depths {sorted(by_depth)})")
+            for depth, keywords in sorted(by_depth.items()):
+                if depth == 1:
+                    found = await search_portal_keywords(
+                        alerts[0]["url"], keywords, keyword_pause=(0.0, self.keyword_pause)
+                    )
+                else:
+                    found = await _crawl_keywords(alerts[0]["url"], keywords, depth)
+                for keyword, rows in found.items():
+                    hits.setdefault(keyword, []).extend(rows)
+        return await asyncio.to_thread(record_hits, url, alerts, hits)
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Alert run failed: {e}", exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "interval_s": self.interval,
+            "running": self.running,
+            "last_run": self.last_run,
+        }
+
+
+_default_monitor: Optional[AlertMonitor] = None
+
+
+def set_default_alert_monitor(monitor: Optional[AlertMonitor]):
+    """Install the alert monitor owned by the application lifespan."""
+    global _default_monitor
+    _default_monitor = monitor
+
+
+def get_alert_monitor() -> AlertMonitor:
+    global _default_monitor
+    if _default_monitor is None:
+        _default_monitor = AlertMonitor()
+    return _default_monitor
@@ -0,0 +1,284 @@
+"""
+Offline extraction benchmark over the captured portal pages in tender_cache/ and
+debug_search.html. No browser or network is used.
+
+Each extractor runs on every page of the corpus:
+  listing       page snapshot + table filtering, as scrape_dynamic_page does for a crawled page
+  listing_dom   the same, with the snapshot taken by the in-page script (EXTRACTION_MODE=dom)
+                run in Node over the parsed page (benchmark_dom_shim.js); its output must
+                equal listing's. Skipped when `node` is not installed
+  detail_pairs  the clean field pairs _fetch_tender_page_details pre-fetches for a row
+  detail_full   every field fetch_tender_details_dict extracts from a tender page
+
+For each extractor it reports pages/s, ms per page (mean and p95) and the peak traced
+memory of one pass. Outputs are compared with the golden file, and throughput with a
+baseline saved on this machine.
+
+    python benchmark.py                      # check goldens (and throughput if a baseline exists)
+    python benchmark.py --update-golden      # accept the current outputs
+    python benchmark.py --update-baseline    # record this machine's throughput
+    python benchmark.py --parser html.parser --repeat 5 --max-regression 0.3
+
+Exits with status 1 when an output differs from its golden or throughput falls more
+than --max-regression below the baseline.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Optional, List, Dict, Any, Callable, Tuple
+
+from bs4 import CData, Comment, Doctype, NavigableString, Tag
+
+from html_parsing import PARSER_BACKEND, make_soup
+from junk_filter import junk_rules
+from page_snapshot import _DOM_SNAPSHOT_JS, _expand_cells, snapshot_from_html
+from scraper_engine import _build_tables, _extract_detail_pairs, _extract_tender_details
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS = sorted(glob.glob(os.path.join(HERE, "tender_cache", "*.html"))) + [os.path.join(HERE, "debug_search.html")]
+GOLDEN_FILE = os.path.join(HERE, "benchmark_golden.json")
+BASELINE_FILE = os.path.join(HERE, "benchmark_baseline.json")
+DOM_SHIM = os.path.join(HERE, "benchmark_dom_shim.js")
+NODE = shutil.which("node")
+# The captures come from etenders.gov.in; its junk rules and link base apply
+PORTAL_URL = "https://etenders.gov.in/eprocure/app"
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _listing_summary(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    tables, _ = _build_tables(snapshot["tables"], PORTAL_URL, junk_rules(PORTAL_URL))
+    return {
+        "tables": len(tables),
+        "rows": [t["row_count"] for t in tables],
+        "digest": _digest([t["data"] for t in tables]),
+        "page": _digest({k: snapshot[k] for k in ("title", "description", "text", "links", "base_href", "captcha")}),
+    }
+
+
+def extract_listing(content: str, parser: str) -> Dict[str, Any]:
+    return _listing_summary(snapshot_from_html(content, parser))
+
+
+_TEXT_NODES = {"NavigableString", "Script", "Stylesheet", "TemplateString", "RubyTextString", "RubyParenthesisString"}
+
+
+def _dom_node(node) -> Dict[str, Any]:
+    """A parsed node in benchmark_dom_shim.js's tree format."""
+    if isinstance(node, Tag):
+        attrs = {k: " ".join(v) if isinstance(v, list) else v for k, v in node.attrs.items()}
+        return {"k": 1, "n": node.name, "a": attrs, "c": [_dom_node(c) for c in node.contents]}
+    if isinstance(node, Comment):
+        return {"k": 8, "v": str(node)}
+    if isinstance(node, Doctype):
+        return {"k": 10}
+    if isinstance(node, CData):
+        return {"k": 4, "v": str(node)}
+    # Script, style, template and ruby strings are text nodes to the DOM too
+    if isinstance(node, NavigableString) and type(node).__name__ in _TEXT_NODES:
+        return {"k": 3, "v": str(node)}
+    return {"k": 7, "v": str(node)}  # Processing instructions and declarations
+
+
+_shim: Optional[subprocess.Popen] = None
+
+
+def _dom_snapshot(content: str, parser: str) -> Dict[str, Any]:
+    """Run the in-page snapshot script over `content` parsed by `parser`, in the Node shim."""
+    global _shim
+    if _shim is None:
+        _shim = subprocess.Popen([NODE, DOM_SHIM], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    soup = make_soup(content, parser)
+    junk = junk_rules(PORTAL_URL)
+    request = {
+        "script": _DOM_SNAPSHOT_JS,
+        "args": {"layoutPatterns": junk.layout.patterns, "layoutClasses": junk.layout_table_classes},
+        "tree": [_dom_node(c) for c in soup.contents],
+        "html": content,
+        "title": " ".join(soup.title.get_text().split()) if soup.title else "",
+    }
+    _shim.stdin.write(json.dumps(request) + "\n")
+    _shim.stdin.flush()
+    snapshot = json.loads(_shim.stdout.readline())
+    snapshot.pop("html_length")
+    return _expand_cells(snapshot)
+
+
+def extract_listing_dom(content: str, parser: str) -> Dict[str, Any]:
+    return _listing_summary(_dom_snapshot(content, parser))
+
+
+def extract_detail_pairs(content: str, parser: str) -> Dict[str, Any]:
+    return _extract_detail_pairs(content, parser, PORTAL_URL)
+
+
+def extract_detail_full(content: str, parser: str) -> Dict[str, Any]:
+    fields = _extract_tender_details(content, parser)
+    return {"fields": len(fields), "digest": _digest(fields)}
+
+
+EXTRACTORS: Dict[str, Callable[[str, str], Dict[str, Any]]] = {
+    "listing": extract_listing,
+    "listing_dom": extract_listing_dom,
+    "detail_pairs": extract_detail_pairs,
+    "detail_full": extract_detail_full,
+}
+# Extractors checked against another extractor's golden outputs
+GOLDEN_OF = {"listing_dom": "listing"}
+
+
+def load_corpus() -> Dict[str, str]:
+    pages = {}
+    for path in CORPUS:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def run_extractor(
+    extract: Callable[[str, str], Dict[str, Any]],
+    pages: Dict[str, str],
+    parser: str,
+    repeat: int,
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """Time `repeat` passes over the corpus, then trace one more for peak memory. Returns (stats, outputs)."""
+    outputs = {name: extract(content, parser) for name, content in pages.items()}  # Warm-up pass
+    per_page: List[float] = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for content in pages.values():
+            page_started = time.perf_counter()
+            extract(content, parser)
+            per_page.append(time.perf_counter() - page_started)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for content in pages.values():
+        extract(content, parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_page.sort()
+    stats = {
+        "pages": len(per_page),
+        "pages_per_s": round(len(per_page) / elapsed, 1),
+        "ms_per_page": round(1000 * statistics.mean(per_page), 2),
+        "p95_ms": round(1000 * per_page[int(0.95 * (len(per_page) - 1))], 2),
+        "peak_mb": round(peak / 1e6, 1),
+    }
+    return stats, outputs
+
+
+def compare_golden(outputs: Dict[str, Dict[str, Any]], golden: Dict[str, Any]) -> List[str]:
+    """Differences between this run's outputs and the golden ones, one line each."""
+    problems = []
+    for extractor, pages in outputs.items():
+        expected = golden.get(GOLDEN_OF.get(extractor, extractor))
+        if expected is None:
+            problems.append(f"{extractor}: no golden outputs (run with --update-golden)")
+            continue
+        for name in sorted(set(pages) | set(expected)):
+            if pages.get(name) != expected.get(name):
+                problems.append(f"{extractor}: {name} differs: got {pages.get(name)!r:.200}, expected {expected.get(name)!r:.200}")
+    return problems
+
+
+def compare_baseline(stats: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    problems = []
+    for extractor, current in stats.items():
+        before = baseline.get(extractor)
+        if before is None:
+            continue
+        floor = before["pages_per_s"] * (1 - max_regression)
+        if current["pages_per_s"] < floor:
+            problems.append(
+                f"{extractor}: {current['pages_per_s']} pages/s is below {floor:.1f} "
+                f"({before['pages_per_s']} baseline - {max_regression:.0%})"
+            )
+    return problems
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path: str, data: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = argparse.ArgumentParser(description="Offline extraction benchmark over tender_cache/")
+    args.add_argument("--parser", default=PARSER_BACKEND, help="BeautifulSoup backend (default PARSER_BACKEND)")
+    args.add_argument("--repeat", type=int, default=3, help="Timed passes over the corpus per extractor")
+    args.add_argument("--only", choices=sorted(EXTRACTORS), action="append", help="Run only these extractors")
+    args.add_argument("--max-regression", type=float, default=0.25, help="Allowed pages/s drop below the baseline")
+    args.add_argument("--golden", default=GOLDEN_FILE)
+    args.add_argument("--baseline", default=BASELINE_FILE)
+    args.add_argument("--update-golden", action="store_true", help="Save this run's outputs as the golden ones")
+    args.add_argument("--update-baseline", action="store_true", help="Save this run's throughput as the baseline")
+    opts = args.parse_args(argv)
+
+    logging.disable(logging.WARNING)  # The extractors log per page
+    pages = load_corpus()
+    stats: Dict[str, Dict[str, Any]] = {}
+    outputs: Dict[str, Dict[str, Any]] = {}
+    print(f"{len(pages)} pages, parser {opts.parser}, {opts.repeat} timed passes")
+    print(f"{'extractor':<14}{'pages/s':>10}{'ms/page':>10}{'p95 ms':>10}{'peak MB':>10}")
+    for name in opts.only or EXTRACTORS:
+        if name == "listing_dom" and NODE is None:
+            print(f"{name:<14}skipped (node not found)")
+            continue
+        stats[name], outputs[name] = run_extractor(EXTRACTORS[name], pages, opts.parser, max(1, opts.repeat))
+        s = stats[name]
+        print(f"{name:<14}{s['pages_per_s']:>10}{s['ms_per_page']:>10}{s['p95_ms']:>10}{s['peak_mb']:>10}")
+    if _shim is not None:
+        _shim.stdin.close()
+        _shim.wait()
+
+    problems: List[str] = []
+    golden_key = f"parser={opts.parser}"
+    golden = _read_json(opts.golden) or {}
+    if opts.update_golden:
+        golden[golden_key] = {
+            **golden.get(golden_key, {}), **{k: v for k, v in outputs.items() if k not in GOLDEN_OF}
+        }
+        _write_json(opts.golden, golden)
+        print(f"Golden outputs saved to {opts.golden}")
+    else:
+        problems += compare_golden(outputs, golden.get(golden_key, {}))
+
+    baseline = _read_json(opts.baseline) or {}
+    if opts.update_baseline:
+        baseline[golden_key] = {**baseline.get(golden_key, {}), **stats}
+        _write_json(opts.baseline, baseline)
+        print(f"Baseline throughput saved to {opts.baseline}")
+    elif golden_key in baseline:
+        problems += compare_baseline(stats, baseline[golden_key], opts.max_regression)
+    else:
+        print(f"No throughput baseline for {golden_key} (run with --update-baseline)")
+
+    for problem in problems:
+        print(f"FAIL {problem}")
+    if not problems:
+        print("OK")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+// Runs page_snapshot's in-page extraction script outside a browser, for benchmark.py.
+// Reads one JSON request per line on stdin: {"script", "args", "tree", "html", "title"},
+// where `tree` is a parsed page serialized by benchmark.py (element nodes {k: 1, n: name,
+// a: attributes, c: children}; text, comment and other nodes {k: nodeType, v: value}).
+// Writes the script's result as one JSON line per request. Only the DOM members the
+// script uses are provided.
+const readline = require('readline');
+
+function build(node) {
+    if (node.k !== 1) {
+        return {nodeType: node.k, nodeValue: node.v || '', childNodes: []};
+    }
+    return {
+        nodeType: 1,
+        localName: node.n,
+        tagName: node.n.toUpperCase(),
+        attrs: node.a,
+        childNodes: node.c.map(build),
+        getAttribute(name) {
+            return Object.prototype.hasOwnProperty.call(this.attrs, name) ? this.attrs[name] : null;
+        },
+        hasAttribute(name) {
+            return Object.prototype.hasOwnProperty.call(this.attrs, name);
+        },
+    };
+}
+
+const compiled = new Map();
+readline.createInterface({input: process.stdin}).on('line', line => {
+    const request = JSON.parse(line);
+    global.document = {
+        nodeType: 9,
+        childNodes: request.tree.map(build),
+        documentElement: {outerHTML: request.html},
+        title: request.title,
+    };
+    if (!compiled.has(request.script)) {
+        compiled.set(request.script, eval('(' + request.script + ')'));
+    }
+    process.stdout.write(JSON.stringify(compiled.get(request.script)(request.args)) + '\n');
+});
@@ -0,0 +1,275 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any
+
+from playwright.async_api import async_playwright
+
+from metrics import timed
+from replay import get_replay_store
+
+logger = logging.getLogger(__name__)
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0"
+]
+
+LAUNCH_ARGS = ['--disable-dev-shm-usage', '--no-sandbox']
+
+# Pool sizing. POOL_SIZE is the number of contexts handed out at once; callers beyond
+# that wait in line. Browsers are recycled after serving MAX_PAGES_PER_BROWSER pages or
+# when the Chromium process tree grows past MAX_BROWSER_RSS_MB (Linux only).
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))
+POOL_BROWSERS = int(os.getenv("BROWSER_POOL_BROWSERS", "1"))
+MAX_PAGES_PER_BROWSER = int(os.getenv("BROWSER_MAX_PAGES", "200"))
+MAX_BROWSER_RSS_MB = int(os.getenv("BROWSER_MAX_RSS_MB", "450"))
+ACQUIRE_TIMEOUT = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT", "300"))
+
+
+def _chromium_rss_mb() -> Optional[float]:
+    """
+    Total resident memory of every process descended from this one (the Playwright
+    driver and the Chromium processes it spawned). Returns None where /proc is missing.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    children: Dict[int, List[int]] = {}
+    rss_pages: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/statm") as f:
+                rss_pages[int(entry)] = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        # Field 4 (ppid) follows the parenthesised command name, which may contain spaces
+        ppid = int(stat[stat.rfind(')') + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+
+    total = 0
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        total += rss_pages.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class _BrowserSlot:
+    """One Chromium process plus the bookkeeping needed to decide when to recycle it."""
+
+    def __init__(self):
+        self.browser = None
+        self.pages_served = 0
+        self.active_contexts = 0
+        self.launched_at = 0.0
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium pool. Launches browsers once and hands out isolated contexts,
+    queueing callers when `size` contexts are already in use.
+    """
+
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        browsers: int = POOL_BROWSERS,
+        max_pages_per_browser: int = MAX_PAGES_PER_BROWSER,
+        max_rss_mb: int = MAX_BROWSER_RSS_MB,
+    ):
+        self.size = max(1, size)
+        self.max_pages_per_browser = max_pages_per_browser
+        self.max_rss_mb = max_rss_mb
+        self._slots: List[_BrowserSlot] = [_BrowserSlot() for _ in range(max(1, browsers))]
+        self._draining: List[_BrowserSlot] = []
+        self._owners: Dict[Any, _BrowserSlot] = {}
+        self._semaphore = asyncio.Semaphore(self.size)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._waiting = 0
+        self._launches = 0
+        self._recycles = 0
+
+    async def start(self):
+        async with self._lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+                logger.info(f"Browser pool started (size={self.size}, browsers={len(self._slots)})")
+        return self
+
+    async def close(self):
+        for slot in self._slots + self._draining:
+            await self._close_browser(slot)
+        self._draining.clear()
+        self._owners.clear()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        logger.info("Browser pool closed")
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def new_context(self, **context_options):
+        """
+        Acquire a browser context, waiting for a free pool slot if necessary.
+        Every context obtained here must be handed back through `release`.
+        """
+        await self.start()
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=ACQUIRE_TIMEOUT)
+        finally:
+            self._waiting -= 1
+
+        try:
+            async with self._lock:
+                slot = await self._pick_slot()
+                slot.active_contexts += 1
+            options: Dict[str, Any] = {
+                "user_agent": random.choice(USER_AGENTS),
+                "viewport": {'width': 1920, 'height': 1080},
+            }
+            options.update(context_options)
+            try:
+                context = await slot.browser.new_context(**options)
+                await get_replay_store().install(context)
+            except Exception:
+                slot.active_contexts -= 1
+                raise
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+        self._owners[context] = slot
+        context.on("page", lambda _page: self._count_page(slot))
+        return context
+
+    async def release(self, context):
+        slot = self._owners.pop(context, None)
+        try:
+            await context.close()
+        except Exception:
+            pass
+        if slot is None:
+            return
+        slot.active_contexts -= 1
+        self._semaphore.release()
+        async with self._lock:
+            self._check_recycle(slot)
+            await self._reap_drained()
+
+    @asynccontextmanager
+    async def context(self, **context_options):
+        context = await self.new_context(**context_options)
+        try:
+            yield context
+        finally:
+            await self.release(context)
+
+    @asynccontextmanager
+    async def page(self, **context_options):
+        async with self.context(**context_options) as context:
+            page = await context.new_page()
+            yield page
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "in_use": len(self._owners),
+            "waiting": self._waiting,
+            "browsers": sum(1 for s in self._slots if s.browser is not None),
+            "draining": len(self._draining),
+            "launches": self._launches,
+            "recycles": self._recycles,
+            "pages_served": [s.pages_served for s in self._slots],
+        }
+
+    # ------------------------------------------------------------------
+    # Internals (all called with self._lock held unless noted)
+    # ------------------------------------------------------------------
+
+    async def _pick_slot(self) -> _BrowserSlot:
+        slot = min(self._slots, key=lambda s: s.active_contexts)
+        if slot.browser is None or not slot.browser.is_connected():
+            await self._launch(slot)
+        return slot
+
+    async def _launch(self, slot: _BrowserSlot):
+        with timed("browser_launch"):
+            slot.browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+        slot.pages_served = 0
+        slot.launched_at = time.monotonic()
+        self._launches += 1
+        slot.browser.on("disconnected", lambda _b: logger.warning("Pooled browser disconnected"))
+        logger.info(f"Launched pooled browser #{self._launches}")
+
+    def _count_page(self, slot: _BrowserSlot):
+        # Called from Playwright's event dispatch, not under the lock
+        slot.pages_served += 1
+
+    def _check_recycle(self, slot: _BrowserSlot):
+        if slot not in self._slots or slot.browser is None:
+            return
+        if slot.pages_served >= self.max_pages_per_browser:
+            self._retire(slot, f"served {slot.pages_served} pages")
+            return
+        if self.max_rss_mb and not self._draining:
+            rss = _chromium_rss_mb()
+            if rss is not None and rss > self.max_rss_mb:
+                # RSS is measured for the whole Chromium tree, so retire the browser
+                # that has done the most work since launch
+                running = [s for s in self._slots if s.browser is not None]
+                self._retire(max(running, key=lambda s: s.pages_served), f"RSS {rss:.0f} MB")
+
+    def _retire(self, slot: _BrowserSlot, reason: str):
+        logger.info(f"Recycling pooled browser ({reason})")
+        self._slots[self._slots.index(slot)] = _BrowserSlot()
+        self._draining.append(slot)
+        self._recycles += 1
+
+    async def _reap_drained(self):
+        for slot in [s for s in self._draining if s.active_contexts <= 0]:
+            self._draining.remove(slot)
+            await self._close_browser(slot)
+
+    async def _close_browser(self, slot: _BrowserSlot):
+        if slot.browser is not None:
+            try:
+                await slot.browser.close()
+            except Exception:
+                pass
+            slot.browser = None
+
+
+_default_pool: Optional[BrowserPool] = None
+
+
+def set_default_pool(pool: Optional[BrowserPool]):
+    """Install the pool owned by the application lifespan."""
+    global _default_pool
+    _default_pool = pool
+
+
+async def get_pool() -> BrowserPool:
+    """
+    Returns the shared pool. Outside the FastAPI lifespan (scripts, the engine's
+    __main__ block) a pool is started lazily on first use.
+    """
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = BrowserPool()
+    return await _default_pool.start()
@@ -0,0 +1,212 @@
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Awaitable, Callable, Iterator, TypeVar
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Page loads that time out or fail at the network level are retried up to FETCH_RETRIES
+# times after a jittered exponential pause (random up to FETCH_BACKOFF_BASE * 2^n,
+# capped at FETCH_BACKOFF_MAX seconds). All attempts of one request share
+# FETCH_REQUEST_BUDGET seconds; a job can set an overall budget too (fetch_budget).
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "2"))
+FETCH_BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", "1"))
+FETCH_BACKOFF_MAX = float(os.getenv("FETCH_BACKOFF_MAX", "15"))
+FETCH_REQUEST_BUDGET = float(os.getenv("FETCH_REQUEST_BUDGET", "120"))
+# After BREAKER_THRESHOLD consecutive timeouts or network failures a host's circuit
+# opens: requests to it fail at once for BREAKER_COOLDOWN seconds, then one trial
+# request decides whether it closes again.
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "60"))
+
+# Error kinds
+TIMEOUT = "timeout"
+NETWORK = "network"
+SESSION_EXPIRED = "session_expired"
+HOME_PAGE = "home_page"
+CAPTCHA = "captcha"
+CIRCUIT_OPEN = "circuit_open"
+BUDGET = "budget"
+OTHER = "other"
+RETRYABLE = (TIMEOUT, NETWORK)
+
+T = TypeVar("T")
+
+
+class FetchError(Exception):
+    """A page that could not be fetched, with the kind of failure (see the kinds above)."""
+
+    def __init__(self, kind: str, url: str, message: str = ""):
+        super().__init__(f"{kind} on {url}" + (f": {message}" if message else ""))
+        self.kind = kind
+        self.url = url
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind in RETRYABLE
+
+
+def classify_exception(error: BaseException) -> str:
+    """Kind of a failed request: FetchError kinds as they are, timeouts, network errors or other."""
+    if isinstance(error, FetchError):
+        return error.kind
+    name = type(error).__name__.lower()
+    # Playwright, asyncio and requests all name their timeout errors "...Timeout..."
+    if isinstance(error, asyncio.TimeoutError) or "timeout" in name:
+        return TIMEOUT
+    message = str(error)
+    if "net::ERR_" in message or "NS_ERROR" in message or "connection" in name or "connection" in message.lower():
+        return NETWORK
+    return OTHER
+
+
+def classify_page(content: str) -> Optional[str]:
+    """
+    Kind of failure a loaded GePNIC tender page shows instead of its content: an
+    expired session or a bounce to the home page. None for a usable page. (CAPTCHA
+    challenges are flagged by the page snapshot.)
+    """
+    lowered = content.lower()
+    if "session has timed out" in lowered or "session expired" in lowered:
+        return SESSION_EXPIRED
+    if "welcome to eprocurement" in lowered and "tender details" not in lowered:
+        return HOME_PAGE
+    return None
+
+
+class CircuitBreaker:
+    """Per-host circuit breaker over consecutive timeouts and network failures."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+
+    def _state(self, url: str) -> Dict[str, Any]:
+        host = urlparse(url).netloc.lower()
+        if host not in self._hosts:
+            self._hosts[host] = {"failures": 0, "opened_at": None, "probing": False, "trips": 0}
+        return self._hosts[host]
+
+    def allow(self, url: str) -> bool:
+        """False while the host's circuit is open. After the cooldown one trial request is let through."""
+        state = self._state(url)
+        if state["opened_at"] is None:
+            return True
+        if state["probing"] or time.monotonic() - state["opened_at"] < self.cooldown:
+            return False
+        state["probing"] = True
+        return True
+
+    def success(self, url: str):
+        state = self._state(url)
+        if state["opened_at"] is not None:
+            logger.info(f"Circuit for {urlparse(url).netloc} closed again")
+        state.update(failures=0, opened_at=None, probing=False)
+
+    def failure(self, url: str, kind: str):
+        state = self._state(url)
+        if kind not in RETRYABLE:
+            # The host answered; a trial request that failed this way does not reopen
+            state["probing"] = False
+            return
+        state["failures"] += 1
+        if state["probing"] or (state["opened_at"] is None and state["failures"] >= self.threshold):
+            state.update(opened_at=time.monotonic(), probing=False)
+            state["trips"] += 1
+            logger.warning(
+                f"Circuit for {urlparse(url).netloc} opened after {state['failures']} consecutive failures; "
+                f"failing fast for {self.cooldown:.0f}s"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            host: {
+                "open": state["opened_at"] is not None,
+                "open_for_s": round(max(0.0, self.cooldown - (now - state["opened_at"])), 1)
+                if state["opened_at"] is not None else 0,
+                "consecutive_failures": state["failures"],
+                "trips": state["trips"],
+            }
+            for host, state in self._hosts.items()
+        }
+
+
+_default_breaker: Optional[CircuitBreaker] = None
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _default_breaker
+    if _default_breaker is None:
+        _default_breaker = CircuitBreaker()
+    return _default_breaker
+
+
+# Monotonic deadline of the running job, inherited by every task it starts
+_job_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("job_deadline", default=None)
+
+
+@contextmanager
+def fetch_budget(seconds: float) -> Iterator[None]:
+    """Give every fetch made inside the block (and in tasks started from it) `seconds` in total. 0 means no limit."""
+    if seconds <= 0:
+        yield
+        return
+    token = _job_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _job_deadline.reset(token)
+
+
+async def fetch_with_policy(
+    url: str,
+    attempt: Callable[[float], Awaitable[T]],
+    timeout: float,
+    retries: int = FETCH_RETRIES,
+    budget: float = FETCH_REQUEST_BUDGET,
+) -> T:
+    """
+    Run `attempt(timeout_seconds)` (one page load) under the fetch policy: fail fast
+    while the host's circuit is open, retry timeouts and network failures with jittered
+    exponential backoff, and keep every attempt within the request's and the job's
+    time budget. Attempts may raise FetchError themselves to report a classified page.
+    Raises FetchError when the page could not be fetched.
+    """
+    breaker = get_circuit_breaker()
+    deadline = time.monotonic() + budget
+    job_deadline = _job_deadline.get()
+    if job_deadline is not None:
+        deadline = min(deadline, job_deadline)
+
+    for attempt_number in range(retries + 1):
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise FetchError(BUDGET, url, "time budget exhausted")
+        if not breaker.allow(url):
+            raise FetchError(CIRCUIT_OPEN, url, "host is failing; not trying")
+        try:
+            result = await attempt(min(timeout, left))
+        except asyncio.CancelledError:
+            breaker.failure(url, OTHER)  # Frees a trial slot the cancelled attempt held
+            raise
+        except Exception as e:
+            kind = classify_exception(e)
+            breaker.failure(url, kind)
+            delay = random.uniform(0, min(FETCH_BACKOFF_MAX, FETCH_BACKOFF_BASE * 2 ** attempt_number))
+            if kind not in RETRYABLE or attempt_number == retries or time.monotonic() + delay >= deadline:
+                if isinstance(e, FetchError):
+                    raise
+                raise FetchError(kind, url, str(e).splitlines()[0] if str(e) else "") from e
+            logger.info(f"Retrying {url} in {delay:.1f}s after {kind} (attempt {attempt_number + 1} of {retries + 1})")
+            await asyncio.sleep(delay)
+        else:
+            breaker.success(url)
+            return result
+    raise FetchError(BUDGET, url, "no attempts left")
@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, AsyncIterator
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Politeness per portal host, shared by every fetch path (crawl pages, search result
+# pages, detail pre-fetch, bulk export, alert searches). Requests to one host start at
+# most HOST_RATE per second, and the number in flight adapts (AIMD) between 1 and
+# HOST_MAX_CONCURRENCY, starting at HOST_START_CONCURRENCY: it grows by one per round
+# of answers faster than HOST_SLOW_SECONDS and halves on a slow answer, a timeout, a
+# throttling status or an expired session, at most once per HOST_BACKOFF_COOLDOWN seconds.
+HOST_RATE = float(os.getenv("HOST_RATE", "4"))
+HOST_START_CONCURRENCY = int(os.getenv("HOST_START_CONCURRENCY", "4"))
+HOST_MAX_CONCURRENCY = int(os.getenv("HOST_MAX_CONCURRENCY", "12"))
+HOST_SLOW_SECONDS = float(os.getenv("HOST_SLOW_SECONDS", "15"))
+HOST_BACKOFF_COOLDOWN = float(os.getenv("HOST_BACKOFF_COOLDOWN", "5"))
+
+
+def _is_timeout(error: BaseException) -> bool:
+    # Playwright, asyncio and requests all name their timeout errors "...Timeout..."
+    return isinstance(error, asyncio.TimeoutError) or "timeout" in type(error).__name__.lower()
+
+
+class HostLimiter:
+    """In-flight limit and request spacing for one host. See HostScheduler."""
+
+    def __init__(
+        self,
+        host: str,
+        rate: float = HOST_RATE,
+        start: int = HOST_START_CONCURRENCY,
+        maximum: int = HOST_MAX_CONCURRENCY,
+        slow_seconds: float = HOST_SLOW_SECONDS,
+        cooldown: float = HOST_BACKOFF_COOLDOWN,
+    ):
+        self.host = host
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.maximum = max(1, maximum)
+        self.limit = float(min(max(1, start), self.maximum))
+        self.slow_seconds = slow_seconds
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self._changed = asyncio.Condition()
+        self._next_start = 0.0
+        self._backed_off_at = float("-inf")
+        self.counters = {"requests": 0, "slow": 0, "timeouts": 0, "errors": 0, "backoffs": 0}
+        self.latency_ewma: Optional[float] = None
+
+    async def acquire(self):
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self.interval
+        if start > now:
+            try:
+                await asyncio.sleep(start - now)
+            except asyncio.CancelledError:
+                await self.release()
+                raise
+
+    async def release(self):
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    def record(self, seconds: float):
+        """A completed request: slow answers back off, fast ones widen the window."""
+        self.counters["requests"] += 1
+        self.latency_ewma = seconds if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * seconds
+        if seconds > self.slow_seconds:
+            self.counters["slow"] += 1
+            self.backoff(f"slow answer ({seconds:.1f}s)")
+        elif self.limit < self.maximum:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def backoff(self, reason: str):
+        """Halve the in-flight limit, once per cooldown however many requests report trouble."""
+        now = time.monotonic()
+        if now - self._backed_off_at < self.cooldown:
+            return
+        self._backed_off_at = now
+        previous = self.limit
+        self.limit = max(1.0, self.limit / 2)
+        self.counters["backoffs"] += 1
+        logger.info(f"Backing off {self.host}: {reason}; concurrency {previous:.1f} -> {self.limit:.1f}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "latency_ewma_s": round(self.latency_ewma, 2) if self.latency_ewma is not None else None,
+            **self.counters,
+        }
+
+
+class HostScheduler:
+    """
+    Per-host politeness for every request the scraper makes. Wrap each request in
+    `async with scheduler.slot(url):`; the slot waits for the host's in-flight limit
+    and request spacing, then records the request's latency, or backs off if it raised
+    a timeout or other error. Responses that are only recognisable as throttling
+    after the fact (expired sessions, 429/503) are reported with `backoff(url, reason)`.
+    A slot covers a single request: never fetch from the same host while holding one.
+    """
+
+    def __init__(self, **limiter_options):
+        self.limiter_options = limiter_options
+        self._hosts: Dict[str, HostLimiter] = {}
+
+    def limiter(self, url: str) -> HostLimiter:
+        host = urlparse(url).netloc.lower()
+        if host not in self._hosts:
+            self._hosts[host] = HostLimiter(host, **self.limiter_options)
+        return self._hosts[host]
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[HostLimiter]:
+        limiter = self.limiter(url)
+        await limiter.acquire()
+        started = time.monotonic()
+        try:
+            yield limiter
+        except Exception as e:
+            if _is_timeout(e):
+                limiter.counters["timeouts"] += 1
+                limiter.backoff(f"timeout on {url}")
+            else:
+                limiter.counters["errors"] += 1
+            raise
+        else:
+            limiter.record(time.monotonic() - started)
+        finally:
+            await limiter.release()
+
+    def backoff(self, url: str, reason: str):
+        self.limiter(url).backoff(f"{reason} on {url}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {host: limiter.stats() for host, limiter in self._hosts.items()}
+
+
+_default_scheduler: Optional[HostScheduler] = None
+
+
+def get_host_scheduler() -> HostScheduler:
+    global _default_scheduler
+    if _default_scheduler is None:
+        _default_scheduler = HostScheduler()
+    return _default_scheduler
@@ -0,0 +1,141 @@
+import bisect
+import logging
+import os
+from typing import Optional, List, Dict, Iterable, Tuple
+
+from bs4 import BeautifulSoup, FeatureNotFound, Tag
+
+logger = logging.getLogger(__name__)
+
+# Tree builder used for every BeautifulSoup parse in the engine. lxml is several times
+# faster than the pure-Python html.parser on GePNIC pages; html5lib is the slowest but
+# parses exactly like a browser.
+PARSER_BACKEND = os.getenv("PARSER_BACKEND", "lxml")
+PARSER_BACKENDS = ("lxml", "html.parser", "html5lib")
+
+_unavailable: set = set()
+
+
+def make_soup(content: str, backend: Optional[str] = None) -> BeautifulSoup:
+    """
+    Parse HTML with the requested backend (default PARSER_BACKEND). An unknown or
+    uninstalled backend falls back to html.parser, which ships with Python.
+    """
+    backend = backend or PARSER_BACKEND
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown parser backend '{backend}' (expected one of {', '.join(PARSER_BACKENDS)})")
+    if backend not in _unavailable:
+        try:
+            return BeautifulSoup(content, backend)
+        except FeatureNotFound:
+            _unavailable.add(backend)
+            logger.warning(f"Parser backend '{backend}' is not installed, using html.parser")
+    return BeautifulSoup(content, 'html.parser')
+
+
+class TextIndex:
+    """
+    Document-order index over a parsed page, built in a single walk of the tree.
+
+    Every tag maps to a [start, end) slice of the page's stripped strings, so
+    `tag.get_text(strip=True)` becomes a join over that slice and its length a
+    prefix-sum lookup; nested elements no longer rebuild the same text over and over.
+    Tags are also numbered in document order so "next tag named X" and "descendants
+    named X" are binary searches instead of tree walks. Texts are memoized per tag.
+
+    Tags whose own string types differ from the document default (script, style,
+    template, rt, rp) are rare and fall back to BeautifulSoup's get_text.
+    """
+
+    def __init__(self, soup: BeautifulSoup):
+        self._default_types = soup.interesting_string_types
+        self.strings: List[str] = []
+        self._offsets: List[int] = [0]           # prefix sums of string lengths
+        self.tags: List[Tag] = []                # every tag, in document order
+        self._spans: Dict[int, Tuple[int, int]] = {}   # id(tag) -> string slice
+        self._order: Dict[int, Tuple[int, int]] = {}   # id(tag) -> (position, end of subtree) in self.tags
+        self._positions: Dict[frozenset, List[int]] = {}
+        self._texts: Dict[int, str] = {}
+        self._walk(soup)
+
+    def _walk(self, soup: BeautifulSoup):
+        default_types = self._default_types
+        starts: Dict[int, Tuple[int, int]] = {}
+        stack = [(soup, iter(soup.contents))]
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                if node is not soup:
+                    string_start, position = starts.pop(id(node))
+                    self._spans[id(node)] = (string_start, len(self.strings))
+                    self._order[id(node)] = (position, len(self.tags))
+            elif isinstance(child, Tag):
+                starts[id(child)] = (len(self.strings), len(self.tags))
+                self.tags.append(child)
+                stack.append((child, iter(child.contents)))
+            elif type(child) in default_types:
+                stripped = child.strip()
+                if stripped:
+                    self.strings.append(stripped)
+                    self._offsets.append(self._offsets[-1] + len(stripped))
+
+    def _own_types(self, tag: Tag) -> bool:
+        return tag.interesting_string_types == self._default_types
+
+    def text_length(self, tag: Tag) -> int:
+        """len(tag.get_text(strip=True)) without building the text."""
+        if not self._own_types(tag):
+            return len(self.text(tag))
+        start, end = self._spans[id(tag)]
+        return self._offsets[end] - self._offsets[start]
+
+    def text(self, tag: Tag, limit: Optional[int] = None) -> str:
+        """tag.get_text(strip=True), or its first `limit` characters."""
+        key = id(tag)
+        if key in self._texts:
+            text = self._texts[key]
+            return text if limit is None else text[:limit]
+        if not self._own_types(tag):
+            text = self._texts[key] = tag.get_text(strip=True)
+            return text if limit is None else text[:limit]
+
+        start, end = self._spans[key]
+        if limit is not None and self._offsets[end] - self._offsets[start] > limit:
+            # Only join as many strings as the prefix needs
+            stop = bisect.bisect_left(self._offsets, self._offsets[start] + limit, start + 1, end + 1)
+            return "".join(self.strings[start:stop])[:limit]
+        text = self._texts[key] = "".join(self.strings[start:end])
+        return text if limit is None else text[:limit]
+
+    def _positions_of(self, names: Iterable[str]) -> List[int]:
+        key = frozenset(names)
+        if key not in self._positions:
+            self._positions[key] = [i for i, tag in enumerate(self.tags) if tag.name in key]
+        return self._positions[key]
+
+    def find_all(self, names: Iterable[str]) -> List[Tag]:
+        """Same as soup.find_all(names): matching tags in document order."""
+        return [self.tags[i] for i in self._positions_of(names)]
+
+    def descendants_named(self, tag: Tag, names: Iterable[str]) -> List[Tag]:
+        """Same as tag.find_all(names)."""
+        positions = self._positions_of(names)
+        position, end = self._order[id(tag)]
+        lo = bisect.bisect_right(positions, position)
+        hi = bisect.bisect_left(positions, end, lo)
+        return [self.tags[i] for i in positions[lo:hi]]
+
+    def next_named(self, tag: Tag, names: Iterable[str]) -> Optional[Tag]:
+        """Same as tag.find_next(names): the first match after the tag's start, descendants included."""
+        positions = self._positions_of(names)
+        i = bisect.bisect_right(positions, self._order[id(tag)][0])
+        return self.tags[positions[i]] if i < len(positions) else None
+
+    def subtree_end(self, tag: Tag) -> int:
+        """Position in `tags` just past the tag's last descendant."""
+        return self._order[id(tag)][1]
+
+    def position(self, tag: Tag) -> int:
+        return self._order[id(tag)][0]
@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+import random
+import re
+from http.cookiejar import DefaultCookiePolicy
+from typing import Optional, List, Dict, Any, Callable, Tuple
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.cookies import RequestsCookieJar
+
+from browser_pool import USER_AGENTS
+from host_scheduler import get_host_scheduler
+from fetch_policy import classify_exception, get_circuit_breaker
+from metrics import timed
+from replay import get_replay_store
+
+logger = logging.getLogger(__name__)
+
+# Plain HTTP is tried before opening a browser page unless HTTP_FIRST=0
+HTTP_FIRST = os.getenv("HTTP_FIRST", "1") != "0"
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "20"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+
+# Markers of client-rendered shells whose HTML is useless without running scripts
+_JS_SHELL_RE = re.compile(
+    r'<div[^>]+id="(?:root|app|__next)"[^>]*>\s*</div>|ng-app=|please enable javascript|requires javascript',
+    re.IGNORECASE,
+)
+_TAG_RE = re.compile(r'<script\b.*?</script>|<style\b.*?</style>|<[^>]+>', re.IGNORECASE | re.S)
+
+_session: Optional[requests.Session] = None
+
+
+def _get_session() -> requests.Session:
+    """
+    Process-wide session for connection pooling only. Its own cookie jar rejects
+    everything, so cookies set for one browser context never leak into another's
+    requests; each call passes the cookies of the context it is acting for.
+    """
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.headers.update({
+            "User-Agent": random.choice(USER_AGENTS),
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+        })
+        _session = session
+    return _session
+
+
+async def context_cookies(context, url: str) -> Dict[str, str]:
+    """Cookies the Playwright context would send to `url`, as a name -> value dict."""
+    if context is None:
+        return {}
+    try:
+        return {c["name"]: c["value"] for c in await context.cookies(url)}
+    except Exception as e:
+        logger.debug(f"Could not export context cookies: {e}")
+        return {}
+
+
+def _playwright_cookies(jar) -> List[Dict[str, Any]]:
+    cookies = []
+    for c in jar:
+        cookie: Dict[str, Any] = {
+            "name": c.name,
+            "value": c.value or "",
+            "domain": c.domain,
+            "path": c.path or "/",
+            "secure": bool(c.secure),
+        }
+        if c.expires:
+            cookie["expires"] = c.expires
+        cookies.append(cookie)
+    return cookies
+
+
+async def _share_cookies(context, jar):
+    """
+    Hand cookies the server set on a plain HTTP response back to the browser context.
+    Portals such as GePNIC bind their link tokens to the session cookie, so links found
+    in HTTP-fetched HTML only stay valid if the browser adopts the same session.
+    """
+    cookies = _playwright_cookies(jar)
+    if context is None or not cookies:
+        return
+    try:
+        await context.add_cookies(cookies)
+    except Exception as e:
+        logger.debug(f"Could not share HTTP cookies with browser context: {e}")
+
+
+def browser_needed(status: int, content_type: str, html: str) -> Optional[str]:
+    """
+    Why a plain HTTP response cannot stand in for a rendered page, or None if it can.
+    Portal-specific checks (expired sessions, bounces to the home page) are left to
+    the caller.
+    """
+    if status >= 400:
+        return f"http {status}"
+    if "html" not in (content_type or "").lower():
+        return "not html"
+    if _JS_SHELL_RE.search(html):
+        return "javascript shell"
+    if "<table" not in html.lower():
+        return "no tables"
+    if len(_TAG_RE.sub(" ", html).split()) < 30:
+        return "too little text"
+    return None
+
+
+def _get(url: str, cookies: Dict[str, str]):
+    response = _get_session().get(url, cookies=cookies, timeout=HTTP_TIMEOUT, allow_redirects=True)
+    set_cookies = RequestsCookieJar()
+    for hop in response.history + [response]:
+        set_cookies.update(hop.cookies)
+    return response.status_code, response.headers.get("content-type", ""), response.text, set_cookies
+
+
+async def touch_session(url: str, cookies: Dict[str, str]) -> Optional[List[Dict[str, Any]]]:
+    """
+    GET `url` with a session's cookies so the portal restarts its idle timer.
+    Returns the cookies the server set in Playwright's format (empty if none), or
+    None when the request failed, or when browser traffic is recorded or replayed
+    (the recording holds no keep-alives, and a replay never touches the portal).
+    """
+    if get_replay_store().enabled:
+        return None
+    try:
+        async with get_host_scheduler().slot(url):
+            status, _, _, set_cookies = await asyncio.to_thread(_get, url, cookies)
+    except requests.RequestException as e:
+        logger.debug(f"Keep-alive request to {url} failed: {type(e).__name__}")
+        return None
+    if status >= 400:
+        return None
+    return _playwright_cookies(set_cookies)
+
+
+async def fetch_html(
+    url: str,
+    context=None,
+    keep: Optional[Callable[[str], bool]] = None,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Fetch `url` over pooled HTTP using the browser context's cookies (and passing any
+    cookies the server sets back to it).
+    Returns (html, None) when the response is usable as-is, or (None, reason) when the
+    caller should escalate to a browser page. Successful responses for which `keep(html)`
+    is true are returned even if they fail those checks (portal error pages the caller
+    handles itself).
+    """
+    if urlparse(url).scheme not in ("http", "https"):
+        return None, "unsupported scheme"
+    if get_replay_store().enabled:
+        return None, f"{get_replay_store().mode} mode"
+    breaker = get_circuit_breaker()
+    if not breaker.allow(url):
+        return None, "circuit open"
+    cookies = await context_cookies(context, url)
+    try:
+        async with get_host_scheduler().slot(url) as host:
+            with timed("http"):
+                status, content_type, html, set_cookies = await asyncio.to_thread(_get, url, cookies)
+            if status in (429, 503):
+                host.backoff(f"HTTP {status} on {url}")
+    except requests.RequestException as e:
+        breaker.failure(url, classify_exception(e))
+        return None, f"request failed: {type(e).__name__}"
+    breaker.success(url)
+    await _share_cookies(context, set_cookies)
+    reason = browser_needed(status, content_type, html)
+    if reason and keep is not None and status < 400 and keep(html):
+        return html, None
+    if reason:
+        return None, reason
+    return html, None
@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import re
+from typing import Optional, List, Dict, Iterable, Set
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# Per-portal junk pattern sets. See junk_patterns.json for the format.
+JUNK_PATTERNS_FILE = os.getenv(
+    "JUNK_PATTERNS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "junk_patterns.json")
+)
+
+
+def _trie_regex(patterns: Iterable[str]) -> str:
+    """
+    Regex source matching any of `patterns`, with shared prefixes merged into a trie so
+    each position is tested against one branch per distinct next character rather than
+    once per pattern. Where one pattern extends another the longer one is tried first,
+    so a match is always the longest pattern starting at that position.
+    """
+    trie: Dict[str, dict] = {}
+    for pattern in patterns:
+        node = trie
+        for ch in pattern:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def _build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(ch) + _build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return _build(trie)
+
+
+class JunkMatcher:
+    """
+    Case-insensitive substring matcher for a fixed set of patterns, compiled once into
+    a single trie-shaped regex. `search` answers "any pattern present?"; `counts`
+    reports how often each pattern occurs, overlapping occurrences included, in one
+    scan of the text.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = sorted({p.lower() for p in patterns if p})
+        source = _trie_regex(self.patterns)
+        self._any = re.compile(source) if self.patterns else None
+        # Zero-width lookahead finds a match starting at every position, so patterns
+        # that overlap in the text are all seen
+        self._overlapping = re.compile(f"(?=({source}))") if self.patterns else None
+        # Every pattern that matches at a position is a prefix of the longest one there
+        self._prefixes: Dict[str, List[str]] = {
+            p: [q for q in self.patterns if p.startswith(q)] for p in self.patterns
+        }
+
+    def search(self, text: str) -> bool:
+        return bool(self._any and self._any.search(text.lower()))
+
+    def counts(self, text: str) -> Dict[str, int]:
+        found: Dict[str, int] = {}
+        if self._overlapping is None:
+            return found
+        for match in self._overlapping.finditer(text.lower()):
+            for pattern in self._prefixes[match.group(1)]:
+                found[pattern] = found.get(pattern, 0) + 1
+        return found
+
+    def matched(self, text: str) -> Set[str]:
+        """Distinct patterns present in the text."""
+        return set(self.counts(text))
+
+
+class JunkRules:
+    """
+    One portal's junk classification:
+      detail  - text that disqualifies a detail field, value or table sample
+      layout  - table header text marking navigation/layout tables
+      row     - row text marking navigation rows; row_exact rows are dropped outright
+    """
+
+    def __init__(self, name: str, config: Dict[str, List[str]]):
+        self.name = name
+        self.detail = JunkMatcher(config.get("detail", []))
+        self.layout = JunkMatcher(config.get("layout", []))
+        self.layout_table_classes = [c.lower() for c in config.get("layout_table_classes", [])]
+        self.row = JunkMatcher(config.get("row", []))
+        self.row_exact = frozenset(r.lower() for r in config.get("row_exact", []))
+
+    def is_layout_class(self, table_classes: str) -> bool:
+        return any(c in table_classes for c in self.layout_table_classes)
+
+    def is_junk_row(self, row_text: str) -> bool:
+        return row_text.lower() in self.row_exact or self.row.search(row_text)
+
+
+_config: Optional[dict] = None
+_rules: Dict[str, JunkRules] = {}
+
+
+def _load_config() -> dict:
+    global _config
+    if _config is None:
+        with open(JUNK_PATTERNS_FILE, encoding="utf-8") as f:
+            _config = json.load(f)
+        logger.info(f"Loaded junk pattern sets {sorted(_config.get('sets', {}))} from {JUNK_PATTERNS_FILE}")
+    return _config
+
+
+def _resolve_set(sets: Dict[str, dict], name: str, seen: Optional[Set[str]] = None) -> Dict[str, List[str]]:
+    """A pattern set with any `extends` parent's lists merged in."""
+    seen = seen or set()
+    if name in seen:
+        raise ValueError(f"Junk pattern set '{name}' extends itself")
+    seen.add(name)
+    config = sets[name]
+    if "extends" not in config:
+        return config
+    merged = {k: list(v) for k, v in _resolve_set(sets, config["extends"], seen).items()}
+    for key, values in config.items():
+        if key != "extends":
+            merged[key] = merged.get(key, []) + list(values)
+    return merged
+
+
+def set_name_for(url: Optional[str]) -> str:
+    """Pattern set for a URL's host (subdomains included), or the configured default."""
+    config = _load_config()
+    host = urlparse(url).netloc.lower().split(':')[0] if url else ""
+    for site, name in config.get("hosts", {}).items():
+        if host == site or host.endswith("." + site):
+            return name
+    return config["default"]
+
+
+def junk_rules(url: Optional[str] = None) -> JunkRules:
+    """Compiled junk rules for the portal serving `url` (compiled once per set)."""
+    name = set_name_for(url)
+    if name not in _rules:
+        _rules[name] = JunkRules(name, _resolve_set(_load_config()["sets"], name))
+    return _rules[name]
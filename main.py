@@ -1,14 +1,30 @@
 from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 import asyncio
+import json
 import sys
 import logging
+import datetime
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
 
-from scraper_engine import scrape_dynamic_page, fetch_tender_details_dict, export_tender_details_csv, export_all_tenders_with_details_csv
+from alert_monitor import (
+    AlertMonitor, get_alert_monitor, set_default_alert_monitor,
+    list_alerts, create_alert, delete_alert, recent_history,
+)
+from browser_pool import BrowserPool, set_default_pool
+from portal_sessions import PortalSessionRegistry, set_default_registry
+from database import init_db
+from fetch_policy import get_circuit_breaker
+from host_scheduler import get_host_scheduler
+from metrics import render_prometheus
+from search_index import SearchIndex, get_search_index, set_default_search_index
+from scrape_jobs import JobManager, JobQueueFull, get_job_manager, set_default_job_manager
+from scraper_engine import fetch_tender_details_dict, export_tender_details_csv, stream_all_tenders_with_details_csv
+from tender_store import scrape_with_store, query_tenders
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,14 +33,64 @@ if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
     print(f"Event Loop Policy: {type(asyncio.get_event_loop_policy()).__name__}")
 
-app = FastAPI(title="DataExtractor Pro", description="Advanced Web Scraper for Government & Modern Sites")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One Chromium pool for the whole process: browsers launch once and are
+    # shared (and recycled) across /api/scrape, /api/tender-details and /api/export-bulk.
+    pool = BrowserPool()
+    await pool.start()
+    set_default_pool(pool)
+    try:
+        await asyncio.to_thread(init_db)
+    except Exception as e:
+        # Scraping still works without the store; saves and lookups log their failures
+        logger.warning(f"Tender store unavailable: {e}")
+    index = SearchIndex()
+    try:
+        await asyncio.to_thread(index.start)
+        set_default_search_index(index)
+    except Exception as e:
+        logger.warning(f"Search index unavailable: {e}")
+    # Portal sessions outlive single requests so detail links from a search stay valid
+    sessions = PortalSessionRegistry()
+    await sessions.start()
+    set_default_registry(sessions)
+    jobs = JobManager()
+    set_default_job_manager(jobs)
+    alerts = AlertMonitor()
+    await alerts.start()
+    set_default_alert_monitor(alerts)
+    try:
+        yield
+    finally:
+        set_default_alert_monitor(None)
+        await alerts.close()
+        await jobs.close()
+        set_default_job_manager(None)
+        set_default_registry(None)
+        await sessions.close()
+        set_default_search_index(None)
+        await asyncio.to_thread(index.close)
+        set_default_pool(None)
+        await pool.close()
+
+
+app = FastAPI(title="DataExtractor Pro", description="Advanced Web Scraper for Government & Modern Sites", lifespan=lifespan)
 templates = Jinja2Templates(directory="templates")
 
 
 class ScrapeRequest(BaseModel):
     url: str
     search_keyword: Optional[str] = None
+    # Several keywords (e.g. tender IDs) searched in one portal session; results per keyword
+    search_keywords: Optional[List[str]] = None
     max_depth: int = 1
+    # Scrape the portal even if the same search was stored recently
+    refresh: bool = False
+    # Return only rows that are new or changed since the last crawl of the same pages
+    incremental: bool = False
 
 
 class TenderData(BaseModel):
@@ -36,6 +102,13 @@ class TenderData(BaseModel):
     url: Optional[str] = None
 
 
+class AlertRequest(BaseModel):
+    email: str
+    keyword: str
+    url: str
+    max_depth: int = 1
+
+
 class BulkExportRequest(BaseModel):
     tenders: List[Dict[str, Any]]  # List of tender objects with basic info
 
@@ -45,13 +118,21 @@ async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
+@app.get("/admin", response_class=HTMLResponse)
+async def read_admin(request: Request):
+    return templates.TemplateResponse("admin.html", {"request": request})
+
+
 @app.post("/api/scrape")
 async def scrape_api(request: ScrapeRequest):
     try:
-        data = await scrape_dynamic_page(
+        data = await scrape_with_store(
             request.url,
             search_keyword=request.search_keyword,
-            max_depth=request.max_depth
+            search_keywords=request.search_keywords,
+            max_depth=request.max_depth,
+            refresh=request.refresh,
+            incremental=request.incremental,
         )
         return JSONResponse(content=data)
     except Exception:
@@ -61,6 +142,67 @@ async def scrape_api(request: ScrapeRequest):
         return JSONResponse(content={"error": error_msg}, status_code=500)
 
 
+@app.post("/api/jobs")
+async def create_job_api(request: ScrapeRequest):
+    """
+    Starts a scrape in the background and returns its job id at once. Poll
+    /api/jobs/{id} for status and the final result, or follow /api/jobs/{id}/events.
+    """
+    try:
+        job = get_job_manager().submit({
+            "url": request.url,
+            "search_keyword": request.search_keyword,
+            "search_keywords": request.search_keywords,
+            "max_depth": request.max_depth,
+            "refresh": request.refresh,
+            "incremental": request.incremental,
+        })
+    except JobQueueFull as e:
+        return JSONResponse(content={"error": f"Too many scrape jobs waiting ({e}); try again shortly"}, status_code=429)
+    return JSONResponse(
+        content={
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/api/jobs/{job.id}",
+            "events_url": f"/api/jobs/{job.id}/events",
+        },
+        status_code=202,
+    )
+
+
+@app.get("/api/jobs/{job_id}")
+async def job_status_api(job_id: str, include_result: bool = True):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Unknown or expired job"}, status_code=404)
+    return JSONResponse(content=job.as_dict(include_result=include_result))
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events_api(job_id: str, after: int = 0):
+    """
+    Streams the job's progress as NDJSON, one event per line, starting at event number
+    `after` (to resume a dropped stream). The stream ends once the job has finished.
+    """
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Unknown or expired job"}, status_code=404)
+
+    async def _lines():
+        async for event in job.stream(after):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job_api(job_id: str):
+    job = get_job_manager().cancel(job_id)
+    if job is None:
+        return JSONResponse(content={"error": "Unknown or expired job"}, status_code=404)
+    return JSONResponse(content={"job_id": job.id, "status": job.status if job.finished else "cancelling"})
+
+
 @app.get("/api/export-tender")
 async def export_tender_api(url: str):
     try:
@@ -79,7 +221,8 @@ async def export_tender_api(url: str):
 async def export_bulk_api(request: BulkExportRequest):
     """
     Exports all tenders with enriched details fetched from each tender URL.
-    This provides comprehensive tender information in a single CSV file.
+    Rows are streamed as each tender completes, so the download starts immediately
+    and memory stays flat regardless of how many tenders are exported.
     """
     try:
         if not request.tenders or len(request.tenders) == 0:
@@ -89,15 +232,118 @@ async def export_bulk_api(request: BulkExportRequest):
             )
         
         logger.info(f"Starting bulk export for {len(request.tenders)} tenders...")
-        csv_content = await export_all_tenders_with_details_csv(request.tenders)
         
-        return Response(
-            content=csv_content,
+        return StreamingResponse(
+            stream_all_tenders_with_details_csv(request.tenders),
             media_type="text/csv",
             headers={"Content-Disposition": f'attachment; filename="tender_results_with_details.csv"'}
         )
     except Exception as e:
         logger.error(f"Bulk Export API Error: {e}", exc_info=True)
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/api/tenders")
+async def tenders_api(
+    q: Optional[str] = None,
+    portal: Optional[str] = None,
+    organisation: Optional[str] = None,
+    ref: Optional[str] = None,
+    closing_from: Optional[datetime.datetime] = None,
+    closing_to: Optional[datetime.datetime] = None,
+    page: int = 1,
+    page_size: int = 50,
+    sort: str = "-last_seen",
+):
+    """
+    Pages through stored tenders. Filters: free text `q` (title, ref, tender ID,
+    organisation), `portal` host, `organisation`, exact `ref`/tender ID and a closing
+    date range. `sort` is closing, -closing, last_seen or -last_seen.
+    """
+    try:
+        result = await asyncio.to_thread(
+            query_tenders, q=q, portal=portal, organisation=organisation, ref=ref,
+            closing_from=closing_from, closing_to=closing_to,
+            page=page, page_size=page_size, sort=sort,
+        )
+        return JSONResponse(content=result)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Tender query error: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/api/search")
+async def search_api(q: str, scope: str = "all", limit: int = 20, portal: Optional[str] = None):
+    """
+    Full-text search over stored tenders and fetched pages, answered from the local
+    index. Single tokens such as tender IDs and refs match as a phrase of their parts;
+    the last word matches as a prefix. `scope` is all, tenders or pages.
+    """
+    index = get_search_index()
+    if not index.enabled:
+        return JSONResponse(content={"error": "Search index is disabled (SEARCH_INDEX_PATH is empty)"}, status_code=503)
+    try:
+        result = await asyncio.to_thread(index.search, q, scope=scope, limit=limit, portal=portal)
+        return JSONResponse(content=result)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    except Exception as e:
+        logger.error(f"Search error: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+@app.get("/api/alerts")
+async def alerts_api():
+    return JSONResponse(content=await asyncio.to_thread(list_alerts))
+
+
+@app.post("/api/alerts")
+async def create_alert_api(request: AlertRequest):
+    if not request.keyword.strip() or not request.url.strip():
+        return JSONResponse(content={"error": "keyword and url are required"}, status_code=400)
+    alert = await asyncio.to_thread(
+        create_alert, request.email, request.keyword, request.url, request.max_depth
+    )
+    return JSONResponse(content=alert, status_code=201)
+
+
+@app.delete("/api/alerts/{alert_id}")
+async def delete_alert_api(alert_id: int):
+    if not await asyncio.to_thread(delete_alert, alert_id):
+        return JSONResponse(content={"error": "Unknown alert"}, status_code=404)
+    return JSONResponse(content={"deleted": alert_id})
+
+
+@app.post("/api/alerts/run")
+async def run_alerts_api():
+    """Checks every alert now (in the background) instead of waiting for the next scheduled run."""
+    if not get_alert_monitor().trigger():
+        return JSONResponse(content={"error": "An alert run is already in progress"}, status_code=409)
+    return JSONResponse(content={"started": True}, status_code=202)
+
+
+@app.get("/api/admin/history")
+async def alert_history_api():
+    return JSONResponse(content=await asyncio.to_thread(recent_history))
+
+
+@app.get("/metrics")
+async def metrics_api():
+    """Prometheus metrics: per-phase duration histograms and page/table/row/byte/cache-hit counters."""
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/admin/hosts")
+async def host_stats_api():
+    """Per-portal politeness state (adaptive concurrency, latency, back-offs) and circuit breaker state."""
+    hosts = get_host_scheduler().stats()
+    for host, circuit in get_circuit_breaker().stats().items():
+        hosts.setdefault(host, {})["circuit"] = circuit
+    return JSONResponse(content=hosts)
+
+
 @app.get("/api/tender-details")
 async def tender_details_api(url: str):
     """
@@ -0,0 +1,150 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Where scrape time goes. Code paths time themselves with `timed(phase)` and count what
+# they handled with `count(name, n)`; both feed the process-wide Prometheus metrics
+# served at /metrics and, inside `collect_timings()`, the `timings` block of that scrape.
+# Phases (wall-clock seconds; concurrent phases overlap, so they can add up to more
+# than the total):
+#   browser_launch, goto, native_search, search_submit (one navigation within a native
+#   search), ready_wait, snapshot (reading a live page), parse (BeautifulSoup, listing
+#   and detail pages), tables (filtering), http, prefetch, store, scrape (whole call)
+# Counts: pages, tables, rows, html_bytes, cache_hits
+PHASE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+COUNTS = ("pages", "tables", "rows", "html_bytes", "cache_hits")
+
+
+class _Histogram:
+    """Prometheus histogram with a single label."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._series: Dict[str, List[float]] = {}  # label value -> bucket counts + [sum, count]
+
+    def observe(self, value: str, seconds: float):
+        series = self._series.setdefault(value, [0.0] * (len(self.buckets) + 2))
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                series[i] += 1
+        series[-2] += seconds
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for value, series in sorted(self._series.items()):
+            label = f'{self.label}="{value}"'
+            for bound, observed in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{label},le="{bound}"}} {observed:g}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-1]:g}')
+            lines.append(f"{self.name}_sum{{{label}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {series[-1]:g}")
+        return lines
+
+
+class _Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter", f"{self.name} {self.value:g}"]
+
+
+_lock = threading.Lock()  # Parsing runs in worker threads too
+_phase_seconds = _Histogram(
+    "scraper_phase_seconds", "Time spent per scrape phase", "phase", PHASE_BUCKETS
+)
+_counters: Dict[str, _Counter] = {
+    "pages": _Counter("scraper_pages_total", "Pages scraped"),
+    "tables": _Counter("scraper_tables_total", "Tables extracted"),
+    "rows": _Counter("scraper_rows_total", "Table rows extracted"),
+    "html_bytes": _Counter("scraper_html_bytes_total", "Bytes of HTML read or parsed"),
+    "cache_hits": _Counter("scraper_cache_hits_total", "Pages answered from the page cache"),
+}
+
+
+class ScrapeTimings:
+    """Phase durations and counts of one scrape (see collect_timings)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, List[float]] = {}  # phase -> [count, seconds]
+        self.counts: Dict[str, int] = dict.fromkeys(COUNTS, 0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_s": round(time.perf_counter() - self.started, 3),
+            "phases": {
+                phase: {"count": int(count), "seconds": round(seconds, 3)}
+                for phase, (count, seconds) in sorted(self.phases.items(), key=lambda p: -p[1][1])
+            },
+            "counts": dict(self.counts),
+        }
+
+
+_current: contextvars.ContextVar[Optional[ScrapeTimings]] = contextvars.ContextVar("scrape_timings", default=None)
+
+
+def observe(phase: str, seconds: float):
+    with _lock:
+        _phase_seconds.observe(phase, seconds)
+        timings = _current.get()
+        if timings is not None:
+            entry = timings.phases.setdefault(phase, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Time the block as one `phase` (also when it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(phase, time.perf_counter() - started)
+
+
+def count(name: str, n: int = 1):
+    with _lock:
+        _counters[name].value += n
+        timings = _current.get()
+        if timings is not None:
+            timings.counts[name] += n
+
+
+@contextmanager
+def collect_timings() -> Iterator[ScrapeTimings]:
+    """
+    Collect the phases and counts of everything run inside the block, including tasks
+    and worker threads started from it. Nested blocks add to the outermost one.
+    """
+    timings = _current.get()
+    if timings is not None:
+        yield timings
+        return
+    timings = ScrapeTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        lines = _phase_seconds.render()
+        for counter in _counters.values():
+            lines.extend(counter.render())
+    return "\n".join(lines) + "\n"
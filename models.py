@@ -1,8 +1,79 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 
 Base = declarative_base()
 
-# All models placeholder - ready for future extensions
-# Email alerts functionality has been removed for performance optimization
+
+def utcnow() -> datetime.datetime:
+    """The current time for DateTime columns, which all hold naive UTC."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class Alert(Base):
+    """A saved keyword search that is re-run on a schedule."""
+    __tablename__ = "alerts"
+
+    id = Column(Integer, primary_key=True)
+    email = Column(String(255), nullable=False)
+    keyword = Column(String(255), nullable=False)
+    url = Column(String(500), nullable=False)
+    max_depth = Column(Integer)
+    created_at = Column(DateTime, default=utcnow)
+
+
+class ScrapedTender(Base):
+    """A tender already reported for an alert (one row per tender_hash)."""
+    __tablename__ = "scraped_tenders"
+
+    id = Column(Integer, primary_key=True)
+    alert_id = Column(Integer, ForeignKey("alerts.id"))
+    tender_hash = Column(String(64), unique=True, index=True)
+    tender_title = Column(Text)
+    found_url = Column(String(500))
+    found_at = Column(DateTime, default=utcnow)
+
+
+class Tender(Base):
+    """
+    One extracted tender row, keyed by `tender_hash` (portal + tender ID, else ref,
+    else row content). `data` holds the row as scraped (JSON), `details` the fields
+    pre-fetched from its detail page (JSON).
+    """
+    __tablename__ = "tenders"
+
+    id = Column(Integer, primary_key=True)
+    tender_hash = Column(String(64), unique=True, nullable=False)
+    portal = Column(String(255), nullable=False, index=True)
+    tender_id = Column(String(64), index=True)
+    ref = Column(String(255), index=True)
+    title = Column(Text)
+    organisation = Column(String(500), index=True)
+    closing_date = Column(DateTime, index=True)
+    closing_raw = Column(String(100))
+    opening_raw = Column(String(100))
+    url = Column(String(1000))
+    data = Column(Text, nullable=False)
+    details = Column(Text)
+    first_seen_at = Column(DateTime, nullable=False)
+    last_seen_at = Column(DateTime, nullable=False, index=True)
+
+
+class TenderSearch(Base):
+    """
+    One completed scrape: its parameters and the page/table layout of the result,
+    with rows referenced by tender_hash so a repeat search can be rebuilt from `tenders`.
+    """
+    __tablename__ = "tender_searches"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String(1000), nullable=False)
+    keyword = Column(String(255), nullable=False, default="")
+    max_depth = Column(Integer, nullable=False)
+    scraped_at = Column(DateTime, nullable=False)
+    row_count = Column(Integer, nullable=False, default=0)
+    layout = Column(Text, nullable=False)
+
+    __table_args__ = (
+        Index("ix_tender_searches_lookup", "url", "keyword", "max_depth", "scraped_at"),
+    )
@@ -0,0 +1,195 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from typing import Optional, List, Dict, Any
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+# Rendered page snapshots (*.html.gz). The committed *.html captures in tender_cache/ are
+# benchmark fixtures, not cache entries: the cache never reads, counts or evicts them.
+CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "tender_cache")
+CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", str(6 * 3600)))
+CACHE_MAX_MB = float(os.getenv("PAGE_CACHE_MAX_MB", "200"))
+# Run an eviction pass after this many writes rather than scanning on every put
+_EVICT_EVERY = 25
+
+_JSESSIONID_RE = re.compile(r';jsessionid=[^/?#]*', re.IGNORECASE)
+_TENDER_ID_RE = re.compile(r'\d{4}_[A-Za-z0-9]+_\d+(?:_\d+)?')
+# GePNIC detail pages print the ID in the cell after the "Tender ID" caption
+_DETAIL_TENDER_ID_RE = re.compile(
+    r'Tender ID\s*(?:<[^>]+>\s*)*[^<]*?(?:<[^>]+>\s*)*(' + _TENDER_ID_RE.pattern + ')', re.S
+)
+
+
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for cache keys: lower-case scheme and host, no default
+    port, no fragment or ;jsessionid, query parameters ordered by name (repeated
+    parameters such as GePNIC's `sp` keep their relative order).
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    path = _JSESSIONID_RE.sub("", parts.path) or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True), key=lambda kv: kv[0]))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def find_tender_id(text: str) -> Optional[str]:
+    """First GePNIC-style tender ID (e.g. 2026_NHAI_268271_1) in a ref, title or row text."""
+    match = _TENDER_ID_RE.search(text or "")
+    return match.group(0) if match else None
+
+
+def find_detail_tender_id(html: str) -> Optional[str]:
+    """The tender ID shown on a GePNIC tender detail page, if the page is one."""
+    match = _DETAIL_TENDER_ID_RE.search(html or "")
+    return match.group(1) if match else None
+
+
+def cache_keys(url: Optional[str] = None, tender_id: Optional[str] = None) -> List[str]:
+    """Cache keys for a page, most specific first. Tender IDs survive session changes; URLs do not."""
+    keys = []
+    if tender_id:
+        keys.append("tender:" + tender_id.strip().upper())
+    if url:
+        keys.append("url:" + normalize_url(url))
+    return keys
+
+
+class PageCache:
+    """
+    Gzip-compressed HTML snapshots keyed by normalized URL or tender ID.
+
+    Each file starts with a one-line JSON header (key, source URL, stored-at time)
+    followed by the HTML. Writes go to a temp file in the same directory and are
+    renamed into place, so concurrent uvicorn workers never observe partial files.
+    The file mtime tracks last access and drives LRU eviction once the directory
+    exceeds its size budget.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, ttl: float = CACHE_TTL, max_mb: float = CACHE_MAX_MB):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.md5(key.encode("utf-8")).hexdigest() + ".html.gz")
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[str]:
+        max_age = self.ttl if max_age is None else max_age
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                if time.time() - header.get("stored_at", 0) > max_age:
+                    raise LookupError("expired")
+                html = f.read()
+            self._touch(path)
+        except (LookupError, OSError, ValueError, EOFError):
+            html = None
+
+        if html is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return html
+
+    def get_any(self, keys: List[str], max_age: Optional[float] = None) -> Optional[str]:
+        for key in keys:
+            html = self.get(key, max_age)
+            if html is not None:
+                return html
+        return None
+
+    def put(self, key: str, html: str, url: Optional[str] = None):
+        path = self._path(key)
+        header = json.dumps({"key": key, "url": url, "stored_at": time.time()})
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                f.write(header.encode("utf-8") + b"\n" + html.encode("utf-8"))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Page cache write failed for {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+
+        self._puts += 1
+        if self._puts % _EVICT_EVERY == 0:
+            self.evict()
+
+    def put_many(self, keys: List[str], html: str, url: Optional[str] = None):
+        for key in keys:
+            self.put(key, html, url)
+
+    def _touch(self, path: str):
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    def evict(self) -> int:
+        """
+        Drop least-recently-used snapshots until the directory is back under 90% of its
+        budget. Files vanishing underneath us (another worker evicting) are ignored.
+        """
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(".html.gz"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        except OSError:
+            return 0
+        if total <= self.max_bytes:
+            return 0
+
+        removed = 0
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+            total -= size
+        logger.info(f"Page cache evicted {removed} snapshots ({total // 1024} KB remain)")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "directory": self.directory}
+
+
+_default_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> PageCache:
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = PageCache()
+    return _default_cache
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+from page_cache import normalize_url, find_tender_id
+
+logger = logging.getLogger(__name__)
+
+# What each crawled page (per search keyword) looked like last time: a fingerprint of its
+# tables' text and, per table, the identity and content hash of every row. Incremental
+# crawls compare against it to skip unchanged pages and report only new or changed rows.
+FINGERPRINT_DIR = os.getenv("FINGERPRINT_DIR", os.path.join("user_data", "fingerprints"))
+
+
+def _digest(value: Any) -> str:
+    return hashlib.sha1(json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def page_fingerprint(raw_tables: List[Dict[str, Any]]) -> str:
+    """
+    Hash of the text of every raw table on a page. Cell links are left out: GePNIC
+    issues new session tokens in them on every visit.
+    """
+    return _digest([[t["headers"], [[cell[0] for cell in row] for row in t["rows"]]] for t in raw_tables])
+
+
+def row_fingerprint(row: Dict[str, Any]) -> Tuple[str, str]:
+    """(identity, content hash) of a row. The identity is its tender ID when it shows one."""
+    fields = {k: v for k, v in row.items() if not k.startswith('_')}
+    content = _digest(fields)
+    return find_tender_id(" ".join(str(v) for v in fields.values())) or content, content
+
+
+def table_fingerprints(tables: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-table row fingerprints keyed by the table's column headers."""
+    fingerprints: Dict[str, Dict[str, Any]] = {}
+    for table in tables:
+        headers = [k for k in (table["data"][0] if table["data"] else {}) if not k.startswith('_')]
+        signature = _digest(headers)
+        while signature in fingerprints:  # Several tables with the same columns
+            signature = _digest([signature])
+        rows = dict(row_fingerprint(row) for row in table["data"])
+        fingerprints[signature] = {"hash": _digest(sorted(rows.items())), "rows": rows}
+    return fingerprints
+
+
+def diff_tables(
+    tables: List[Dict[str, Any]],
+    previous: Optional[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """
+    Compare freshly built tables with a page's previous fingerprint record. Returns
+    (tables trimmed to new and changed rows, the page's new table fingerprints, counts).
+    Kept rows are marked `_change: "new" | "changed"`; tables with nothing new are dropped.
+    """
+    current = table_fingerprints(tables)
+    before = (previous or {}).get("tables", {})
+    counts = {"tables_unchanged": 0, "tables_changed": 0, "rows_new": 0, "rows_changed": 0, "rows_removed": 0}
+    changed_tables: List[Dict[str, Any]] = []
+
+    for table, (signature, fingerprint) in zip(tables, current.items()):
+        old = before.get(signature)
+        if old is not None and old["hash"] == fingerprint["hash"]:
+            counts["tables_unchanged"] += 1
+            continue
+        counts["tables_changed"] += 1
+        old_rows = (old or {}).get("rows", {})
+        kept = []
+        for row in table["data"]:
+            identity, content = row_fingerprint(row)
+            if identity not in old_rows:
+                row["_change"] = "new"
+            elif old_rows[identity] != content:
+                row["_change"] = "changed"
+            else:
+                continue
+            counts["rows_" + row["_change"]] += 1
+            kept.append(row)
+        counts["rows_removed"] += len(set(old_rows) - set(fingerprint["rows"]))
+        if kept:
+            changed_tables.append({**table, "row_count": len(kept), "data": kept})
+
+    for signature, old in before.items():
+        if signature not in current:
+            counts["rows_removed"] += len(old["rows"])
+    return changed_tables, current, counts
+
+
+class FingerprintStore:
+    """
+    Last-seen fingerprints per (normalized URL, search keyword), one JSON file each in
+    `directory`. With no directory they are only kept for the life of the process.
+    """
+
+    def __init__(self, directory: Optional[str] = FINGERPRINT_DIR):
+        self.directory = directory
+        self._memory: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _key(url: str, search_keyword: Optional[str]) -> str:
+        return _digest([normalize_url(url), (search_keyword or "").strip().lower()])
+
+    def _path(self, key: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, url: str, search_keyword: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        key = self._key(url, search_keyword)
+        if key in self._memory:
+            return self._memory[key]
+        path = self._path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable fingerprint {path}: {e}")
+            return None
+        self._memory[key] = record
+        return record
+
+    def put(self, url: str, search_keyword: Optional[str], page: str, tables: Dict[str, Dict[str, Any]]):
+        key = self._key(url, search_keyword)
+        record = {"url": url, "page": page, "tables": tables, "seen_at": time.time()}
+        self._memory[key] = record
+        path = self._path(key)
+        if not path:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError as e:
+            logger.warning(f"Could not save page fingerprint for {url}: {e}")
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save page fingerprint for {url}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_default_store: Optional[FingerprintStore] = None
+
+
+def get_fingerprint_store() -> FingerprintStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = FingerprintStore()
+    return _default_store
@@ -0,0 +1,111 @@
+import logging
+import os
+import time
+from typing import Optional, Dict, Any
+from urllib.parse import urlparse
+
+from metrics import observe
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for a single readiness wait, and how long the DOM must stay unchanged
+# before the page is considered settled.
+READY_MAX_WAIT_MS = int(os.getenv("READY_MAX_WAIT_MS", "8000"))
+READY_QUIET_MS = int(os.getenv("READY_QUIET_MS", "400"))
+
+# GePNIC portals render detail pages as td.td_caption/td.td_field pairs and listings
+# as table.list_table, so either one appearing means the useful content is in the DOM.
+_GEPNIC_READY_SELECTOR = "td.td_caption, table.list_table, table#table"
+
+# Per-site selectors that only exist once a page's data has rendered.
+# Hosts not listed here fall back to pure DOM/row-count quiescence.
+SITE_READY_SELECTORS: Dict[str, str] = {
+    "etenders.gov.in": _GEPNIC_READY_SELECTOR,
+    "eprocure.gov.in": _GEPNIC_READY_SELECTOR,
+    "defproc.gov.in": _GEPNIC_READY_SELECTOR,
+    "pmgsytenders.gov.in": _GEPNIC_READY_SELECTOR,
+}
+
+# Runs inside the page. Resolves once the target selector (if any) is present, no DOM
+# mutation has happened for `quietMs`, and the <tr> count has held steady across two
+# polls. A page missing the target is accepted after five quiet periods; otherwise the
+# wait ends when `maxMs` runs out.
+_READINESS_JS = """
+async ({selector, quietMs, maxMs, scroll}) => {
+    const start = performance.now();
+    let lastMutation = start;
+    const observer = new MutationObserver(() => { lastMutation = performance.now(); });
+    observer.observe(document, {childList: true, subtree: true, characterData: true});
+    if (scroll) {
+        // Touch the bottom of the page once so lazy-loaded sections start fetching
+        window.scrollTo(0, document.body ? document.body.scrollHeight : 0);
+    }
+    let rows = -1, stablePolls = 0, reason = 'budget';
+    try {
+        while (performance.now() - start < maxMs) {
+            await new Promise(r => setTimeout(r, 100));
+            const rowCount = document.querySelectorAll('tr').length;
+            stablePolls = rowCount === rows ? stablePolls + 1 : 0;
+            rows = rowCount;
+            const hasTarget = !selector || document.querySelector(selector) !== null;
+            const quiet = performance.now() - lastMutation >= quietMs;
+            if (hasTarget && quiet && stablePolls >= 2) {
+                reason = selector ? 'selector' : 'quiescent';
+                break;
+            }
+            // Target never showed up but the page has long stopped changing
+            if (!hasTarget && stablePolls >= 2 && performance.now() - lastMutation >= quietMs * 5) {
+                reason = 'quiescent';
+                break;
+            }
+        }
+    } finally {
+        observer.disconnect();
+        if (scroll) window.scrollTo(0, 0);
+    }
+    return {reason, rows};
+}
+"""
+
+
+def ready_selector_for(url: str) -> Optional[str]:
+    """Look up the readiness selector for a URL's host (subdomains included)."""
+    host = urlparse(url).netloc.lower().split(':')[0]
+    for site, selector in SITE_READY_SELECTORS.items():
+        if host == site or host.endswith("." + site):
+            return selector
+    return None
+
+
+async def wait_until_ready(
+    page,
+    url: Optional[str] = None,
+    selector: Optional[str] = None,
+    max_wait_ms: int = READY_MAX_WAIT_MS,
+    quiet_ms: int = READY_QUIET_MS,
+    scroll: bool = False,
+) -> Dict[str, Any]:
+    """
+    Wait until the page has actually finished rendering instead of sleeping a fixed time.
+
+    Returns {"reason", "rows", "waited_ms"} where reason is 'selector' or 'quiescent' when
+    the page settled, 'budget' when max_wait_ms ran out, or 'error' if the page navigated
+    away or closed mid-wait.
+    """
+    if selector is None and url:
+        selector = ready_selector_for(url)
+    started = time.monotonic()
+    try:
+        result = await page.evaluate(_READINESS_JS, {
+            "selector": selector,
+            "quietMs": quiet_ms,
+            "maxMs": max_wait_ms,
+            "scroll": scroll,
+        })
+    except Exception as e:
+        logger.debug(f"Readiness wait interrupted: {e}")
+        result = {"reason": "error", "rows": None}
+    result["waited_ms"] = int((time.monotonic() - started) * 1000)
+    observe("ready_wait", time.monotonic() - started)
+    logger.info(f"Page ready after {result['waited_ms']} ms ({result['reason']}){' for ' + url if url else ''}")
+    return result
@@ -0,0 +1,198 @@
+import logging
+import os
+from typing import Optional, List, Dict, Any
+
+from html_parsing import make_soup
+from metrics import count, timed
+from junk_filter import JunkRules
+
+logger = logging.getLogger(__name__)
+
+# How crawled pages rendered in the browser are read: "dom" runs one script inside the
+# page and receives compact JSON; "soup" serializes the page with page.content() and
+# parses it with BeautifulSoup. HTML from the cache and HTTP tiers always uses "soup".
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "dom")
+
+# A page snapshot is everything the crawler reads from a page:
+#   title, description (meta content or None), text (stripped strings joined by spaces),
+#   links (raw href values), base_href (raw <base href> or None), captcha (bool),
+#   tables: [{"index", "classes", "headers": [str], "rows": [[[text, href or None], ...]]}]
+# Header texts are the cell's stripped strings joined without a separator (get_text(strip=True));
+# cell texts are joined with single spaces (get_text(" ", strip=True)). Only tables with
+# at least two rows are listed, and rows carry no more cells than there are headers.
+
+# Runs inside the page. Mirrors BeautifulSoup's get_text rules: comments and the
+# contents of script/style/template/rt/rp are not text, and stripping uses Python's
+# definition of whitespace. Tables whose headers mark them as navigation are dropped
+# here already (the same rule is re-applied in Python) so they never cross the wire.
+# GePNIC nests its data tables inside layout tables whose rows repeat every inner cell,
+# so cell texts and hrefs are sent once in `strings` and cells refer to them by index
+# ([text index, href index or -1]); _expand_cells turns them back into raw rows. The
+# page's serialized length comes back as `html_length` for the html_bytes count.
+_DOM_SNAPSHOT_JS = """
+({layoutPatterns, layoutClasses}) => {
+    const WS = '[\\\\t\\\\n\\\\v\\\\f\\\\r\\\\x1c-\\\\x20\\\\x85\\\\xa0\\\\u1680\\\\u2000-\\\\u200a\\\\u2028\\\\u2029\\\\u202f\\\\u205f\\\\u3000]';
+    const trimRe = new RegExp('^' + WS + '+|' + WS + '+$', 'g');
+    const NOT_TEXT = new Set(['script', 'style', 'template', 'rt', 'rp']);
+    const names = (...n) => new Set(n);
+    const TABLE = names('table'), TR = names('tr'), THEAD = names('thead'), CELL = names('td', 'th');
+    const A = names('a'), BASE = names('base'), META = names('meta');
+
+    // Descendant elements of `root` with one of `wanted` names, in document order
+    const collect = (root, wanted) => {
+        const found = [];
+        const stack = Array.from(root.childNodes).reverse();
+        while (stack.length) {
+            const node = stack.pop();
+            if (node.nodeType !== 1) continue;
+            if (wanted.has(node.localName)) found.push(node);
+            for (let i = node.childNodes.length - 1; i >= 0; i--) stack.push(node.childNodes[i]);
+        }
+        return found;
+    };
+    const textParts = (root) => {
+        const parts = [];
+        const stack = [root];
+        while (stack.length) {
+            const node = stack.pop();
+            if (node.nodeType === 3) {
+                const text = node.nodeValue.replace(trimRe, '');
+                if (text) parts.push(text);
+                continue;
+            }
+            if (node.nodeType === 1 && NOT_TEXT.has(node.localName)) continue;
+            if (node.nodeType !== 1 && node.nodeType !== 9) continue;
+            for (let i = node.childNodes.length - 1; i >= 0; i--) stack.push(node.childNodes[i]);
+        }
+        return parts;
+    };
+
+    const strings = [], seen = new Map();
+    const intern = (value) => {
+        if (!seen.has(value)) { seen.set(value, strings.length); strings.push(value); }
+        return seen.get(value);
+    };
+    const tables = [];
+    collect(document, TABLE).forEach((table, index) => {
+        const rows = collect(table, TR);
+        if (rows.length < 2) return;
+        const thead = collect(table, THEAD)[0];
+        const headers = collect(thead || rows[0], CELL).map(c => textParts(c).join(''));
+        const classes = (table.getAttribute('class') || '').toLowerCase();
+        const headerString = headers.join(' ').toLowerCase();
+        const hits = layoutPatterns.filter(p => headerString.includes(p)).length;
+        if ((hits || layoutClasses.some(c => classes.includes(c))) && (headers.length < 2 || hits > 2)) return;
+        if (headers.length && headers[0].length > 300) return;
+        tables.push({
+            index,
+            classes,
+            headers,
+            rows: rows.slice(1).map(tr => collect(tr, CELL).slice(0, headers.length).map(cell => {
+                const link = collect(cell, A).find(a => a.hasAttribute('href'));
+                return [intern(textParts(cell).join(' ')), link ? intern(link.getAttribute('href')) : -1];
+            })),
+        });
+    });
+
+    const html = document.documentElement.outerHTML;
+    const base = collect(document, BASE).find(b => b.hasAttribute('href'));
+    const meta = collect(document, META).find(m => m.getAttribute('name') === 'description');
+    return {
+        title: document.title,
+        description: meta ? meta.getAttribute('content') : null,
+        text: textParts(document).join(' '),
+        links: collect(document, A).filter(a => a.hasAttribute('href')).map(a => a.getAttribute('href')),
+        base_href: base ? base.getAttribute('href') : null,
+        captcha: html.toLowerCase().includes('captcha'),
+        tables,
+        strings,
+        html_length: html.length,
+    };
+}
+"""
+
+
+def _expand_cells(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the string-table indices of an in-page snapshot into [text, href] cells."""
+    strings = snapshot.pop("strings")
+    for table in snapshot["tables"]:
+        table["rows"] = [
+            [[strings[text], strings[href] if href >= 0 else None] for text, href in row]
+            for row in table["rows"]
+        ]
+    return snapshot
+
+
+def snapshot_from_html(content: str, parser: Optional[str] = None) -> Dict[str, Any]:
+    """Build a page snapshot from serialized HTML with BeautifulSoup."""
+    count("html_bytes", len(content))
+    with timed("parse"):
+        return _snapshot_from_soup(make_soup(content, parser), content)
+
+
+def _snapshot_from_soup(soup, content: str) -> Dict[str, Any]:
+    title_tag = soup.title
+    meta_description = soup.find("meta", attrs={"name": "description"})
+    base_tag = soup.find('base', href=True)
+
+    tables: List[Dict[str, Any]] = []
+    for index, table in enumerate(soup.find_all('table')):
+        rows = table.find_all('tr')
+        if len(rows) < 2:
+            continue
+        thead = table.find('thead')
+        header_elements = (thead or rows[0]).find_all(['th', 'td'])
+        headers = [h.get_text(strip=True) for h in header_elements]
+        data_rows = []
+        for tr in rows[1:]:
+            cells = []
+            for cell in tr.find_all(['td', 'th'])[:len(headers)]:
+                a_tag = cell.find('a', href=True)
+                cells.append([cell.get_text(separator=" ", strip=True), str(a_tag['href']) if a_tag else None])
+            data_rows.append(cells)
+        tables.append({
+            "index": index,
+            "classes": str(table.get('class', '')).lower(),
+            "headers": headers,
+            "rows": data_rows,
+        })
+
+    return {
+        "title": " ".join(title_tag.get_text().split()) if title_tag else "",
+        "description": meta_description.get("content") if meta_description else None,
+        "text": ' '.join(soup.stripped_strings),
+        "links": [str(a['href']) for a in soup.find_all('a', href=True)],
+        "base_href": base_tag['href'] if base_tag else None,
+        "captcha": "captcha" in content.lower(),
+        "tables": tables,
+    }
+
+
+async def snapshot_from_page(page, junk: JunkRules, parser: Optional[str] = None,
+                             mode: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Snapshot a live page. In "dom" mode a single page.evaluate returns the snapshot;
+    if that fails (or in "soup" mode) the page is serialized and parsed instead, and
+    the HTML is kept under "html" so the caller can cache it.
+    """
+    with timed("snapshot"):
+        return await _read_page(page, junk, parser, mode)
+
+
+async def _read_page(page, junk: JunkRules, parser: Optional[str], mode: Optional[str]) -> Dict[str, Any]:
+    if (mode or EXTRACTION_MODE) == "dom":
+        try:
+            snapshot = await page.evaluate(_DOM_SNAPSHOT_JS, {
+                "layoutPatterns": junk.layout.patterns,
+                "layoutClasses": junk.layout_table_classes,
+            })
+            if snapshot:
+                count("html_bytes", snapshot.pop("html_length", 0))
+                return _expand_cells(snapshot)
+        except Exception as e:
+            logger.warning(f"In-page extraction failed, falling back to HTML parsing: {e}")
+    content = await page.content()
+    snapshot = snapshot_from_html(content, parser)
+    snapshot["title"] = await page.title()
+    snapshot["html"] = content
+    return snapshot
@@ -0,0 +1,91 @@
+import logging
+import re
+from typing import Optional, List, Dict, Any
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+logger = logging.getLogger(__name__)
+
+# GePNIC result listings are Tapestry tables paged by a TablePages component: numbered
+# linkPage links for a window of pages around the current one, linkFwd/linkBwd for the
+# neighbours and linkFirst/linkLast for the ends. The target page number is the last
+# `sp` parameter of each link, e.g.
+#   /eprocure/app?component=%24TablePages.linkPage&page=FrontEndAdvancedSearchResult
+#       &service=direct&session=T&sp=AFrontEndAdvancedSearchResult%2Ctable&sp=3
+_PAGER_COMPONENT_RE = re.compile(r'TablePages\.link(Page|Fwd|Last|Bwd|First)$')
+
+
+def pager_link(href: str, base_url: str) -> Optional[Dict[str, Any]]:
+    """(kind, page number, absolute URL) of a TablePages link, or None for any other link."""
+    url = urljoin(base_url, href.strip())
+    params = parse_qsl(urlsplit(url).query, keep_blank_values=True)
+    component = next((v for k, v in params if k == "component"), "")
+    match = _PAGER_COMPONENT_RE.search(component)
+    numbers = [v for k, v in params if k == "sp"]
+    if match is None or not numbers or not numbers[-1].isdigit():
+        return None
+    return {"kind": match.group(1).lower(), "number": int(numbers[-1]), "url": url}
+
+
+def result_page_url(pager_url: str, number: int) -> str:
+    """`pager_url` (any TablePages link of the listing) pointed at result page `number`."""
+    parts = urlsplit(pager_url)
+    params = parse_qsl(parts.query, keep_blank_values=True)
+    last_sp = max(i for i, (k, _) in enumerate(params) if k == "sp")
+    params[last_sp] = ("sp", str(number))
+    if any(k == "component" for k, _ in params):
+        params = [(k, re.sub(r'TablePages\.link\w+$', 'TablePages.linkPage', v) if k == "component" else v)
+                  for k, v in params]
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
+def find_result_pages(links: List[str], base_url: str) -> Optional[Dict[str, Any]]:
+    """
+    The paging links of a GePNIC result listing: {"pages": {number: url}, "next": number
+    or None, "last": number or None, "template": a link usable with result_page_url}.
+    None when the page has no TablePages links (a single page of results).
+    """
+    pages: Dict[int, str] = {}
+    next_number: Optional[int] = None
+    last: Optional[int] = None
+    template: Optional[str] = None
+    for href in links:
+        link = pager_link(href, base_url)
+        if link is None:
+            continue
+        template = template or link["url"]
+        if link["kind"] == "page":
+            pages.setdefault(link["number"], link["url"])
+        elif link["kind"] == "fwd":
+            next_number = link["number"]
+            pages.setdefault(link["number"], link["url"])
+        elif link["kind"] == "last":
+            last = link["number"]
+    if template is None:
+        return None
+    return {"pages": pages, "next": next_number, "last": last, "template": template}
+
+
+def merge_result_tables(first: List[Dict[str, Any]], more: List[List[Dict[str, Any]]]) -> int:
+    """
+    Append the rows of later result pages' raw tables (see page_snapshot), in page
+    order, to the table of the first page with the same position and headers, so every
+    result page lands in one table. Rows whose texts the table already holds (menus and
+    sidebars repeated on every page) are skipped, as are tables the first page does not
+    have. Returns the number of rows appended.
+    """
+    by_shape = {(t["index"], tuple(t["headers"])): t for t in first}
+    seen: Dict[int, set] = {}
+    added = 0
+    for tables in more:
+        for table in tables:
+            target = by_shape.get((table["index"], tuple(table["headers"])))
+            if target is None:
+                continue
+            texts_seen = seen.setdefault(id(target), {tuple(cell[0] for cell in row) for row in target["rows"]})
+            for row in table["rows"]:
+                texts = tuple(cell[0] for cell in row)
+                if texts not in texts_seen:
+                    texts_seen.add(texts)
+                    target["rows"].append(row)
+                    added += 1
+    return added
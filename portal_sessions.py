@@ -0,0 +1,442 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Optional, List, Dict, Any, Awaitable, Callable
+from urllib.parse import urlparse
+
+from browser_pool import get_pool
+from http_fetcher import touch_session
+
+logger = logging.getLogger(__name__)
+
+# GePNIC detail links carry session-bound `sp` tokens, so they only open in the server
+# session that produced them. The registry keeps that session (as a Playwright storage
+# state) per portal host and seeds every context it hands out with it.
+SESSION_STATE_DIR = os.getenv("SESSION_STATE_DIR", os.path.join("user_data", "sessions"))
+# Portal-side idle timeout: a session unused for longer is assumed dead and replayed
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "900"))
+# Live sessions are pinged this often, for up to SESSION_KEEPALIVE_FOR seconds after last use
+SESSION_KEEPALIVE_INTERVAL = float(os.getenv("SESSION_KEEPALIVE_INTERVAL", "240"))
+SESSION_KEEPALIVE_FOR = float(os.getenv("SESSION_KEEPALIVE_FOR", "3600"))
+
+
+# Host whose search lock the running task holds; tasks it starts inherit the hold
+_searching: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("searching_host", default=None)
+
+
+def portal_host(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class PortalSession:
+    """
+    One portal's server session: the storage state (cookies, local storage) of the
+    context that last used it, plus the page and search that produced it, so an expired
+    session can be rebuilt by replaying that search.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.storage_state: Optional[Dict[str, Any]] = None
+        self.entry_url: Optional[str] = None
+        self.search_keyword: Optional[str] = None
+        self.used_at = 0.0      # wall clock, so persisted sessions age across restarts
+        self.alive_at = 0.0     # last time the portal confirmed the session (use or keep-alive)
+        self.expired = False
+        # Bumped whenever the session is rebuilt; contexts holding an older generation
+        # carry dead cookies and must not write them back
+        self.generation = 0
+        self.lock = asyncio.Lock()
+        # The portal keeps one search result per session: held from a native search
+        # until its result pages and result rows' detail pages have been read (see
+        # PortalSessionRegistry.searching)
+        self.search_lock = asyncio.Lock()
+
+    @property
+    def cookies(self) -> List[Dict[str, Any]]:
+        return (self.storage_state or {}).get("cookies", [])
+
+    def cookies_for(self, url: str) -> List[Dict[str, Any]]:
+        """The stored cookies whose domain covers `url`'s host."""
+        host = urlparse(url).hostname or ""
+        return [
+            c for c in self.cookies
+            if host == c["domain"].lstrip('.') or host.endswith("." + c["domain"].lstrip('.'))
+        ]
+
+    def is_stale(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return self.expired or now - max(self.used_at, self.alive_at) > SESSION_IDLE_TIMEOUT
+
+    def replay_url(self) -> str:
+        return self.entry_url or f"https://{self.host}/"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "entry_url": self.entry_url,
+            "search_keyword": self.search_keyword,
+            "used_at": self.used_at,
+            "alive_at": self.alive_at,
+            "expired": self.expired,
+            "storage_state": self.storage_state,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PortalSession":
+        session = cls(data["host"])
+        session.entry_url = data.get("entry_url")
+        session.search_keyword = data.get("search_keyword")
+        session.used_at = float(data.get("used_at") or 0)
+        session.alive_at = float(data.get("alive_at") or 0)
+        session.expired = bool(data.get("expired"))
+        session.storage_state = data.get("storage_state")
+        return session
+
+
+class LazySessionContext:
+    """
+    A portal session's browser context, taken from the registry only once something
+    needs a browser: `new_page()` or a session replay. Until then `cookies` and
+    `add_cookies` read and update the session's stored cookies, so the page cache and
+    plain HTTP tiers (see http_fetcher) serve pages without a pool slot.
+    """
+
+    def __init__(
+        self,
+        registry: "PortalSessionRegistry",
+        url: Optional[str],
+        on_open: Optional[Callable[[Any], Awaitable[None]]] = None,
+        **context_options,
+    ):
+        self.registry = registry
+        self.url = url
+        self.context = None
+        self._on_open = on_open
+        self._options = context_options
+        self._stack = AsyncExitStack()
+        self._opening = asyncio.Lock()
+
+    @property
+    def generation(self) -> Optional[int]:
+        if self.context is not None:
+            return self.registry.generation_of(self.context)
+        # Stored cookies are always the session's current ones
+        return self.registry.get(self.url).generation if self.url and portal_host(self.url) else None
+
+    async def open(self):
+        """The pooled context, acquired (and set up with `on_open`) on first call."""
+        async with self._opening:
+            if self.context is None:
+                context = await self._stack.enter_async_context(self.registry.context(self.url, **self._options))
+                if self._on_open is not None:
+                    await self._on_open(context)
+                self.context = context
+        return self.context
+
+    async def new_page(self):
+        return await (await self.open()).new_page()
+
+    async def cookies(self, urls=None) -> List[Dict[str, Any]]:
+        if self.context is not None:
+            return await self.context.cookies(urls)
+        if not self.url or not portal_host(self.url):
+            return []
+        session = self.registry.get(self.url)
+        if session.expired:
+            return []
+        return session.cookies_for(urls if isinstance(urls, str) else self.url)
+
+    async def add_cookies(self, cookies: List[Dict[str, Any]]):
+        if self.context is not None:
+            await self.context.add_cookies(cookies)
+        elif self.url and portal_host(self.url):
+            self.registry.store_cookies(self.url, cookies)
+
+    async def aclose(self):
+        await self._stack.aclose()
+        self.context = None
+
+
+class PortalSessionRegistry:
+    """
+    Warm portal sessions keyed by host. `context(url)` hands out a pooled browser
+    context pre-loaded with the host's session and stores the context's state back when
+    it is released; `refresh` rebuilds an expired session by replaying the last search.
+    A background task pings live sessions over plain HTTP so they do not time out
+    between calls. Sessions are persisted to SESSION_STATE_DIR.
+    """
+
+    def __init__(self, state_dir: Optional[str] = SESSION_STATE_DIR):
+        self.state_dir = state_dir
+        self._sessions: Dict[str, PortalSession] = {}
+        self._leases: Dict[Any, int] = {}   # context -> generation of the cookies it holds
+        self._keepalive: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._keepalive is None and SESSION_KEEPALIVE_INTERVAL > 0:
+            self._keepalive = asyncio.create_task(self._keepalive_loop())
+        return self
+
+    async def close(self):
+        if self._keepalive is not None:
+            self._keepalive.cancel()
+            await asyncio.gather(self._keepalive, return_exceptions=True)
+            self._keepalive = None
+        for session in self._sessions.values():
+            self._persist(session)
+
+    def get(self, url: str) -> PortalSession:
+        host = portal_host(url)
+        if host not in self._sessions:
+            self._sessions[host] = self._load(host) or PortalSession(host)
+        return self._sessions[host]
+
+    def generation_of(self, context) -> Optional[int]:
+        if isinstance(context, LazySessionContext):
+            return context.generation
+        return self._leases.get(context)
+
+    @asynccontextmanager
+    async def context(self, url: Optional[str] = None, **context_options):
+        """
+        A pooled context carrying the session of `url`'s portal. Without a URL this is a
+        plain pool context.
+        """
+        pool = await get_pool()
+        if not url or not portal_host(url):
+            async with pool.context(**context_options) as context:
+                yield context
+            return
+
+        session = self.get(url)
+        if session.storage_state and not session.expired:
+            context_options.setdefault("storage_state", session.storage_state)
+        async with pool.context(**context_options) as context:
+            self._leases[context] = session.generation
+            try:
+                yield context
+            finally:
+                await self._release(context, session)
+
+    @asynccontextmanager
+    async def lazy_context(
+        self,
+        url: Optional[str],
+        on_open: Optional[Callable[[Any], Awaitable[None]]] = None,
+        **context_options,
+    ):
+        """
+        Like `context(url)`, but the pooled context is only acquired when a browser is
+        needed (see LazySessionContext); `on_open(context)` then prepares it.
+        """
+        handle = LazySessionContext(self, url, on_open, **context_options)
+        try:
+            yield handle
+        finally:
+            await handle.aclose()
+
+    def store_cookies(self, url: str, cookies: List[Dict[str, Any]]):
+        """Merge cookies a portal set on a plain HTTP response into its stored session."""
+        session = self.get(url)
+        if not cookies or session.expired:
+            return
+        state = dict(session.storage_state or {"cookies": [], "origins": []})
+        key = lambda c: (c["name"], c["domain"], c.get("path", "/"))
+        merged = {key(c): c for c in state.get("cookies", [])}
+        merged.update((key(c), c) for c in cookies)
+        state["cookies"] = list(merged.values())
+        session.storage_state = state
+        session.used_at = session.alive_at = time.time()
+        self._persist(session)
+
+    async def _release(self, context, session: PortalSession):
+        generation = self._leases.pop(context, None)
+        if generation != session.generation:
+            return
+        try:
+            state = await context.storage_state()
+        except Exception as e:
+            logger.debug(f"Could not read storage state for {session.host}: {e}")
+            return
+        if state.get("cookies"):
+            session.storage_state = state
+            session.used_at = session.alive_at = time.time()
+            self._persist(session)
+
+    @asynccontextmanager
+    async def searching(self, url: str):
+        """
+        Hold the portal's search lock for a native search and everything that reads its
+        result (result pages, session-bound detail links). Re-entrant for the holder and
+        the tasks it starts, so a session refresh inside the block does not deadlock.
+        """
+        session = self.get(url)
+        if _searching.get() == session.host:
+            yield session
+            return
+        async with session.search_lock:
+            token = _searching.set(session.host)
+            try:
+                yield session
+            finally:
+                _searching.reset(token)
+
+    def remember_search(self, url: str, search_keyword: Optional[str] = None):
+        """Record the page (and search) that opened the session, for replay on expiry."""
+        session = self.get(url)
+        if search_keyword or not session.entry_url:
+            session.entry_url = url
+            session.search_keyword = search_keyword
+        session.expired = False
+        session.used_at = session.alive_at = time.time()
+
+    async def refresh(
+        self,
+        context,
+        url: str,
+        seen_generation: Optional[int],
+        replay: Callable[[PortalSession], Awaitable[None]],
+    ):
+        """
+        Give `context` a live session after it hit an expired one. If another caller has
+        already rebuilt the session since `seen_generation`, its cookies are adopted;
+        otherwise `replay(session)` re-runs the last search in `context` and the
+        resulting state becomes the host's session. A replay is a native search, so it
+        waits for the portal's search lock. Cookies are only ever overwritten, never
+        cleared, since other pages of `context` may be mid-request. A LazySessionContext
+        is only opened for a replay; until then it already reads the current cookies.
+        """
+        session = self.get(url)
+        async with self.searching(url), session.lock:
+            lazy = context if isinstance(context, LazySessionContext) else None
+            if lazy is not None:
+                context = lazy.context
+            if session.generation != seen_generation and session.cookies and not session.expired:
+                if context is None:
+                    return
+                await context.add_cookies(session.cookies)
+            else:
+                if context is None:
+                    context = await lazy.open()
+                logger.info(
+                    f"Refreshing {session.host} session by replaying "
+                    f"{session.replay_url()} (search: {session.search_keyword!r})"
+                )
+                session.expired = True
+                await replay(session)
+                session.storage_state = await context.storage_state()
+                session.generation += 1
+                session.expired = False
+                session.used_at = session.alive_at = time.time()
+                self._persist(session)
+            self._leases[context] = session.generation
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            host: {
+                "generation": s.generation,
+                "idle_s": round(now - s.used_at, 1) if s.used_at else None,
+                "stale": s.is_stale(now),
+                "search_keyword": s.search_keyword,
+            }
+            for host, s in self._sessions.items()
+        }
+
+    # ------------------------------------------------------------------
+    # Keep-alive
+    # ------------------------------------------------------------------
+
+    async def _keepalive_loop(self):
+        while True:
+            await asyncio.sleep(SESSION_KEEPALIVE_INTERVAL)
+            now = time.time()
+            for session in list(self._sessions.values()):
+                if session.is_stale(now) or not session.cookies or not session.entry_url:
+                    continue
+                if now - session.used_at > SESSION_KEEPALIVE_FOR:
+                    continue
+                try:
+                    await self._ping(session)
+                except Exception as e:
+                    logger.debug(f"Keep-alive for {session.host} failed: {e}")
+
+    async def _ping(self, session: PortalSession):
+        sent = {c["name"]: c["value"] for c in session.cookies_for(session.entry_url)}
+        received = await touch_session(session.entry_url, sent)
+        if received is None:
+            return
+        if any(c["name"] in sent and sent[c["name"]] != c["value"] for c in received):
+            # The portal issued a new session cookie: the old session (and every
+            # session-bound link made in it) is gone
+            logger.info(f"{session.host} session expired; it will be replayed on next use")
+            session.expired = True
+        else:
+            session.alive_at = time.time()
+        self._persist(session)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _path(self, host: str) -> Optional[str]:
+        if not self.state_dir:
+            return None
+        return os.path.join(self.state_dir, host.replace(':', '_') + ".json")
+
+    def _load(self, host: str) -> Optional[PortalSession]:
+        path = self._path(host)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding="utf-8") as f:
+                session = PortalSession.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable session state {path}: {e}")
+            return None
+        logger.info(f"Loaded {host} session state (stale: {session.is_stale()})")
+        return session
+
+    def _persist(self, session: PortalSession):
+        path = self._path(session.host)
+        if not path:
+            return
+        try:
+            os.makedirs(self.state_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix=".tmp")
+        except OSError as e:
+            logger.warning(f"Could not save session state for {session.host}: {e}")
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(session.as_dict(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not save session state for {session.host}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+_default_registry: Optional[PortalSessionRegistry] = None
+
+
+def set_default_registry(registry: Optional[PortalSessionRegistry]):
+    """Install the registry owned by the application lifespan."""
+    global _default_registry
+    _default_registry = registry
+
+
+async def get_registry() -> PortalSessionRegistry:
+    """Returns the shared registry, creating one on first use outside the FastAPI lifespan."""
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = PortalSessionRegistry()
+    return await _default_registry.start()
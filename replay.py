@@ -0,0 +1,159 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Optional, Dict, Any, Tuple
+
+from page_cache import CACHE_DIR, normalize_url
+
+logger = logging.getLogger(__name__)
+
+# Record/replay of browser traffic, for deterministic offline crawls and benchmarks.
+# REPLAY_MODE=record saves every response the engine's browser contexts receive into
+# REPLAY_DIR; REPLAY_MODE=replay answers every request from that recording (never the
+# network), optionally after REPLAY_LATENCY_MS, and fails requests it has no recording
+# for. The plain-HTTP tier is skipped in both modes so every page goes through the browser.
+REPLAY_MODE = os.getenv("REPLAY_MODE", "off")
+REPLAY_DIR = os.getenv("REPLAY_DIR", os.path.join(CACHE_DIR, "replay"))
+REPLAY_LATENCY_MS = float(os.getenv("REPLAY_LATENCY_MS", "0"))
+
+MODES = ("off", "record", "replay")
+# Headers describing the original transfer, not the decoded body we store
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive"}
+
+
+def request_keys(method: str, url: str, body: Optional[bytes] = None) -> Tuple[str, ...]:
+    """
+    Recording keys for a request, most specific first. A request with a body (GePNIC's
+    search form posts) is keyed by its body too, and falls back to the latest response
+    for the same method and URL.
+    """
+    loose = f"{method.upper()} {normalize_url(url)}"
+    if not body:
+        return (loose,)
+    return (f"{loose} {hashlib.sha1(body).hexdigest()[:16]}", loose)
+
+
+class ReplayStore:
+    """
+    Recorded responses for browser contexts, installed with `install(context)`.
+
+    Each response is a gzip file in `directory` with a one-line JSON header (key,
+    URL, status, headers) followed by the body, written like PageCache entries (temp
+    file renamed into place). A request recorded more than once keeps its latest
+    response. Redirects are recorded and replayed hop by hop.
+    """
+
+    def __init__(self, mode: str = REPLAY_MODE, directory: str = REPLAY_DIR, latency_ms: float = REPLAY_LATENCY_MS):
+        if mode not in MODES:
+            logger.warning(f"Unknown REPLAY_MODE '{mode}', record/replay disabled")
+            mode = "off"
+        self.mode = mode
+        self.directory = directory
+        self.latency = max(0.0, latency_ms) / 1000
+        self.counters = {"recorded": 0, "replayed": 0, "missing": 0, "errors": 0}
+        if mode != "off":
+            os.makedirs(directory, exist_ok=True)
+            logger.info(f"Browser traffic {mode} mode using {directory}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.md5(key.encode("utf-8")).hexdigest() + ".resp.gz")
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        try:
+            with gzip.open(self._path(key), "rb") as f:
+                header = json.loads(f.readline())
+                return header, f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, EOFError) as e:
+            logger.warning(f"Unreadable recording for {key}: {e}")
+            return None
+
+    def put(self, key: str, url: str, status: int, headers: Dict[str, str], body: bytes):
+        header = json.dumps({"key": key, "url": url, "status": status, "headers": headers})
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                f.write(header.encode("utf-8") + b"\n" + body)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logger.warning(f"Recording write failed for {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    async def _record(self, route):
+        request = route.request
+        try:
+            response = await route.fetch(max_redirects=0)
+            body = await response.body()
+        except Exception as e:
+            # Let the browser make the request itself so the failure looks like a live one
+            self.counters["errors"] += 1
+            logger.debug(f"Could not record {request.url}: {e}")
+            await route.fallback()
+            return
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _TRANSFER_HEADERS}
+        for key in request_keys(request.method, request.url, request.post_data_buffer):
+            await asyncio.to_thread(self.put, key, request.url, response.status, headers, body)
+        self.counters["recorded"] += 1
+        await route.fulfill(status=response.status, headers=headers, body=body)
+
+    async def _replay(self, route):
+        request = route.request
+        recorded = None
+        for key in request_keys(request.method, request.url, request.post_data_buffer):
+            recorded = await asyncio.to_thread(self.get, key)
+            if recorded is not None:
+                break
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if recorded is None:
+            self.counters["missing"] += 1
+            logger.info(f"No recording for {request.method} {request.url}")
+            await route.abort("internetdisconnected")
+            return
+        header, body = recorded
+        self.counters["replayed"] += 1
+        await route.fulfill(status=header["status"], headers=header["headers"], body=body)
+
+    async def install(self, context):
+        """
+        Route every request of `context` through the recording. Handlers registered
+        later on the context (routing profiles) run first, so blocked requests are
+        neither recorded nor replayed.
+        """
+        if not self.enabled:
+            return
+        await context.route("**/*", self._replay if self.replaying else self._record)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "directory": self.directory, **self.counters}
+
+
+_default_store: Optional[ReplayStore] = None
+
+
+def set_default_replay_store(store: Optional[ReplayStore]):
+    global _default_store
+    _default_store = store
+
+
+def get_replay_store() -> ReplayStore:
+    global _default_store
+    if _default_store is None:
+        _default_store = ReplayStore()
+    return _default_store
@@ -0,0 +1,166 @@
+import logging
+import os
+import re
+from typing import Optional, List, Dict, Any, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Name of the profile applied to engine contexts ("off" disables interception)
+ROUTING_PROFILE = os.getenv("ROUTING_PROFILE", "gepnic")
+
+# Rough transfer sizes used to estimate what a blocked request would have cost.
+# The real size is unknown because the request never leaves the browser.
+_TYPICAL_BYTES = {
+    "image": 25_000,
+    "media": 250_000,
+    "font": 40_000,
+    "stylesheet": 15_000,
+    "script": 35_000,
+    "xhr": 5_000,
+    "fetch": 5_000,
+    "websocket": 2_000,
+    "eventsource": 2_000,
+}
+
+
+class RoutingProfile:
+    """
+    Decides which requests a context may make. Allow patterns win over everything,
+    then URL patterns are blocked, then whole resource types.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        blocked_types: Iterable[str] = (),
+        blocked_patterns: Iterable[str] = (),
+        allowed_patterns: Iterable[str] = (),
+    ):
+        self.name = name
+        self.blocked_types = frozenset(blocked_types)
+        self._blocked = self._compile(blocked_patterns)
+        self._allowed = self._compile(allowed_patterns)
+
+    @staticmethod
+    def _compile(patterns: Iterable[str]) -> Optional["re.Pattern"]:
+        patterns = list(patterns)
+        return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE) if patterns else None
+
+    def block_reason(self, url: str, resource_type: str) -> Optional[str]:
+        """Returns why the request should be blocked, or None to let it through."""
+        if self._allowed and self._allowed.search(url):
+            return None
+        if self._blocked and self._blocked.search(url):
+            return "pattern"
+        if resource_type in self.blocked_types:
+            return "type"
+        return None
+
+
+class RouteStats:
+    """Per-run counters for one intercepted context."""
+
+    def __init__(self, profile_name: str):
+        self.profile = profile_name
+        self.allowed = 0
+        self.blocked = 0
+        self.blocked_by_type: Dict[str, int] = {}
+        self.blocked_by_pattern = 0
+        self.estimated_bytes_saved = 0
+        self.bytes_received = 0
+
+    def record_blocked(self, resource_type: str, reason: str):
+        self.blocked += 1
+        self.blocked_by_type[resource_type] = self.blocked_by_type.get(resource_type, 0) + 1
+        if reason == "pattern":
+            self.blocked_by_pattern += 1
+        self.estimated_bytes_saved += _TYPICAL_BYTES.get(resource_type, 10_000)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "profile": self.profile,
+            "requests_allowed": self.allowed,
+            "requests_blocked": self.blocked,
+            "blocked_by_type": dict(self.blocked_by_type),
+            "blocked_by_pattern": self.blocked_by_pattern,
+            "estimated_bytes_saved": self.estimated_bytes_saved,
+            "bytes_received": self.bytes_received,
+        }
+
+
+# Third-party widgets and trackers seen on NIC portals. The NICCI chatbot alone pulls
+# in jQuery, SignalR, font-awesome and several stylesheets from niccicms.raj.nic.in.
+_WIDGET_PATTERNS: List[str] = [
+    r"niccicms\.",
+    r"/nicci/",
+    r"js/nicci\.js",
+    r"signalr",
+    r"font-awesome",
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"doubleclick\.net",
+    r"facebook\.(net|com)",
+    r"hotjar\.com",
+]
+
+PROFILES: Dict[str, RoutingProfile] = {
+    # Everything needed to drive GePNIC (Tapestry/gep scripts and the portal's own CSS,
+    # which decides element visibility for the native search box) stays allowed.
+    "gepnic": RoutingProfile(
+        "gepnic",
+        blocked_types=("image", "media", "font", "stylesheet"),
+        blocked_patterns=_WIDGET_PATTERNS,
+        allowed_patterns=(
+            r"/eprocure/css/",
+            r"/includes/dialog/[^?]*\.css",
+            r"/css/gep_style\.css",
+        ),
+    ),
+    # Only heavy binary content and trackers; use on sites that need their stylesheets.
+    "minimal": RoutingProfile(
+        "minimal",
+        blocked_types=("image", "media", "font"),
+        blocked_patterns=_WIDGET_PATTERNS,
+    ),
+}
+
+
+def get_profile(name: Optional[str] = None) -> Optional[RoutingProfile]:
+    name = name or ROUTING_PROFILE
+    if not name or name == "off":
+        return None
+    if name not in PROFILES:
+        logger.warning(f"Unknown routing profile '{name}', request interception disabled")
+        return None
+    return PROFILES[name]
+
+
+async def apply_routing_profile(context, profile_name: Optional[str] = None) -> RouteStats:
+    """
+    Install the routing profile on a browser context via context.route and return the
+    stats object that accumulates counts for everything the context loads afterwards.
+    """
+    profile = get_profile(profile_name)
+    stats = RouteStats(profile.name if profile else "off")
+
+    def _on_response(response):
+        length = response.headers.get("content-length")
+        if length and length.isdigit():
+            stats.bytes_received += int(length)
+
+    context.on("response", _on_response)
+    if profile is None:
+        return stats
+
+    async def _handle(route):
+        request = route.request
+        reason = profile.block_reason(request.url, request.resource_type)
+        if reason:
+            stats.record_blocked(request.resource_type, reason)
+            await route.abort("blockedbyclient")
+        else:
+            stats.allowed += 1
+            await route.fallback()
+
+    await context.route("**/*", _handle)
+    return stats
@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Optional, List, Dict, Any, AsyncIterator
+
+from fetch_policy import fetch_budget
+from tender_store import scrape_with_store
+
+logger = logging.getLogger(__name__)
+
+# Scrape jobs run in the background so no HTTP request has to stay open for a whole
+# crawl. JOB_CONCURRENCY jobs run at once; later ones wait in the queue (up to
+# JOB_MAX_QUEUED). Finished jobs are kept for JOB_RETENTION seconds, and at most
+# JOB_MAX_RETAINED of them are kept at all.
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "20"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "50"))
+# Page loads a job makes after JOB_TIME_BUDGET seconds fail at once, so a slow portal
+# ends the job with the pages gathered so far (0 disables)
+JOB_TIME_BUDGET = float(os.getenv("JOB_TIME_BUDGET", "1800"))
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class ScrapeJob:
+    """
+    One background scrape: its parameters, status, the progress events reported so far
+    (numbered by `seq`) and, once finished, the scrape result or error.
+    """
+
+    def __init__(self, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.events: List[Dict[str, Any]] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def emit(self, event: Dict[str, Any]):
+        event = {"seq": len(self.events), "ts": round(time.time(), 3), **event}
+        self.events.append(event)
+        # Wake every waiting stream, then re-arm for the next event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def set_status(self, status: str, **fields):
+        self.status = status
+        if status == "running":
+            self.started_at = time.time()
+        if status in FINISHED_STATES:
+            self.finished_at = time.time()
+        self.emit({"type": "status", "status": status, **fields})
+
+    async def stream(self, after: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Events with seq >= `after`, waiting for new ones until the job has finished."""
+        position = max(0, after)
+        while True:
+            changed = self._changed
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+    def as_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "events": len(self.events),
+            "pages_done": sum(1 for e in self.events if e["type"] == "page"),
+        }
+        if self.error:
+            data["error"] = self.error
+        if include_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Bounded scheduler for scrape jobs. `submit` queues a job and returns at once;
+    jobs start as one of the JOB_CONCURRENCY slots frees up. Finished jobs are pruned
+    by age and count whenever a new job is submitted.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = JOB_CONCURRENCY,
+        max_queued: int = JOB_MAX_QUEUED,
+        retention: float = JOB_RETENTION,
+        max_retained: int = JOB_MAX_RETAINED,
+    ):
+        self.max_queued = max_queued
+        self.retention = retention
+        self.max_retained = max_retained
+        self._jobs: Dict[str, ScrapeJob] = {}
+        self._slots = asyncio.Semaphore(max(1, concurrency))
+
+    def submit(self, params: Dict[str, Any]) -> ScrapeJob:
+        self._prune()
+        queued = sum(1 for j in self._jobs.values() if j.status == "queued")
+        if queued >= self.max_queued:
+            raise JobQueueFull(f"{queued} jobs already waiting")
+        job = ScrapeJob(params)
+        self._jobs[job.id] = job
+        job.emit({"type": "status", "status": "queued"})
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(f"Queued scrape job {job.id} for {params.get('url')}")
+        return job
+
+    def get(self, job_id: str) -> Optional[ScrapeJob]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[ScrapeJob]:
+        job = self._jobs.get(job_id)
+        if job is not None and not job.finished and job.task is not None:
+            job.task.cancel()
+        return job
+
+    async def close(self):
+        tasks = [j.task for j in self._jobs.values() if j.task is not None and not j.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    async def _run(self, job: ScrapeJob):
+        try:
+            async with self._slots:
+                job.set_status("running")
+                with fetch_budget(JOB_TIME_BUDGET):
+                    result = await scrape_with_store(**job.params, on_event=job.emit)
+            job.result = result
+            if "error" in result:
+                job.error = result["error"]
+                job.set_status("failed")
+            else:
+                job.set_status("completed", total_pages_scraped=result.get("total_pages_scraped", 0))
+        except asyncio.CancelledError:
+            job.set_status("cancelled")
+            logger.info(f"Scrape job {job.id} cancelled")
+        except Exception as e:
+            job.error = str(e)
+            job.set_status("failed", error=job.error)
+            logger.error(f"Scrape job {job.id} failed: {e}", exc_info=True)
+
+    def _prune(self):
+        now = time.time()
+        finished = sorted(
+            (j for j in self._jobs.values() if j.finished),
+            key=lambda j: j.finished_at or 0,
+        )
+        expired = [j for j in finished if now - (j.finished_at or now) > self.retention]
+        overflow = finished[:max(0, len(finished) - self.max_retained)]
+        for job in expired + overflow:
+            self._jobs.pop(job.id, None)
+
+
+_default_manager: Optional[JobManager] = None
+
+
+def set_default_job_manager(manager: Optional[JobManager]):
+    """Install the job manager owned by the application lifespan."""
+    global _default_manager
+    _default_manager = manager
+
+
+def get_job_manager() -> JobManager:
+    global _default_manager
+    if _default_manager is None:
+        _default_manager = JobManager()
+    return _default_manager
@@ -1,46 +1,64 @@
 import asyncio
-from typing import Optional, List, Dict, Any
-import random
+import contextlib
+import functools
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable, Tuple
+import csv
+import io
 import logging
 import os
+import random
+import re
+import time
 from urllib.parse import urljoin, urlparse
-from playwright.async_api import async_playwright
-from bs4 import BeautifulSoup
+
+from browser_pool import BrowserPool, set_default_pool
+from page_readiness import wait_until_ready
+from resource_blocking import apply_routing_profile
+from page_cache import get_page_cache, cache_keys, find_tender_id, find_detail_tender_id
+from page_fingerprints import get_fingerprint_store, page_fingerprint, table_fingerprints, diff_tables
+from http_fetcher import HTTP_FIRST, fetch_html
+from host_scheduler import get_host_scheduler
+from metrics import collect_timings, count, observe, timed
+from fetch_policy import CAPTCHA, HOME_PAGE, SESSION_EXPIRED, classify_exception, classify_page, fetch_with_policy
+from html_parsing import make_soup, TextIndex
+from junk_filter import JunkRules, junk_rules
+from page_snapshot import snapshot_from_html, snapshot_from_page
+from pagination import find_result_pages, merge_result_tables, result_page_url
+from portal_sessions import PortalSession, get_registry
+from replay import get_replay_store
+from search_index import get_search_index
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/118.0.0.0 Safari/537.36",
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/121.0"
-]
-
-# Junk patterns found in etenders.gov.in navigation, footer, and chatbot widgets.
-# Used to reject garbage from detail extraction.
-_DETAIL_JUNK = [
-    'screen reader', 'skip to main', 'nic chat', 'site compatibility',
-    'visitor no', 'mis reports', 'tenders by location', 'tenders by organisation',
-    'tenders by classification', 'tenders in archive', 'tenders status',
-    'cancelled/retendered', 'debarment list', 'announcements', 'awards',
-    'help for contractors', 'information about dsc', 'guidelines', 'bidders manual',
-    'eprocurement system', 'portal policies', 'national informatics centre',
-    'designed, developed', 'all rights reserved', 'site best viewed',
-    'nicci', 'digital assistant', 'help desk', 'chat interface',
-    'special characters', 'online bidder enrollment', 'forgot password',
-    'nodal officer', 'latest tenders', 'latest corrigendum', 'certifying agency',
-    'javascript has been disabled', 'corrigendum title', 'welcome to eprocurement',
-    'rate us', 'save chat', 'exit chat', 'clear chat', 'hindi voice',
-]
-
-def _is_detail_junk(text: str) -> bool:
-    """Check if text contains known junk patterns."""
-    t = text.lower()
-    return any(j in t for j in _DETAIL_JUNK)
-
-def _is_valid_detail_pair(field: str, value: str) -> bool:
+# Crawl frontier limits (overridable per call)
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "3"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "60"))
+CRAWL_TIME_BUDGET = float(os.getenv("CRAWL_TIME_BUDGET", "300"))
+# Keywords searched at once (one tab each) by a multi-keyword scrape
+SEARCH_TAB_CONCURRENCY = int(os.getenv("SEARCH_TAB_CONCURRENCY", "3"))
+# Further result pages walked after a native search (0 keeps only the first page), and
+# how many are fetched at once when the listing links them directly
+RESULT_PAGE_LIMIT = int(os.getenv("RESULT_PAGE_LIMIT", "10"))
+RESULT_PAGE_CONCURRENCY = int(os.getenv("RESULT_PAGE_CONCURRENCY", "2"))
+
+# Max age of crawled listing pages served from the page cache (detail pages use PAGE_CACHE_TTL)
+CRAWL_CACHE_TTL = float(os.getenv("CRAWL_CACHE_TTL", "900"))
+
+# Detail pre-fetch for keyword-matched rows (overridable per call)
+PREFETCH_MAX_ROWS = int(os.getenv("PREFETCH_MAX_ROWS", "60"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "8"))
+PREFETCH_DEADLINE = float(os.getenv("PREFETCH_DEADLINE", "90"))
+
+# Tender pages fetched in parallel by the bulk CSV export
+EXPORT_CONCURRENCY = int(os.getenv("EXPORT_CONCURRENCY", "6"))
+
+def _is_detail_junk(text: str, rules: Optional[JunkRules] = None) -> bool:
+    """Check if text contains known junk patterns (navigation, footer, chatbot widgets)."""
+    return (rules or junk_rules()).detail.search(text)
+
+def _is_valid_detail_pair(field: str, value: str, rules: Optional[JunkRules] = None) -> bool:
     """Validate that a field-value pair is clean tender data, not page junk."""
     if not field or not value:
         return False
@@ -51,7 +69,7 @@ def _is_valid_detail_pair(field: str, value: str) -> bool:
     if len(value) > 500:
         return False
     # Reject if either side contains known junk
-    if _is_detail_junk(field) or _is_detail_junk(value):
+    if _is_detail_junk(field, rules) or _is_detail_junk(value, rules):
         return False
     # Reject if field looks like concatenated text (too many words)
     if field.count(' ') > 15:
@@ -62,69 +80,324 @@ def _is_valid_detail_pair(field: str, value: str) -> bool:
     return True
 
 
-async def _fetch_tender_page_details(context, url: str) -> Dict[str, str]:
+_PAGE_ERRORS = {
+    SESSION_EXPIRED: "Session expired before details could be fetched",
+    HOME_PAGE: "Landed on home page instead of tender detail page",
+}
+
+
+def _session_expired(content: str) -> bool:
+    return classify_page(content) == SESSION_EXPIRED
+
+
+def _detail_page_error(content: str) -> Optional[str]:
+    """Reason a loaded page is not a usable tender page (expired session, bounced home), or None."""
+    kind = classify_page(content)
+    return _PAGE_ERRORS[kind] if kind else None
+
+
+async def _open_page(page, url: str, timeout: float, then: Optional[Callable[[], Awaitable[Any]]] = None):
+    """
+    Navigate `page` to `url` under the fetch policy (retries with backoff, time budgets,
+    circuit breaker) and the host scheduler. `then()` runs within the same attempt (for
+    a native search) but after the goto's host slot is released; its own navigations
+    take their own slots (see _navigate). Raises fetch_policy.FetchError when the page
+    cannot be loaded.
+    """
+    async def _attempt(seconds: float):
+        async with get_host_scheduler().slot(url):
+            with timed("goto"):
+                await page.goto(url, wait_until="networkidle", timeout=seconds * 1000)
+        if then is not None:
+            await then()
+
+    await fetch_with_policy(url, _attempt, timeout)
+
+
+async def _navigate(page, action: Callable[[], Awaitable[Any]], settle_ms: float):
+    """
+    One navigation started from a page (a search form submit or menu click). The host
+    slot covers `action()` until the new page has loaded, so the scheduler times it as
+    a single request; waiting up to `settle_ms` for the network to go quiet comes after.
+    """
+    async with get_host_scheduler().slot(page.url):
+        with timed("search_submit"):
+            await action()
+            try:
+                await page.wait_for_load_state("load", timeout=settle_ms)
+            except Exception:
+                pass
+    try:
+        await page.wait_for_load_state("networkidle", timeout=settle_ms)
+    except Exception:
+        pass
+
+
+def _cache_detail_page(url: str, content: str, tender_id: Optional[str] = None):
+    """Store a rendered tender page under its URL and tender ID, skipping error pages."""
+    if _detail_page_error(content) is not None:
+        return
+    keys = cache_keys(url, tender_id or find_detail_tender_id(content))
+    get_page_cache().put_many(keys, content, url)
+    get_search_index().index_html(url, content)
+
+
+def _cache_page(url: str, content: str, tender_id: Optional[str] = None, detail_page: bool = True):
     """
-    Visit a tender detail page in the SAME browser context (preserving the active session)
-    and extract clean key-value pairs from structured tables only.
-    Aggressively filters out navigation, footer, and chatbot junk.
+    Cache a usable page: detail pages under URL and tender ID, listing pages under URL
+    only. Replayed pages are not cached; they would mix the recording into live results.
+    """
+    if _detail_page_error(content) is not None or get_replay_store().replaying:
+        return
+    if detail_page:
+        _cache_detail_page(url, content, tender_id)
+    else:
+        get_page_cache().put_many(cache_keys(url), content, url)
+
+
+async def _fetch_without_browser(
+    context,
+    url: str,
+    tender_id: Optional[str] = None,
+    max_age: Optional[float] = None,
+    detail_page: bool = True,
+) -> Tuple[Optional[str], str]:
     """
+    The browser-free tiers of `_fetch_tiered`: the page cache, then a plain HTTP GET
+    carrying the browser context's cookies. Returns (content, tier), with content None
+    when the page needs a browser. A detail page that comes back as an expired session
+    or a bounce to the home page is returned as-is: a browser page would send the same
+    cookies and land on the same page, so the caller refreshes the session instead.
+    While browser traffic is recorded or replayed every page goes to the browser.
+    """
+    if get_replay_store().enabled:
+        return None, "browser"
+    keys = cache_keys(url, tender_id) if detail_page else cache_keys(url)
+    content = get_page_cache().get_any(keys, max_age=max_age)
+    if content is not None:
+        count("cache_hits")
+    if content is not None or not HTTP_FIRST:
+        return content, "cache"
+
+    keep = (lambda html: _detail_page_error(html) is not None) if detail_page else None
+    content, reason = await fetch_html(url, context, keep)
+    if content is not None:
+        reason = _detail_page_error(content)
+        if reason and detail_page:
+            return content, "http"
+        if reason:
+            content = None
+    if content is None:
+        logger.info(f"Escalating {url} to browser ({reason})")
+    else:
+        _cache_page(url, content, tender_id, detail_page)
+    return content, "http"
+
+
+async def _fetch_tiered(
+    context,
+    url: str,
+    render: Callable[[], Awaitable[str]],
+    tender_id: Optional[str] = None,
+    tiers: Optional[Dict[str, str]] = None,
+    max_age: Optional[float] = None,
+    detail_page: bool = True,
+) -> Tuple[str, str]:
+    """
+    Get a page's HTML from the cheapest tier that can serve it: the page cache, then a
+    plain HTTP GET carrying the browser context's cookies, then `render()` in a real
+    browser page. The HTTP answer is only used when it already holds the tables; an
+    expired-session or home-page bounce is returned for detail pages (see
+    `_fetch_without_browser`) and escalates to the browser for listing pages.
+
+    Returns (content, tier) with tier one of 'cache', 'http' or 'browser', and records
+    the tier under `url` in `tiers` when given. Usable pages are written to the cache.
+    """
+    content, tier = await _fetch_without_browser(context, url, tender_id, max_age, detail_page)
+    if content is None:
+        content = await render()
+        tier = "browser"
+        _cache_page(url, content, tender_id, detail_page)
+    if tiers is not None:
+        tiers[url] = tier
+    logger.debug(f"Fetched {url} via {tier}")
+    return content, tier
+
+
+def _tier_summary(tiers: Dict[str, str]) -> Dict[str, Any]:
+    """Per-tier counts plus the tier that served each URL, for run summaries."""
+    counts = {"cache": 0, "http": 0, "browser": 0}
+    for tier in tiers.values():
+        counts[tier] = counts.get(tier, 0) + 1
+    return {"counts": counts, "urls": dict(tiers)}
+
+
+def _extract_detail_pairs(content: str, parser: Optional[str] = None, url: Optional[str] = None) -> Dict[str, str]:
+    """
+    Extract clean key-value pairs from the structured tables of a tender detail page.
+    Aggressively filters out navigation, footer, and chatbot junk using the junk
+    rules of the portal serving `url`.
+    """
+    count("html_bytes", len(content))
+    with timed("parse"):
+        return _detail_pairs_from_soup(make_soup(content, parser), url)
+
+
+def _detail_pairs_from_soup(soup, url: Optional[str]) -> Dict[str, str]:
     details: Dict[str, str] = {}
+    rules = junk_rules(url)
+
+    # ONLY extract from tables — this is the reliable structured data on etenders.gov.in.
+    # The detail page uses 2-cell rows: <td>Label</td><td>Value</td>
+    for table in soup.find_all('table')[:15]:
+        # Skip tables whose text is mostly junk (nav menus, footer)
+        table_text_sample = table.get_text()[:300]
+        if _is_detail_junk(table_text_sample, rules):
+            continue
+
+        for row in table.find_all('tr'):
+            cells = row.find_all(['td', 'th'])
+
+            if len(cells) == 2:
+                # Standard label-value row
+                field = " ".join(cells[0].get_text(strip=True).split())
+                value = " ".join(cells[1].get_text(strip=True).split())
+                if _is_valid_detail_pair(field, value, rules) and field not in details:
+                    details[field] = value
+
+            elif len(cells) == 4:
+                # Some detail tables pack two pairs per row:
+                # <td>Label1</td><td>Value1</td><td>Label2</td><td>Value2</td>
+                for i in range(0, 4, 2):
+                    field = " ".join(cells[i].get_text(strip=True).split())
+                    value = " ".join(cells[i + 1].get_text(strip=True).split())
+                    if _is_valid_detail_pair(field, value, rules) and field not in details:
+                        details[field] = value
+    return details
+
+
+async def _render_detail_page(context, url: str) -> str:
+    """Load a tender detail page in the shared context and return its rendered HTML."""
     page = await context.new_page()
     try:
-        await page.goto(url, wait_until="networkidle", timeout=45000)
+        await _open_page(page, url, timeout=45)
         content = await page.content()
+        if _detail_page_error(content):
+            return content
 
-        # Check for session timeout
-        if "session has timed out" in content.lower() or "session expired" in content.lower():
-            return {"_error": "Session expired before details could be fetched"}
-
-        # Check if we landed on the home/search page instead of the detail page
-        if "welcome to eprocurement" in content.lower() and "tender details" not in content.lower():
-            return {"_error": "Landed on home page instead of tender detail page"}
-
-        # Wait for JS rendering
+        # Wait for JS rendering to settle, then re-grab content after the render
+        await wait_until_ready(page, url)
+        return await page.content()
+    finally:
         try:
-            await page.wait_for_selector("table", timeout=5000)
+            if not page.is_closed():
+                await page.close()
         except Exception:
             pass
-        await page.evaluate("() => new Promise(r => setTimeout(r, 3000))")
-
-        # Re-grab content after JS render
-        content = await page.content()
-        soup = BeautifulSoup(content, 'html.parser')
-
-        # ONLY extract from tables — this is the reliable structured data on etenders.gov.in.
-        # The detail page uses 2-cell rows: <td>Label</td><td>Value</td>
-        for table in soup.find_all('table')[:15]:
-            # Skip tables whose text is mostly junk (nav menus, footer)
-            table_text_sample = table.get_text()[:300].lower()
-            if _is_detail_junk(table_text_sample):
-                continue
 
-            for row in table.find_all('tr'):
-                cells = row.find_all(['td', 'th'])
 
-                if len(cells) == 2:
-                    # Standard label-value row
-                    field = " ".join(cells[0].get_text(strip=True).split())
-                    value = " ".join(cells[1].get_text(strip=True).split())
-                    if _is_valid_detail_pair(field, value) and field not in details:
-                        details[field] = value
-
-                elif len(cells) == 4:
-                    # Some detail tables pack two pairs per row:
-                    # <td>Label1</td><td>Value1</td><td>Label2</td><td>Value2</td>
-                    for i in range(0, 4, 2):
-                        field = " ".join(cells[i].get_text(strip=True).split())
-                        value = " ".join(cells[i + 1].get_text(strip=True).split())
-                        if _is_valid_detail_pair(field, value) and field not in details:
-                            details[field] = value
+async def _fetch_tender_page_details(
+    context,
+    url: str,
+    tender_id: Optional[str] = None,
+    tiers: Optional[Dict[str, str]] = None,
+    parser: Optional[str] = None,
+) -> Dict[str, str]:
+    """
+    Fetch a tender detail page with the SAME browser context's session (cache, then
+    plain HTTP with its cookies, then a browser page; an expired session is refreshed
+    and the page fetched again) and extract clean key-value pairs from structured
+    tables only.
+    """
+    try:
+        content, tier = await _fetch_in_session(
+            context, url, lambda: _render_detail_page(context, url), tender_id=tender_id, tiers=tiers
+        )
+        error = _detail_page_error(content)
+        if error:
+            return {"_error": error}
 
-        logger.info(f"Pre-fetched {len(details)} clean detail fields from {url}")
+        details = _extract_detail_pairs(content, parser, url)
+        logger.info(f"Pre-fetched {len(details)} clean detail fields from {url} ({tier})")
         return details
     except Exception as e:
         logger.warning(f"Failed to pre-fetch tender details from {url}: {e}")
         return {"_error": str(e)}
+
+
+async def _submit_native_search(page, search_keyword: str) -> bool:
+    """
+    SMART PORTAL ACCELERATOR
+    Try to use the portal's native search box on the current page.
+    This is specifically tuned for GePNIC / etenders.gov.in portals.
+    Returns True if a search was submitted.
+    """
+    started = time.perf_counter()
+    found_search = False
+    try:
+        # Selectors verified by live testing on etenders.gov.in
+        search_selectors = [
+            'input.textbox2',           # GePNIC Standard quick search
+            'input[id*="SearchKeyword"]',
+            'input[title*="Search"]',
+            'input#SearchKeyword'
+        ]
+
+        for selector in search_selectors:
+            try:
+                is_visible = await page.is_visible(selector, timeout=2000)
+                if is_visible:
+                    logger.info(f"Using native search box: {selector}")
+                    await page.click(selector)
+                    await page.fill(selector, search_keyword)
+
+                    # Try clicking the associated "Go" button first; wait for results
+                    # (government sites are slow)
+                    go_btn = page.locator('input[value="Go"], input.gobutton')
+                    if await go_btn.count() > 0 and await go_btn.first.is_visible(timeout=1000):
+                        await _navigate(page, go_btn.first.click, 15000)
+                    else:
+                        await _navigate(page, lambda: page.keyboard.press("Enter"), 15000)
+
+                    found_search = True
+                    logger.info("Native search submitted successfully.")
+                    break
+            except Exception:
+                continue
+
+        if not found_search:
+            # Fallback: look for "Search" or "Tender Search" link in nav
+            menu_link = page.locator('a:has-text("Search"), a:has-text("Tender Search")')
+            if await menu_link.count() > 0 and await menu_link.first.is_visible(timeout=1500):
+                logger.info("Navigating to dedicated Search page.")
+                await _navigate(page, menu_link.first.click, 8000)
+
+                search_page_input = page.locator('input[id*="tenderId"], input[id*="keyword"], input[id*="SearchKeyword"]')
+                if await search_page_input.count() > 0 and await search_page_input.first.is_visible(timeout=2000):
+                    await search_page_input.first.fill(search_keyword)
+                    await _navigate(page, lambda: page.keyboard.press("Enter"), 8000)
+                    found_search = True
+                    logger.info("Deep search submitted via Search page.")
+
+    except Exception as se:
+        logger.debug(f"Native search accelerator skipped: {se}")
+    observe("native_search", time.perf_counter() - started)
+    return found_search
+
+
+async def _replay_portal_search(context, session: PortalSession):
+    """
+    Open a fresh portal session in `context` by re-running the portal's last search. The
+    portal answers the dead session cookie with a new one, so the context's cookies are
+    left in place for the pages still using them.
+    """
+    page = await context.new_page()
+    try:
+        await _open_page(
+            page, session.replay_url(), timeout=60,
+            then=(lambda: _submit_native_search(page, session.search_keyword)) if session.search_keyword else None,
+        )
+        await wait_until_ready(page, session.replay_url())
     finally:
         try:
             if not page.is_closed():
@@ -133,371 +406,1046 @@ async def _fetch_tender_page_details(context, url: str) -> Dict[str, str]:
             pass
 
 
-async def scrape_dynamic_page(url: str, search_keyword: Optional[str] = None, max_depth: int = 1):
+async def _ensure_portal_session(context, url: str):
+    """Replay the portal's last search up front when its session has already gone stale."""
+    registry = await get_registry()
+    session = registry.get(url)
+    if session.entry_url and session.is_stale():
+        await registry.refresh(
+            context, url, registry.generation_of(context),
+            lambda s: _replay_portal_search(context, s),
+        )
+
+
+async def _fetch_in_session(
+    context,
+    url: str,
+    render: Callable[[], Awaitable[str]],
+    **fetch_options,
+) -> Tuple[str, str]:
+    """
+    `_fetch_tiered` in a registry context. A page that comes back as an expired session
+    or a bounce to the home page refreshes the portal session (replaying its last
+    search) and is fetched once more.
+    """
+    registry = await get_registry()
+    generation = registry.generation_of(context)
+    content, tier = await _fetch_tiered(context, url, render, **fetch_options)
+    if _detail_page_error(content) and generation is not None:
+        logger.info(f"Session rejected {url} ({_detail_page_error(content)}); refreshing and retrying")
+        get_host_scheduler().backoff(url, _detail_page_error(content))
+        await registry.refresh(context, url, generation, lambda s: _replay_portal_search(context, s))
+        content, tier = await _fetch_tiered(context, url, render, **fetch_options)
+    return content, tier
+
+
+async def _load_snapshot(
+    context,
+    url: str,
+    junk: JunkRules,
+    search_keyword: Optional[str] = None,
+    parser: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Open `url` in the shared context, optionally run the portal's native search, wait
+    for rendering to settle and return the page snapshot (see page_snapshot) with the
+    readiness result under "readiness". The page is closed as soon as it has been read
+    to keep memory low.
+    """
+    page = await context.new_page()
+    try:
+        await _open_page(
+            page, url, timeout=60,
+            then=(lambda: _submit_native_search(page, search_keyword)) if search_keyword else None,
+        )
+
+        # Let late JS rendering settle, then read the page after any navigation
+        readiness = await wait_until_ready(page, url)
+        snapshot = await snapshot_from_page(page, junk, parser)
+        snapshot["readiness"] = readiness
+        return snapshot
+    finally:
+        try:
+            if not page.is_closed():
+                await page.close()
+        except Exception:
+            pass
+
+
+async def _fetch_result_page(context, page_url: str, junk: JunkRules, parser: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Snapshot of one page of search results. Results belong to the live session and its
+    last search, so they bypass the page cache (and are not written to it).
+    """
+    if HTTP_FIRST:
+        content, reason = await fetch_html(page_url, context)
+        if content is not None and _detail_page_error(content) is None:
+            return snapshot_from_html(content, parser)
+        logger.info(f"Escalating result page {page_url} to browser ({reason or _detail_page_error(content)})")
+    return await _load_snapshot(context, page_url, junk, None, parser)
+
+
+async def _walk_result_pages(
+    context,
+    snapshot: Dict[str, Any],
+    page_url: str,
+    junk: JunkRules,
+    parser: Optional[str] = None,
+    page_limit: int = RESULT_PAGE_LIMIT,
+    concurrency: int = RESULT_PAGE_CONCURRENCY,
+    on_page: Optional[Callable[[int, str, int], None]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    PAGINATION WALKER
+    Fetch the further pages of a search result listing whose first page is `snapshot`
+    and merge their rows into its raw tables, so the rest of the crawl sees one page.
+    Pages the listing links directly (numbered links, or every page once the last page
+    number is known) are fetched `concurrency` at a time; otherwise each page's "next"
+    link is followed. At most `page_limit` further pages are fetched, and
+    `on_page(number, url, rows)` is called as each arrives.
+    Returns the walk's stats (pages, rows, rows/s), or None for a single-page listing.
+    """
+    base_url_for_links = page_url
+    if snapshot["base_href"] is not None:
+        base_url_for_links = urljoin(page_url, snapshot["base_href"])
+    pager = find_result_pages(snapshot["links"], base_url_for_links)
+    if pager is None or page_limit <= 0:
+        return None
+
+    started = time.perf_counter()
+    known: Dict[int, str] = dict(pager["pages"])
+    last: Optional[int] = pager["last"]
+    fetched: Dict[int, List[Dict[str, Any]]] = {}
+    failed: set = set()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def _fetch(number: int):
+        nonlocal last
+        async with semaphore:
+            try:
+                page = await _fetch_result_page(context, known[number], junk, parser)
+            except Exception as e:
+                logger.warning(f"Result page {number} of {page_url} failed: {e}")
+                failed.add(number)
+                return
+        fetched[number] = page["tables"]
+        more = find_result_pages(page["links"], known[number])
+        if more is not None:
+            for other, other_url in more["pages"].items():
+                known.setdefault(other, other_url)
+            last = more["last"] or last
+        if on_page is not None:
+            on_page(number, known[number], sum(len(t["rows"]) for t in page["tables"]))
+
+    while True:
+        if last is not None:
+            for number in range(2, last + 1):
+                known.setdefault(number, result_page_url(pager["template"], number))
+        budget = page_limit - len(fetched) - len(failed)
+        batch = sorted(n for n in known if n > 1 and n not in fetched and n not in failed)[:max(0, budget)]
+        if not batch:
+            break
+        await asyncio.gather(*(_fetch(n) for n in batch))
+
+    rows = merge_result_tables(snapshot["tables"], [fetched[n] for n in sorted(fetched)])
+    seconds = time.perf_counter() - started
+    stats = {
+        "pages": 1 + len(fetched),
+        "last_page": last,
+        "failed": len(failed),
+        "rows": rows,
+        "seconds": round(seconds, 2),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+    }
+    if last is not None and last > stats["pages"] + len(failed):
+        logger.info(f"Result page limit of {page_limit} reached on {page_url} ({last} pages listed)")
+    logger.info(f"Walked {stats['pages']} result pages of {page_url}: {rows} more rows, {stats['rows_per_second']} rows/s")
+    return stats
+
+
+def _is_layout_table(raw: Dict[str, Any], junk: JunkRules) -> bool:
+    """
+    Whether a snapshot table is page layout rather than data. The in-page snapshot
+    script drops these tables already; HTML snapshots keep them.
+    """
+    headers = raw["headers"]
+    # Layout tables (nav menus: several distinct layout patterns in the header)
+    nav_hits = junk.layout.counts(" ".join(headers).lower())
+    if nav_hits or junk.is_layout_class(raw["classes"]):
+        if len(headers) < 2 or len(nav_hits) > 2:
+            return True
+    # Header that looks like raw layout text
+    return len(headers) > 0 and len(headers[0]) > 300
+
+
+def _build_tables(
+    raw_tables: List[Dict[str, Any]],
+    base_url_for_links: str,
+    junk: JunkRules,
+    search_keyword: Optional[str] = None,
+):
+    """
+    TABLE EXTRACTION WITH POINT-TO-POINT FILTERING
+    Turn a snapshot's raw tables into `extracted_tables` entries, sorted by relevance.
+    Layout/navigation tables and rows are dropped; when searching, only rows containing
+    the exact keyword are kept. Returns (tables_data, matched_groups) where each group
+    is the full list of keyword-matched rows of one stored table, for detail pre-fetch.
+    """
+    started = time.perf_counter()
+    tables_data: List[Dict[str, Any]] = []
+    matched_groups: List[List[Dict[str, Any]]] = []
+    sk_lower = (search_keyword or "").lower()
+
+    for raw in raw_tables:
+        if _is_layout_table(raw, junk):
+            continue
+
+        headers = raw["headers"]
+        headers = [f"Col_{idx}" if not str(h).strip() else str(h) for idx, h in enumerate(headers)]
+
+        table_rows: List[Dict[str, Any]] = []
+        for cells in raw["rows"]:
+            if not cells:
+                continue
+
+            row_dict: Dict[str, Any] = {}
+            row_links: Dict[str, Any] = {}
+            for header_name, (text, href) in zip(headers, cells):
+                row_dict[header_name] = " ".join(text.split())
+
+                # Links from cells
+                if href is not None:
+                    link_href = href.strip()
+                    if not link_href.startswith(('javascript:', '#')):
+                        full_link = urljoin(base_url_for_links, link_href)
+                        row_links[header_name] = {"url": full_link.replace(" ", "%20")}
+
+            if row_dict:
+                row_text_check = " ".join(str(v) for v in row_dict.values()).lower()
+
+                # Skip navigation rows
+                if len(row_text_check) < 10:
+                    continue
+                if junk.is_junk_row(row_text_check):
+                    continue
+
+                row_data: Dict[str, Any] = dict(row_dict)
+                if row_links:
+                    row_data["_links"] = row_links
+                table_rows.append(row_data)
+
+        if not table_rows:
+            continue
+
+        table_text: str = str(table_rows).lower()
+        table_relevance: int = 0
+
+        # POINT-TO-POINT FILTERING: When searching, only return exact matches
+        if search_keyword:
+            # Skip entire table if it doesn't contain the keyword
+            if sk_lower not in table_text:
+                continue
+
+            # Keep ONLY the rows that contain the exact keyword
+            exact_match_rows: List[Dict[str, Any]] = []
+            for r in table_rows:
+                r_text = " ".join(str(v) for v in r.values()).lower()
+                if sk_lower in r_text:
+                    r["_highlight"] = True
+                    exact_match_rows.append(r)
+
+            if not exact_match_rows:
+                continue
+
+            table_rows = exact_match_rows
+            table_relevance = 1000  # Max priority for exact matches
+            matched_groups.append(exact_match_rows)
+
+        # Secondary relevance for non-keyword searches
+        tender_patterns = ['tender', 'bid', 'ref', 'opening', 'date', 'id', 'no', 'title', 'organisation']
+        is_tender_table = any(p in table_text for p in tender_patterns)
+        if is_tender_table and table_relevance == 0:
+            table_relevance += 20
+
+        # Store the table
+        if table_rows and (table_relevance > 0 or (len(table_rows) > 2 and len(headers) > 2)):
+            if len(table_rows) > 200:
+                table_rows = table_rows[:200]
+            tables_data.append({
+                "table_index": raw["index"],
+                "row_count": len(table_rows),
+                "is_likely_tender": is_tender_table,
+                "relevance": table_relevance,
+                "data": table_rows
+            })
+
+    # Sort tables within page by relevance
+    tables_data.sort(key=lambda x: x.get('relevance', 0), reverse=True)
+    observe("tables", time.perf_counter() - started)
+    count("tables", len(tables_data))
+    count("rows", sum(t["row_count"] for t in tables_data))
+    return tables_data, matched_groups
+
+
+async def _prefetch_row_details(
+    context,
+    rows: List[Dict[str, Any]],
+    max_rows: int = PREFETCH_MAX_ROWS,
+    concurrency: int = PREFETCH_CONCURRENCY,
+    deadline: float = PREFETCH_DEADLINE,
+    tiers: Optional[Dict[str, str]] = None,
+    parser: Optional[str] = None,
+    on_details: Optional[Callable[[str, Dict[str, str]], None]] = None,
+) -> int:
+    """
+    Fetch the detail page behind the first link of each row concurrently, in the SAME
+    context so the portal session stays valid. Rows are enriched in place with `_details`,
+    and `on_details(url, details)` is called as each page completes.
+    Fetches still running when `deadline` seconds elapse are cancelled and their rows
+    are returned un-enriched. Returns the number of rows enriched.
+    """
+    rows_by_url: Dict[str, List[Dict[str, Any]]] = {}
+    tender_ids: Dict[str, Optional[str]] = {}
+    for row_data in rows[:max_rows]:
+        for link_info in row_data.get('_links', {}).values():
+            if link_info and 'url' in link_info:
+                rows_by_url.setdefault(link_info['url'], []).append(row_data)
+                row_text = " ".join(str(v) for k, v in row_data.items() if not k.startswith('_'))
+                tender_ids.setdefault(link_info['url'], find_tender_id(row_text))
+                break  # Only visit first link per row
+    if not rows_by_url:
+        return 0
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    enriched = 0
+
+    async def _fetch_one(tender_url: str):
+        nonlocal enriched
+        async with semaphore:
+            logger.info(f"Pre-fetching details for: {tender_url}")
+            fetched = await _fetch_tender_page_details(context, tender_url, tender_ids[tender_url], tiers, parser)
+        if fetched and '_error' not in fetched:
+            for row_data in rows_by_url[tender_url]:
+                row_data['_details'] = fetched
+                enriched += 1
+            if on_details is not None:
+                on_details(tender_url, fetched)
+
+    tasks = [asyncio.create_task(_fetch_one(u)) for u in rows_by_url]
+    try:
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+        logger.warning(f"Detail pre-fetch deadline of {deadline}s hit; {len(pending)} fetches cancelled")
+
+    if len(rows) > max_rows:
+        logger.info(f"Detail pre-fetch capped at {max_rows} of {len(rows)} matching rows")
+    logger.info(f"Pre-fetched details for {enriched} rows ({len(rows_by_url)} detail pages)")
+    return enriched
+
+
+async def scrape_dynamic_page(
+    url: str,
+    search_keyword: Optional[str] = None,
+    max_depth: int = 1,
+    concurrency: int = CRAWL_CONCURRENCY,
+    max_pages: int = CRAWL_MAX_PAGES,
+    time_budget: float = CRAWL_TIME_BUDGET,
+    detail_limit: int = PREFETCH_MAX_ROWS,
+    detail_concurrency: int = PREFETCH_CONCURRENCY,
+    detail_deadline: float = PREFETCH_DEADLINE,
+    parser: Optional[str] = None,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    incremental: bool = False,
+    search_keywords: Optional[List[str]] = None,
+    keyword_concurrency: int = SEARCH_TAB_CONCURRENCY,
+):
     """
     Scrapes a dynamic web page using Playwright with optional keyword search and depth crawling.
     Features:
       - Smart Portal Accelerator: Uses native search boxes on GePNIC/NIC portals
       - Point-to-Point Filtering: Shows only exact keyword matches when searching
+      - Breadth-First Frontier: Each depth level is crawled by `concurrency` pages in parallel,
+        bounded by `max_pages` and a `time_budget` in seconds
+      - Result Pages: after a native search, up to RESULT_PAGE_LIMIT further result pages
+        are walked and their rows merged into the first page's tables; the page carries
+        the walk's throughput under "pagination"
+      - Detail Pre-fetch: Up to `detail_limit` matching rows are enriched concurrently
+        (`detail_concurrency` pages, `detail_deadline` seconds)
+      - `parser` picks the HTML parser backend for this call (default PARSER_BACKEND)
+      - Progress: `on_event(event)` receives each step as it happens (see _emit)
+      - Incremental: every page's table fingerprints are recorded; with `incremental`
+        pages whose tables are unchanged since the last crawl are not extracted or
+        pre-fetched, only new or changed rows are returned, and each page (and the
+        result) carries a `changes` summary
+      - Multi-Keyword: with `search_keywords`, every keyword is crawled in the same portal
+        session, `keyword_concurrency` crawls (tabs) at a time. The portal keeps one search
+        result per session, so the keyword searches themselves (with their result pages and
+        detail pre-fetch) take turns, and with `max_depth` > 1 each keyword's whole crawl
+        does, since deeper pages follow the search's session-bound links. The result has one
+        full result per keyword under "keywords", and progress events carry their "keyword"
+      - Fetch Policy: page loads are retried with jittered backoff within time budgets and
+        fail fast while a portal's circuit breaker is open (see fetch_policy); pages
+        that could not be loaded are listed under "failures" with the kind of error
       - Safety Net: Always returns useful feedback even if no tables found
     """
+
+    def _emit(event_type: str, **fields):
+        """
+        Report progress to `on_event`. Event types: "depth" (a level starts), "visit"
+        (a page is being loaded), "results" (one further page of search results was
+        fetched), "page" (a page's data, tables included, before its detail pre-fetch),
+        "details" (one pre-fetched detail page).
+        """
+        if on_event is None:
+            return
+        try:
+            on_event({"type": event_type, **fields})
+        except Exception as e:
+            logger.warning(f"Progress callback failed on {event_type} event: {e}")
+
+    crawl_options = dict(
+        max_depth=max_depth,
+        concurrency=concurrency,
+        max_pages=max_pages,
+        time_budget=time_budget,
+        detail_limit=detail_limit,
+        detail_concurrency=detail_concurrency,
+        detail_deadline=detail_deadline,
+        parser=parser,
+        incremental=incremental,
+    )
+    # The crawl runs in the portal's registered session, so the detail links it finds
+    # stay usable by later detail and export calls
+    registry = await get_registry()
+    with collect_timings() as timings, timed("scrape"):
+        async with registry.context(url) as context:
+            network_stats = await apply_routing_profile(context)
+            if not search_keywords:
+                result = await _crawl_site(context, url, search_keyword, emit=_emit, **crawl_options)
+            else:
+                keywords = list(dict.fromkeys(k.strip() for k in search_keywords if k and k.strip()))
+                tabs = asyncio.Semaphore(max(1, keyword_concurrency))
+
+                async def _search(keyword: str) -> Dict[str, Any]:
+                    async with tabs:
+                        return await _crawl_site(
+                            context, url, keyword, emit=functools.partial(_emit, keyword=keyword), **crawl_options
+                        )
+
+                per_keyword = await asyncio.gather(*(_search(k) for k in keywords))
+                result = {
+                    "base_url": url,
+                    "search_keywords": keywords,
+                    "total_pages_scraped": sum(r.get("total_pages_scraped", 0) for r in per_keyword),
+                    "keywords": dict(zip(keywords, per_keyword)),
+                }
+    if "error" not in result:
+        result["network"] = network_stats.as_dict()
+        result["timings"] = timings.as_dict()
+    return result
+
+
+async def _crawl_site(
+    context,
+    url: str,
+    search_keyword: Optional[str],
+    max_depth: int,
+    concurrency: int,
+    max_pages: int,
+    time_budget: float,
+    detail_limit: int,
+    detail_concurrency: int,
+    detail_deadline: float,
+    parser: Optional[str],
+    incremental: bool,
+    emit: Callable[..., None],
+) -> Dict[str, Any]:
+    """
+    Crawl `url` breadth-first in `context` for one search keyword (see
+    scrape_dynamic_page for the options). Returns the result, or {"error": traceback}.
+    """
     results: List[Dict[str, Any]] = []
     visited_urls: set = set()
     base_domain = urlparse(url).netloc
+    fetch_tiers: Dict[str, str] = {}
+    failures: List[Dict[str, str]] = []
+    junk = junk_rules(url)
+    fingerprints = get_fingerprint_store()
+    change_totals: Dict[str, int] = {
+        "pages_new": 0, "pages_changed": 0, "pages_unchanged": 0,
+        "rows_new": 0, "rows_changed": 0, "rows_removed": 0,
+    }
+    registry = await get_registry()
+
+    async def _visit(current_url: str, current_depth: int):
+        """Scrape one page. Returns (page_data or None, links to follow at the next depth)."""
+        page_data: Optional[Dict[str, Any]] = None
+        links_to_follow: List[str] = []
+        if current_depth > max_depth or current_url in visited_urls:
+            return page_data, links_to_follow
+
+        parsed = urlparse(current_url)
+        if not parsed.scheme or not parsed.netloc:
+            return page_data, links_to_follow
+
+        # Stay within same domain
+        if parsed.netloc != base_domain:
+            return page_data, links_to_follow
+
+        visited_urls.add(current_url)
+        logger.info(f"Crawling: {current_url} (Depth: {current_depth})")
+        emit("visit", url=current_url, depth=current_depth)
+
+        # A keyword search visit holds the portal's search lock from the native search
+        # until its result rows' details have been pre-fetched: the portal keeps one
+        # search result per session, and the rows' detail links belong to it
+        search_hold = contextlib.AsyncExitStack()
+        try:
+            # Search results depend on the keyword and the live session, so they
+            # always come from the browser; plain page loads go through the cache
+            # and HTTP tiers first
+            content, tier = None, "browser"
+            search_visit = bool(current_depth == 1 and search_keyword)
+            pagination: Optional[Dict[str, Any]] = None
+            if not search_visit:
+                content, tier = await _fetch_without_browser(
+                    context, current_url, max_age=CRAWL_CACHE_TTL, detail_page=False
+                )
+            if content is not None:
+                snapshot = snapshot_from_html(content, parser)
+                readiness = {"waited_ms": 0, "reason": tier}
+            else:
+                if search_visit:
+                    await search_hold.enter_async_context(registry.searching(url))
+                snapshot = await _load_snapshot(
+                    context, current_url, junk, search_keyword if current_depth == 1 else None, parser
+                )
+                if search_visit:
+                    # Broad keywords spill over several result pages; their rows are
+                    # merged into the first page's tables
+                    pagination = await _walk_result_pages(
+                        context, snapshot, current_url, junk, parser,
+                        on_page=lambda number, page_url, rows: emit(
+                            "results", url=current_url, page=number, rows=rows
+                        ),
+                    )
+                readiness = snapshot["readiness"]
+                tier = "browser"
+                if "html" in snapshot and not (current_depth == 1 and search_keyword):
+                    _cache_page(current_url, snapshot["html"], detail_page=False)
+            fetch_tiers[current_url] = tier
+            if current_url == url:
+                registry.remember_search(url, search_keyword)
+            title = snapshot["title"]
+
+            # Check for CAPTCHA
+            captcha_detected = snapshot["captcha"]
+            if captcha_detected:
+                logger.warning(f"CAPTCHA detected on {current_url}")
+                if not snapshot["tables"]:
+                    failures.append({"url": current_url, "kind": CAPTCHA, "error": "CAPTCHA challenge instead of content"})
+
+            # Honour <base> for correct relative link resolution
+            base_url_for_links = current_url
+            if snapshot["base_href"] is not None:
+                base_url_for_links = urljoin(current_url, snapshot["base_href"])
+
+            text_content = snapshot["text"]
+
+            # Check for keyword in page text
+            keyword_found: bool = False
+            keyword_context: str = ""
+            relevance_score: int = 0
+            if search_keyword:
+                sk_lower = search_keyword.lower()
+                if sk_lower in text_content.lower():
+                    keyword_found = True
+                    relevance_score += 50
+                    idx = text_content.lower().find(sk_lower)
+                    start = max(0, idx - 50)
+                    end = min(len(text_content), idx + len(search_keyword) + 50)
+                    keyword_context = "..." + text_content[start:end] + "..."
+
+            # Extract metadata
+            description = snapshot["description"]
+            if description is None:
+                description = "No description found"
+
+            # Resolve all links for recursive crawling
+            resolved_links: List[str] = []
+            for href in snapshot["links"]:
+                link = href.strip()
+                if not link or link.startswith('#') or link.startswith('javascript:'):
+                    continue
+                full_url = urljoin(current_url, link)
+                if full_url.startswith('http'):
+                    resolved_links.append(full_url)
+
+            logger.debug(f"Resolved {len(resolved_links)} links from {current_url}")
+
+            # Tables with point-to-point filtering
+            tables_data: List[Dict[str, Any]] = []
+            matched_groups: List[List[Dict[str, Any]]] = []
+            page_changes: Optional[Dict[str, Any]] = None
+            previous = fingerprints.get(current_url, search_keyword)
+            # Layout tables are left out: only HTML snapshots carry them, and the same
+            # page must fingerprint alike whichever tier served it
+            page_print = page_fingerprint([t for t in snapshot["tables"] if not _is_layout_table(t, junk)])
+            if incremental and previous is not None and previous["page"] == page_print:
+                # Same table text as last crawl: nothing to extract or pre-fetch
+                page_changes = {
+                    "status": "unchanged", "tables_unchanged": len(previous["tables"]), "tables_changed": 0,
+                    "rows_new": 0, "rows_changed": 0, "rows_removed": 0,
+                }
+                logger.info(f"Tables unchanged since last crawl on {current_url}")
+            else:
+                try:
+                    logger.info(f"Found {len(snapshot['tables'])} candidate tables on {current_url}")
+                    tables_data, matched_groups = _build_tables(
+                        snapshot["tables"], base_url_for_links, junk, search_keyword
+                    )
+                    relevance_score += sum(t["relevance"] for t in tables_data)
+                    logger.info(f"Extracted {len(tables_data)} relevant tables from {current_url}")
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=['--disable-dev-shm-usage', '--no-sandbox']
-        )
-        context = await browser.new_context(
-            user_agent=random.choice(USER_AGENTS),
-            viewport={'width': 1920, 'height': 1080}
-        )
-
-        async def _crawl(current_url: str, current_depth: int):
-            if current_depth > max_depth or current_url in visited_urls:
-                return
+                    if incremental:
+                        tables_data, table_prints, counts = diff_tables(tables_data, previous)
+                        kept_rows = {id(r) for t in tables_data for r in t["data"]}
+                        matched_groups = [[r for r in group if id(r) in kept_rows] for group in matched_groups]
+                        page_changes = {"status": "new" if previous is None else "changed", **counts}
+                    else:
+                        table_prints = table_fingerprints(tables_data)
+                    fingerprints.put(current_url, search_keyword, page_print, table_prints)
 
-            parsed = urlparse(current_url)
-            if not parsed.scheme or not parsed.netloc:
-                return
+                except Exception as table_err:
+                    logger.error(f"Table extraction error on {current_url}: {table_err}")
+            if page_changes is not None:
+                change_totals["pages_" + page_changes["status"]] += 1
+                for counter in ("rows_new", "rows_changed", "rows_removed"):
+                    change_totals[counter] += page_changes[counter]
+
+            page_data = {
+                "url": current_url,
+                "depth": current_depth,
+                "title": title,
+                "description": description,
+                "keyword_found": keyword_found,
+                "relevance_score": relevance_score,
+                "keyword_context": keyword_context,
+                "content_length": len(text_content),
+                "links_found": len(resolved_links),
+                "tables_found": len(tables_data),
+                "captcha_detected": captcha_detected,
+                "extracted_tables": tables_data,
+                "text_snippet": text_content[:500] + "...",
+                "ready_wait_ms": readiness["waited_ms"],
+            }
+            if incremental:
+                page_data["changes"] = page_changes
+            if pagination is not None:
+                page_data["pagination"] = pagination
+            count("pages")
+            if not (current_depth == 1 and search_keyword):
+                # Keyword result pages are not indexed: they would replace the plain page's text
+                get_search_index().index_page(current_url, title, text_content, relevance_score)
+
+            # Only keep pages with relevant content when searching
+            if search_keyword and not (keyword_found or tables_data):
+                page_data = None
+            else:
+                emit("page", page=page_data)
+
+            # PRE-FETCH: Visit the matching tenders' detail pages while the session
+            # is still alive; rows are enriched in place. All of the page's matched tables
+            # share one row cap and one deadline
+            try:
+                matched_rows = [row for group in matched_groups for row in group]
+                if matched_rows:
+                    with timed("prefetch"):
+                        await _prefetch_row_details(
+                            context, matched_rows,
+                            max_rows=detail_limit,
+                            concurrency=detail_concurrency,
+                            deadline=detail_deadline,
+                            tiers=fetch_tiers,
+                            parser=parser,
+                            on_details=lambda tender_url, details: emit(
+                                "details", page_url=current_url, url=tender_url, details=details
+                            ),
+                        )
+            except Exception as prefetch_err:
+                logger.error(f"Detail pre-fetch error on {current_url}: {prefetch_err}")
+            await search_hold.aclose()
+
+            # Links for the next depth level
+            if current_depth < max_depth:
+                priority_links: List[str] = []
+                other_links: List[str] = []
+
+                nav_keywords = ['tender', 'bid', 'latest', 'active', 'result', 'award', 'procurement']
+                for link in resolved_links:
+                    if any(k in link.lower() for k in nav_keywords):
+                        priority_links.append(link)
+                    else:
+                        other_links.append(link)
 
-            # Stay within same domain
-            if parsed.netloc != base_domain:
-                return
+                links_to_follow = (priority_links + other_links)[:15]
 
-            visited_urls.add(current_url)
-            logger.info(f"Crawling: {current_url} (Depth: {current_depth})")
+        except Exception as e:
+            logger.error(f"Error crawling {current_url}: {str(e)}")
+            failures.append({"url": current_url, "kind": classify_exception(e), "error": str(e)[:300]})
+        finally:
+            await search_hold.aclose()
+        return page_data, links_to_follow
+
+    async def _crawl_frontier():
+        """
+        Breadth-first crawl. Each depth level is drained from an asyncio queue by a
+        bounded set of workers sharing this context; the next level is assembled in
+        parent order so results do not depend on which page finished first.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_budget
+        level: List[str] = [url]
+        queued: set = {url}
+        pages_claimed = 0
+        depth = 1
+
+        while level and depth <= max_depth:
+            emit("depth", depth=depth, urls=len(level))
+            queue: asyncio.Queue = asyncio.Queue()
+            for position, level_url in enumerate(level):
+                queue.put_nowait((position, level_url))
+            page_slots: List[Optional[Dict[str, Any]]] = [None] * len(level)
+            child_slots: List[List[str]] = [[] for _ in level]
+
+            async def _worker():
+                nonlocal pages_claimed
+                while not queue.empty():
+                    position, level_url = queue.get_nowait()
+                    if pages_claimed >= max_pages:
+                        return
+                    pages_claimed += 1
+                    page_slots[position], child_slots[position] = await _visit(level_url, depth)
+
+            workers = [asyncio.create_task(_worker()) for _ in range(max(1, min(concurrency, len(level))))]
+            try:
+                done, pending = await asyncio.wait(workers, timeout=max(0.0, deadline - loop.time()))
+            except asyncio.CancelledError:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                raise
+            for task in done:
+                if task.exception():
+                    logger.error(f"Crawl worker failed at depth {depth}: {task.exception()}")
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+            results.extend(p for p in page_slots if p is not None)
+            if pending:
+                logger.warning(f"Crawl time budget of {time_budget}s exhausted at depth {depth}")
+                break
+            if pages_claimed >= max_pages:
+                logger.info(f"Crawl page limit of {max_pages} reached at depth {depth}")
+                break
+
+            next_level: List[str] = []
+            for children in child_slots:
+                for child in children:
+                    if child not in queued and urlparse(child).netloc == base_domain:
+                        queued.add(child)
+                        next_level.append(child)
+            level = next_level
+            depth += 1
 
-            page = await context.new_page()
-            captcha_detected = False
+    try:
+        # Pages below the search result are reached through its session-bound links,
+        # which resolve against whatever search the session ran last: a keyword crawl
+        # that goes deeper keeps the portal's search lock until it is done
+        async with contextlib.AsyncExitStack() as crawl_hold:
+            if search_keyword and max_depth > 1:
+                await crawl_hold.enter_async_context(registry.searching(url))
+            await _crawl_frontier()
+
+        # Sort all pages by relevance score
+        results.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
+
+        # SAFETY NET: Always return something useful
+        if not results and incremental and change_totals["pages_unchanged"]:
+            logger.info("Nothing changed since the last crawl. Returning informative stub.")
+            results.append({
+                "url": url,
+                "title": "No Changes Since Last Crawl",
+                "description": (
+                    f"The scraper explored {len(visited_urls)} page(s) starting from {url}; "
+                    f"{change_totals['pages_unchanged']} of them list exactly the same tenders as last time."
+                ),
+                "keyword_found": False,
+                "relevance_score": 0,
+                "captcha_detected": False,
+                "extracted_tables": []
+            })
+        if not results:
+            logger.info("No matching pages found. Returning informative stub.")
+            results.append({
+                "url": url,
+                "title": "Search Completed - No Matches Found",
+                "description": (
+                    f"The scraper explored {len(visited_urls)} page(s) starting from {url} "
+                    f"but could not find any tables matching '{search_keyword}'. "
+                    "This may be due to a CAPTCHA, session requirement, or the tender ID is not listed in the currently accessible pages."
+                ),
+                "keyword_found": False,
+                "relevance_score": 0,
+                "captcha_detected": False,
+                "extracted_tables": []
+            })
+
+        result = {
+            "base_url": url,
+            "total_pages_scraped": len(results),
+            "pages": results,
+            "fetch_tiers": _tier_summary(fetch_tiers),
+            "failures": failures,
+        }
+        if incremental:
+            result["changes"] = change_totals
+        return result
+
+    except Exception:
+        import traceback
+        error_msg = traceback.format_exc()
+        logger.error(f"Scraping error: {error_msg}")
+        return {"error": error_msg}
+
+async def search_portal_keywords(
+    url: str,
+    keywords: List[str],
+    parser: Optional[str] = None,
+    keyword_pause: Tuple[float, float] = (0.0, 0.0),
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Run several keywords through one portal's native search in a single registered
+    session (one browser context), waiting a random `keyword_pause` (min, max seconds)
+    between searches. Returns the exactly matching rows per keyword; keywords whose
+    search failed are left out.
+    """
+    junk = junk_rules(url)
+    hits: Dict[str, List[Dict[str, Any]]] = {}
+    registry = await get_registry()
+    async with registry.context(url) as context:
+        await apply_routing_profile(context)
+        for position, keyword in enumerate(keywords):
+            if position:
+                await asyncio.sleep(random.uniform(*keyword_pause))
             try:
-                await page.goto(current_url, wait_until="networkidle", timeout=60000)
-
-                # ================================================================
-                # SMART PORTAL ACCELERATOR
-                # On the first page, try to use the portal's native search box.
-                # This is specifically tuned for GePNIC / etenders.gov.in portals.
-                # ================================================================
-                if current_depth == 1 and search_keyword:
-                    try:
-                        # Selectors verified by live testing on etenders.gov.in
-                        search_selectors = [
-                            'input.textbox2',           # GePNIC Standard quick search
-                            'input[id*="SearchKeyword"]',
-                            'input[title*="Search"]',
-                            'input#SearchKeyword'
-                        ]
-
-                        found_search = False
-                        for selector in search_selectors:
-                            try:
-                                is_visible = await page.is_visible(selector, timeout=2000)
-                                if is_visible:
-                                    logger.info(f"Using native search box: {selector}")
-                                    await page.click(selector)
-                                    await page.fill(selector, search_keyword)
-
-                                    # Try clicking the associated "Go" button first
-                                    go_btn = page.locator('input[value="Go"], input.gobutton')
-                                    if await go_btn.count() > 0 and await go_btn.first.is_visible(timeout=1000):
-                                        await go_btn.first.click()
-                                    else:
-                                        await page.keyboard.press("Enter")
-
-                                    # Wait for results (government sites are slow)
-                                    try:
-                                        await page.wait_for_load_state("networkidle", timeout=15000)
-                                    except Exception:
-                                        pass
-
-                                    found_search = True
-                                    logger.info("Native search submitted successfully.")
-                                    break
-                            except Exception:
-                                continue
-
-                        if not found_search:
-                            # Fallback: look for "Search" or "Tender Search" link in nav
-                            menu_link = page.locator('a:has-text("Search"), a:has-text("Tender Search")')
-                            if await menu_link.count() > 0 and await menu_link.first.is_visible(timeout=1500):
-                                logger.info("Navigating to dedicated Search page.")
-                                await menu_link.first.click()
-                                try:
-                                    await page.wait_for_load_state("networkidle", timeout=8000)
-                                except Exception:
-                                    pass
-
-                                search_page_input = page.locator('input[id*="tenderId"], input[id*="keyword"], input[id*="SearchKeyword"]')
-                                if await search_page_input.count() > 0 and await search_page_input.first.is_visible(timeout=2000):
-                                    await search_page_input.first.fill(search_keyword)
-                                    await page.keyboard.press("Enter")
-                                    try:
-                                        await page.wait_for_load_state("networkidle", timeout=8000)
-                                    except Exception:
-                                        pass
-                                    logger.info("Deep search submitted via Search page.")
-
-                    except Exception as se:
-                        logger.debug(f"Native search accelerator skipped: {se}")
-
-                # Extract content after any navigation
-                content = await page.content()
-                title = await page.title()
-
-                # Check for CAPTCHA
-                if "captcha" in content.lower():
-                    captcha_detected = True
-                    logger.warning(f"CAPTCHA detected on {current_url}")
-
-                soup = BeautifulSoup(content, 'html.parser')
-
-                # Detect <base> tag for correct relative link resolution
-                base_tag = soup.find('base', href=True)
-                base_url_for_links = urljoin(current_url, base_tag['href']) if base_tag else current_url
-
-                text_content = ' '.join(soup.stripped_strings)
-
-                # Check for keyword in page text
-                keyword_found: bool = False
-                keyword_context: str = ""
-                relevance_score: int = 0
-                if search_keyword:
-                    sk_lower = search_keyword.lower()
-                    if sk_lower in text_content.lower():
-                        keyword_found = True
-                        relevance_score += 50
-                        idx = text_content.lower().find(sk_lower)
-                        start = max(0, idx - 50)
-                        end = min(len(text_content), idx + len(search_keyword) + 50)
-                        keyword_context = "..." + text_content[start:end] + "..."
-
-                # Extract metadata
-                meta_description = soup.find("meta", attrs={"name": "description"})
-                description = meta_description["content"] if meta_description else "No description found"
-
-                # Resolve all links for recursive crawling
-                resolved_links: List[str] = []
-                for a in soup.find_all('a', href=True):
-                    link = str(a['href']).strip()
-                    if not link or link.startswith('#') or link.startswith('javascript:'):
-                        continue
-                    full_url = urljoin(current_url, link)
-                    if full_url.startswith('http'):
-                        resolved_links.append(full_url)
+                async with registry.searching(url):
+                    snapshot = await _load_snapshot(context, url, junk, keyword, parser)
+                    await _walk_result_pages(context, snapshot, url, junk, parser)
+                    registry.remember_search(url, keyword)
+                    base_url_for_links = url
+                    if snapshot["base_href"] is not None:
+                        base_url_for_links = urljoin(url, snapshot["base_href"])
+                    _, matched_groups = _build_tables(snapshot["tables"], base_url_for_links, junk, keyword)
+                hits[keyword] = [row for group in matched_groups for row in group]
+                logger.info(f"Search for {keyword!r} on {url}: {len(hits[keyword])} matching rows")
+            except Exception as e:
+                logger.error(f"Search for {keyword!r} on {url} failed: {e}")
+    return hits
 
-                logger.debug(f"Resolved {len(resolved_links)} links from {current_url}")
 
-                # ================================================================
-                # TABLE EXTRACTION WITH POINT-TO-POINT FILTERING
-                # ================================================================
-                tables_data: List[Dict[str, Any]] = []
-                try:
-                    try:
-                        await page.wait_for_selector("table", timeout=5000)
-                    except Exception:
-                        pass
-
-                    soup_tables = soup.find_all('table')
-                    logger.info(f"BS4 found {len(soup_tables)} table tags on {current_url}")
-
-                    # Keywords that indicate layout/nav tables to skip
-                    layout_junk = [
-                        'screen reader', 'skip to main', 'nic chat', 'site compatibility',
-                        'visitor no', 'mis reports', 'tenders by location', 'tenders by organisation',
-                        'tenders by classification', 'tenders in archive', 'tenders status',
-                        'cancelled/retendered', 'debarment list', 'announcements', 'awards', 'downloads',
-                        'help for contractors', 'information about dsc', 'guidelines', 'bidders manual',
-                    ]
-
-                    for i, st in enumerate(soup_tables):
-                        rows = st.find_all('tr')
-                        if not rows or len(rows) < 2:
-                            continue
-
-                        # Identify headers
-                        thead = st.find('thead')
-                        if thead:
-                            header_elements = thead.find_all(['th', 'td'])
-                        else:
-                            header_elements = rows[0].find_all(['th', 'td'])
-
-                        headers = [h.get_text(strip=True) for h in header_elements]
-                        header_string = " ".join(headers).lower()
-                        table_classes = str(st.get('class', '')).lower()
-
-                        # Skip layout tables
-                        if any(jk in header_string for jk in layout_junk) or 'logintext' in table_classes:
-                            nav_count = sum(1 for jk in layout_junk if jk in header_string)
-                            if len(headers) < 2 or nav_count > 2:
-                                continue
-
-                        # Skip if header looks like raw layout text
-                        if len(headers) > 0 and len(headers[0]) > 300:
-                            continue
-
-                        headers = [f"Col_{idx}" if not str(h).strip() else str(h) for idx, h in enumerate(headers)]
-
-                        table_rows: List[Dict[str, Any]] = []
-                        data_rows = rows[1:] if len(rows) > 1 else rows
-
-                        for tr in data_rows:
-                            cols = tr.find_all(['td', 'th'])
-                            if not cols:
-                                continue
-
-                            row_dict: Dict[str, Any] = {}
-                            row_links: Dict[str, Any] = {}
-                            for idx, c in enumerate(cols):
-                                if idx >= len(headers):
-                                    break
-                                header_name = headers[idx]
-
-                                # Better text cleaning
-                                for br in c.find_all("br"):
-                                    br.replace_with("\n")
-                                text = c.get_text(separator=" ", strip=True)
-                                text = " ".join(text.split())
-                                row_dict[header_name] = text
-
-                                # Extract links from cells
-                                a_tag = c.find('a', href=True)
-                                if a_tag:
-                                    link_href = str(a_tag['href']).strip()
-                                    if not link_href.startswith(('javascript:', '#')):
-                                        full_link = urljoin(base_url_for_links, link_href)
-                                        row_links[header_name] = {"url": full_link.replace(" ", "%20")}
-
-                            if row_dict:
-                                row_text_check = " ".join(str(v) for v in row_dict.values()).lower()
-
-                                # Skip navigation rows
-                                if len(row_text_check) < 10:
-                                    continue
-                                if any(jk in row_text_check for jk in ['screen reader', 'updates every', 'click here']):
-                                    continue
-                                if row_text_check in ['next', 'previous', 'none', 'more...']:
-                                    continue
-
-                                row_data: Dict[str, Any] = dict(row_dict)
-                                if row_links:
-                                    row_data["_links"] = row_links
-                                table_rows.append(row_data)
-
-                        if not table_rows:
-                            continue
-
-                        table_text: str = str(table_rows).lower()
-                        table_relevance: int = 0
-
-                        # POINT-TO-POINT FILTERING: When searching, only return exact matches
-                        if search_keyword:
-                            sk_lower = (search_keyword or "").lower()
-
-                            # Skip entire table if it doesn't contain the keyword
-                            if sk_lower not in table_text:
-                                continue
-
-                            # Keep ONLY the rows that contain the exact keyword
-                            exact_match_rows: List[Dict[str, Any]] = []
-                            for r in table_rows:
-                                r_text = " ".join(str(v) for v in r.values()).lower()
-                                if sk_lower in r_text:
-                                    r["_highlight"] = True
-                                    exact_match_rows.append(r)
-
-                            if not exact_match_rows:
-                                continue
-
-                            table_rows = exact_match_rows
-                            table_relevance = 1000  # Max priority for exact matches
-
-                            # PRE-FETCH: Visit each matching tender's detail page
-                            # while the session is still alive (limit to 5 tenders)
-                            for row_data in table_rows[:5]:
-                                if '_links' not in row_data:
-                                    continue
-                                for col_name, link_info in row_data['_links'].items():
-                                    if link_info and 'url' in link_info:
-                                        tender_url = link_info['url']
-                                        logger.info(f"Pre-fetching details for: {tender_url}")
-                                        fetched = await _fetch_tender_page_details(context, tender_url)
-                                        if fetched and '_error' not in fetched:
-                                            row_data['_details'] = fetched
-                                        break  # Only visit first link per row
-
-                        # Secondary relevance for non-keyword searches
-                        tender_patterns = ['tender', 'bid', 'ref', 'opening', 'date', 'id', 'no', 'title', 'organisation']
-                        is_tender_table = any(p in table_text for p in tender_patterns)
-                        if is_tender_table and table_relevance == 0:
-                            table_relevance += 20
-
-                        # Store the table
-                        if table_rows and (table_relevance > 0 or (len(table_rows) > 2 and len(headers) > 2)):
-                            if len(table_rows) > 200:
-                                table_rows = table_rows[:200]
-                            tables_data.append({
-                                "table_index": i,
-                                "row_count": len(table_rows),
-                                "is_likely_tender": is_tender_table,
-                                "relevance": table_relevance,
-                                "data": table_rows
-                            })
-                            relevance_score += table_relevance
-
-                    # Sort tables within page by relevance
-                    if tables_data:
-                        tables_data.sort(key=lambda x: x.get('relevance', 0), reverse=True)
+def _extract_tender_details(content: str, parser: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Extract every field from a rendered tender details page using five strategies:
+    table cell pairs, "Label: Value" text, heading + following content, data attributes,
+    and a plain-text fallback when the others find fewer than five fields.
 
-                    logger.info(f"Extracted {len(tables_data)} relevant tables from {current_url}")
+    All strategies read element text from one TextIndex built in a single walk of the
+    tree, so nested layout elements never rebuild the same text; the results are the
+    same as calling get_text/find_next on each element.
+    """
+    count("html_bytes", len(content))
+    with timed("parse"):
+        return _tender_details_from_soup(make_soup(content, parser))
+
+
+def _tender_details_from_soup(soup) -> Dict[str, Any]:
+    index = TextIndex(soup)
+    all_data = {}
+    normalized: Dict[int, str] = {}
+
+    def _cell_text(cell) -> str:
+        key = id(cell)
+        if key not in normalized:
+            normalized[key] = " ".join(index.text(cell).split())
+        return normalized[key]
+
+    # ========== STRATEGY 1: Extract from visible tables ==========
+    logger.info("Looking for tables...")
+
+    # Rows of nested tables are reached through their outermost table; visiting them
+    # again from the inner table only repeats pairs that are already stored
+    covered_until = -1
+    for table in index.find_all(['table']):
+        if index.position(table) < covered_until:
+            continue
+        covered_until = index.subtree_end(table)
+        for row in index.descendants_named(table, ['tr']):
+            cells = index.descendants_named(row, ['td', 'th'])
+            if len(cells) >= 2:
+                # Extract each pair of cells
+                for i in range(0, len(cells) - 1, 2):
+                    if index.text_length(cells[i]) == 0 or index.text_length(cells[i + 1]) == 0:
+                        continue
+                    field = _cell_text(cells[i])
+                    if len(field) > 2 and field not in all_data:
+                        all_data[field] = _cell_text(cells[i + 1])
+
+    # ========== STRATEGY 2: Extract from divs with label-value patterns ==========
+    logger.info("Looking for label-value patterns in divs...")
+
+    # Find all divs and spans with text content
+    for div in index.find_all(['div', 'span', 'p', 'li']):
+        if not 10 < index.text_length(div) < 500:
+            continue
+        text = index.text(div)
+
+        # Look for patterns like "Label: Value"
+        if ':' in text:
+            parts = text.split(':', 1)
+            if len(parts) == 2:
+                label = parts[0].strip()
+                value = parts[1].strip()
+
+                # Filter out too-short labels
+                if len(label) > 3 and len(value) > 1 and label not in all_data:
+                    # Skip if label is just "Label" or clearly not a field name
+                    if not (label.lower() in ['label', 'value', 'item', 'no', 'id', 'name'] and len(label) < 10):
+                        all_data[label] = value[:1000]
+
+    # ========== STRATEGY 3: Extract heading + next content pattern ==========
+    logger.info("Looking for heading + content patterns...")
+
+    for heading in index.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b']):
+        if not 3 < index.text_length(heading) < 150:
+            continue
+        heading_text = index.text(heading)
+
+        # Find next sibling that might be the value
+        next_elem = index.next_named(heading, ['p', 'div', 'span', 'td'])
+        if next_elem and index.text_length(next_elem) > 2 and heading_text not in all_data:
+            all_data[heading_text] = index.text(next_elem, limit=1000)
+
+    # ========== STRATEGY 4: Extract from data attributes ==========
+    logger.info("Looking for data in attributes...")
+
+    for elem in index.tags:  # All elements
+        if not elem.attrs:
+            continue
+        # Check for common data attributes
+        for attr in ['data-value', 'data-label', 'title', 'aria-label']:
+            if elem.has_attr(attr):
+                value = elem.get(attr, '').strip()
+                if value and len(value) > 3:
+                    # Use element text as key if available
+                    key = index.text(elem, limit=50)
+                    if not key:
+                        key = f"Data_{attr}"
+                    if key not in all_data and len(key) > 2:
+                        all_data[key] = value[:1000]
+
+    # ========== STRATEGY 5: Fallback - extract all text in blocks ==========
+    if len(all_data) < 5:
+        logger.warning(f"Only {len(all_data)} data points found, using aggressive fallback...")
+
+        body = soup.find('body')
+        if body:
+            all_text = body.get_text()
+            lines = [l.strip() for l in all_text.split('\n') if l.strip()]
+
+            # Group consecutive lines
+            for i in range(0, len(lines) - 1, 2):
+                line1 = lines[i][:100]
+                line2 = lines[i + 1][:500] if i + 1 < len(lines) else ""
+
+                if line1 and line2 and len(line1) > 5 and len(line2) > 5:
+                    if line1 not in all_data and not any(c.isdigit() for c in line1[:3]):
+                        all_data[line1] = line2
+
+
+    return all_data
+
+
+async def fetch_tender_details_dict(url: str, parser: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Visits a tender details page and extracts all data including dynamically loaded content.
+    Returns a dictionary of all extracted fields.
+    Pages in the page cache, or complete over plain HTTP, are answered without starting
+    a browser. The page is opened in the portal's registered session (see
+    portal_sessions), which is refreshed by replaying the last search when it expired;
+    a pooled browser context is only taken when a page has to be rendered or the
+    session replayed.
+    """
+    if not get_replay_store().enabled:
+        content = get_page_cache().get_any(cache_keys(url))
+        if content is not None:
+            count("cache_hits")
+            logger.info(f"Extracting tender details for {url} (served via cache)")
+            return _extract_tender_details(content, parser)
 
-                except Exception as table_err:
-                    logger.error(f"Table extraction error on {current_url}: {table_err}")
+    network_stats = None
 
-                page_data: Dict[str, Any] = {
-                    "url": current_url,
-                    "depth": current_depth,
-                    "title": title,
-                    "description": description,
-                    "keyword_found": keyword_found,
-                    "relevance_score": relevance_score,
-                    "keyword_context": keyword_context,
-                    "content_length": len(text_content),
-                    "links_found": len(resolved_links),
-                    "tables_found": len(tables_data),
-                    "captcha_detected": captcha_detected,
-                    "extracted_tables": tables_data,
-                    "text_snippet": text_content[:500] + "...",
-                }
+    async def _prepare(context):
+        nonlocal network_stats
+        network_stats = await apply_routing_profile(context)
 
-                # Only keep pages with relevant content when searching
-                if search_keyword:
-                    if keyword_found or tables_data:
-                        results.append(page_data)
-                else:
-                    results.append(page_data)
+    registry = await get_registry()
+    async with registry.lazy_context(url, _prepare) as context:
 
-                await page.close()
+        async def _render() -> str:
+            page = await context.new_page()
+            try:
+                logger.info(f"Fetching tender details from: {url}")
+                await _open_page(page, url, timeout=60)
 
-                # Recursive crawl for next depth
-                if current_depth < max_depth:
-                    priority_links: List[str] = []
-                    other_links: List[str] = []
+                # Session timeout pages are returned as-is and reported by the caller
+                page_content = await page.content()
+                if _session_expired(page_content):
+                    return page_content
 
-                    nav_keywords = ['tender', 'bid', 'latest', 'active', 'result', 'award', 'procurement']
-                    for link in resolved_links:
-                        if any(k in link.lower() for k in nav_keywords):
-                            priority_links.append(link)
-                        else:
-                            other_links.append(link)
+                logger.info("Waiting for dynamic content to load...")
 
-                    links_to_follow = (priority_links + other_links)[:15]
-                    for link_item in links_to_follow:
-                        await _crawl(link_item, current_depth + 1)
+                # Scroll once to trigger lazy loads, then wait until the DOM settles
+                await wait_until_ready(page, url, scroll=True)
 
-            except Exception as e:
-                logger.error(f"Error crawling {current_url}: {str(e)}")
+                # Try to click any expand/details buttons that might exist
+                logger.info("Looking for expandable details...")
+                try:
+                    await page.evaluate("""
+                        () => {
+                            const buttons = document.querySelectorAll('[class*="expand"], [class*="more"], [class*="detail"], button, a');
+                            buttons.forEach((btn, idx) => {
+                                if (idx < 5 && btn.textContent.toLowerCase().includes(('view|more|detail|expand|show').split('|'))) {
+                                    btn.click();
+                                }
+                            });
+                        }
+                    """)
+                    await wait_until_ready(page, url, max_wait_ms=3000)
+                except Exception as e:
+                    logger.debug(f"Could not expand details: {e}")
+
+                logger.info(f"Page loaded (network: {network_stats.as_dict()})")
+                return await page.content()
             finally:
                 try:
                     if not page.is_closed():
@@ -506,218 +1454,20 @@ async def scrape_dynamic_page(url: str, search_keyword: Optional[str] = None, ma
                     pass
 
         try:
-            await _crawl(url, 1)
-
-            # Sort all pages by relevance score
-            results.sort(key=lambda x: x.get('relevance_score', 0), reverse=True)
-
-            # SAFETY NET: Always return something useful
-            if not results:
-                logger.info("No matching pages found. Returning informative stub.")
-                results.append({
-                    "url": url,
-                    "title": "Search Completed - No Matches Found",
-                    "description": (
-                        f"The scraper explored {len(visited_urls)} page(s) starting from {url} "
-                        f"but could not find any tables matching '{search_keyword}'. "
-                        "This may be due to a CAPTCHA, session requirement, or the tender ID is not listed in the currently accessible pages."
-                    ),
-                    "keyword_found": False,
-                    "relevance_score": 0,
-                    "captcha_detected": False,
-                    "extracted_tables": []
-                })
-
-            return {
-                "base_url": url,
-                "total_pages_scraped": len(results),
-                "pages": results
-            }
-
-        except Exception:
-            import traceback
-            error_msg = traceback.format_exc()
-            logger.error(f"Scraping error: {error_msg}")
-            return {"error": error_msg}
-        finally:
-            await browser.close()
+            await _ensure_portal_session(context, url)
+            content, tier = await _fetch_in_session(context, url, _render)
 
-async def fetch_tender_details_dict(url: str) -> Dict[str, Any]:
-    """
-    Visits a tender details page and extracts all data including dynamically loaded content.
-    Returns a dictionary of all extracted fields.
-    """
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=['--disable-dev-shm-usage', '--no-sandbox']
-        )
-        context = await browser.new_context(
-            user_agent=random.choice(USER_AGENTS),
-            viewport={'width': 1920, 'height': 1080}
-        )
-        page = await context.new_page()
-
-        try:
-            logger.info(f"Fetching tender details from: {url}")
-            await page.goto(url, wait_until="networkidle", timeout=120000)
-            
             # Check for session timeout error
-            page_content = await page.content()
-            if "session has timed out" in page_content.lower() or "session expired" in page_content.lower():
+            if _session_expired(content):
                 logger.warning("Session timeout detected!")
                 return {"_error": "Session timeout", "_message": "The session has expired. Please navigate through the search page to refresh your session."}
-            
-            logger.info("Waiting for dynamic content to load...")
-            
-            # Wait for multiple possible selectors where tender data might be
-            content_selectors = [
-                "div[class*='tender']",
-                "div[class*='detail']",
-                "span[class*='label']",
-                "p",
-                "body"
-            ]
-            
-            for selector in content_selectors:
-                try:
-                    await page.wait_for_selector(selector, timeout=10000)
-                    logger.info(f"Found: {selector}")
-                    break
-                except Exception:
-                    continue
-            
-            # Aggressive scrolling to trigger all dynamic loads
-            logger.info("Scrolling page multiple times...")
-            await page.evaluate("""
-                async () => {
-                    for (let i = 0; i < 10; i++) {
-                        window.scrollBy(0, 500);
-                        await new Promise(r => setTimeout(r, 500));
-                    }
-                    window.scrollTo(0, 0);
-                }
-            """)
-            
-            # Wait for all dynamic content
-            await page.evaluate("() => new Promise(r => setTimeout(r, 8000))")
-            
-            # Try to click any expand/details buttons that might exist
-            logger.info("Looking for expandable details...")
-            try:
-                await page.evaluate("""
-                    () => {
-                        const buttons = document.querySelectorAll('[class*="expand"], [class*="more"], [class*="detail"], button, a');
-                        buttons.forEach((btn, idx) => {
-                            if (idx < 5 && btn.textContent.toLowerCase().includes(('view|more|detail|expand|show').split('|'))) {
-                                btn.click();
-                            }
-                        });
-                    }
-                """)
-                await page.evaluate("() => new Promise(r => setTimeout(r, 3000))")
-            except Exception as e:
-                logger.debug(f"Could not expand details: {e}")
-            
-            content = await page.content()
-            soup = BeautifulSoup(content, 'html.parser')
 
-            logger.info(f"Page loaded, extracting content...")
-            all_data = {}
-
-            # ========== STRATEGY 1: Extract from visible tables ==========
-            logger.info("Looking for tables...")
-            tables = soup.find_all('table')
-            
-            if tables:
-                for table_idx, table in enumerate(tables):
-                    rows = table.find_all('tr')
-                    for row in rows:
-                        cells = row.find_all(['td', 'th'])
-                        if len(cells) >= 2:
-                            # Extract each pair of cells
-                            for i in range(0, len(cells) - 1, 2):
-                                field = " ".join(cells[i].get_text(strip=True).split())
-                                value = " ".join(cells[i + 1].get_text(strip=True).split())
-                                if field and value and len(field) > 2:
-                                    if field not in all_data:
-                                        all_data[field] = value
-
-            # ========== STRATEGY 2: Extract from divs with label-value patterns ==========
-            logger.info("Looking for label-value patterns in divs...")
-            
-            # Find all divs and spans with text content
-            for div in soup.find_all(['div', 'span', 'p', 'li']):
-                text = div.get_text(strip=True)
-                
-                # Look for patterns like "Label: Value"
-                if ':' in text and 10 < len(text) < 500:
-                    parts = text.split(':', 1)
-                    if len(parts) == 2:
-                        label = parts[0].strip()
-                        value = parts[1].strip()
-                        
-                        # Filter out too-short labels
-                        if len(label) > 3 and len(value) > 1 and label not in all_data:
-                            # Skip if label is just "Label" or clearly not a field name
-                            if not (label.lower() in ['label', 'value', 'item', 'no', 'id', 'name'] and len(label) < 10):
-                                all_data[label] = value[:1000]
-
-            # ========== STRATEGY 3: Extract heading + next content pattern ==========
-            logger.info("Looking for heading + content patterns...")
-            
-            for heading in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'b']):
-                heading_text = heading.get_text(strip=True)
-                
-                if 3 < len(heading_text) < 150:
-                    # Find next sibling that might be the value
-                    next_elem = heading.find_next(['p', 'div', 'span', 'td'])
-                    if next_elem:
-                        value = next_elem.get_text(strip=True)
-                        if len(value) > 2 and heading_text not in all_data:
-                            all_data[heading_text] = value[:1000]
-
-            # ========== STRATEGY 4: Extract from data attributes ==========
-            logger.info("Looking for data in attributes...")
-            
-            for elem in soup.find_all(True):  # All elements
-                # Check for common data attributes
-                for attr in ['data-value', 'data-label', 'title', 'aria-label']:
-                    if elem.has_attr(attr):
-                        value = elem.get(attr, '').strip()
-                        if value and len(value) > 3:
-                            # Use element text as key if available
-                            key = elem.get_text(strip=True)[:50]
-                            if not key:
-                                key = f"Data_{attr}"
-                            if key not in all_data and len(key) > 2:
-                                all_data[key] = value[:1000]
-
-            # ========== STRATEGY 5: Fallback - extract all text in blocks ==========
-            if len(all_data) < 5:
-                logger.warning(f"Only {len(all_data)} data points found, using aggressive fallback...")
-                
-                body = soup.find('body')
-                if body:
-                    all_text = body.get_text()
-                    lines = [l.strip() for l in all_text.split('\n') if l.strip()]
-                    
-                    # Group consecutive lines
-                    for i in range(0, len(lines) - 1, 2):
-                        line1 = lines[i][:100]
-                        line2 = lines[i + 1][:500] if i + 1 < len(lines) else ""
-                        
-                        if line1 and line2 and len(line1) > 5 and len(line2) > 5:
-                            if line1 not in all_data and not any(c.isdigit() for c in line1[:3]):
-                                all_data[line1] = line2
-
-            return all_data
+            logger.info(f"Extracting tender details for {url} (served via {tier})")
+            return _extract_tender_details(content, parser)
 
         except Exception as e:
             logger.error(f"Error extracting tender details: {e}", exc_info=True)
             return {"_error": str(e)}
-        finally:
-            await browser.close()
 
 
 async def export_tender_details_csv(url: str) -> str:
@@ -725,9 +1475,6 @@ async def export_tender_details_csv(url: str) -> str:
     Visits a tender details page and extracts all data including dynamically loaded content.
     Returns CSV content as string.
     """
-    import csv
-    import io
-
     csv_output = io.StringIO()
     writer = csv.writer(csv_output)
     
@@ -766,162 +1513,205 @@ async def export_tender_details_csv(url: str) -> str:
     return csv_output.getvalue()
 
 
-async def export_all_tenders_with_details_csv(tender_data_list: List[Dict[str, Any]]) -> str:
+def _summarize_tender_page(content: str, parser: Optional[str] = None) -> str:
     """
-    Exports all tenders from search results with enriched details fetched from each tender URL.
-    
+    Condense a rendered tender page's key fields (organisation, type, value,
+    submission, status) into a one-line summary.
+    """
+    count("html_bytes", len(content))
+    with timed("parse"):
+        return _summary_from_soup(make_soup(content, parser))
+
+
+def _summary_from_soup(soup) -> str:
+
+    # Extract key details
+    key_fields = {
+        'Organisation': '(Organisation|Procuring Entity|Ministry|Department)',
+        'Tender Type': '(Tender Type|Type of Tender|Category)',
+        'Estimated Value': '(Estimated Value|Estimated Cost|Budget)',
+        'Bid Submission': '(Bid Submission|Submit.*[Bb]id)',
+        'Status': '(Status|Tender Status)',
+    }
+
+    details_parts = []
+
+    # Extract from tables
+    tables = soup.find_all('table')[:10]  # Limit to first 10 tables
+    for table in tables:
+        rows = table.find_all('tr')
+        for row in rows:
+            cols = row.find_all(['th', 'td'])
+            if len(cols) >= 2:
+                key_text = cols[0].get_text(strip=True).lower()
+                val_text = " ".join(cols[1].get_text(strip=True).split())[:150]  # Limit length
+
+                for field, pattern in key_fields.items():
+                    if re.search(pattern, key_text, re.IGNORECASE) and val_text and field not in str(details_parts):
+                        details_parts.append(f"{field}: {val_text}")
+                        break
+
+    # Extract from structured text if no tables
+    if not details_parts:
+        text_content = soup.get_text()
+        for line in text_content.split('\n')[:50]:  # Check first 50 lines
+            line = line.strip()
+            if ':' in line and len(line) < 300:
+                for field, pattern in key_fields.items():
+                    if re.search(pattern, line, re.IGNORECASE):
+                        details_parts.append(line[:200])
+                        break
+
+    details_summary = " | ".join(details_parts[:3]) if details_parts else "Details extracted"
+    if not details_summary:
+        details_summary = "Available online"
+    return details_summary
+
+
+async def _fetch_tender_summary(
+    context,
+    tender_url: str,
+    idx: int,
+    tender_id: Optional[str] = None,
+    tiers: Optional[Dict[str, str]] = None,
+) -> str:
+    """
+    Fetch one tender page with the shared export context's session and summarise it.
+    Pages in the page cache (by URL or tender ID) or complete over plain HTTP are
+    summarised without opening a browser page; an expired session is refreshed once.
+    """
+    try:
+        content, _ = await _fetch_in_session(
+            context, tender_url, lambda: _render_detail_page(context, tender_url),
+            tender_id=tender_id, tiers=tiers,
+        )
+
+        # Check for session timeout
+        if "session has timed out" in content.lower() or "session expired" in content.lower():
+            logger.warning(f"Session timeout for tender {idx}: {tender_url}")
+            return "Session Expired - Refresh needed"
+
+        return _summarize_tender_page(content)
+
+    except Exception as detail_error:
+        logger.warning(f"Error fetching details for tender {idx}: {detail_error}")
+        return "Details fetch error - see link"
+
+
+def _csv_line(row: List[Any]) -> str:
+    """Format a single CSV record (with trailing line terminator)."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(row)
+    return buffer.getvalue()
+
+
+async def stream_all_tenders_with_details_csv(
+    tender_data_list: List[Dict[str, Any]],
+    concurrency: int = EXPORT_CONCURRENCY,
+) -> AsyncIterator[str]:
+    """
+    Streams the bulk export as CSV lines. Tender pages are fetched by `concurrency`
+    workers sharing one browser context, and each row is yielded as soon as its tender
+    completes, so rows may arrive out of order; the `#` column always carries the
+    tender's position in the input list.
+
     Args:
         tender_data_list: List of tender dictionaries with keys: title, ref, closing, opening, link, url
-    
-    Returns:
-        CSV string with tender data enriched with details
+        concurrency: Number of tender pages fetched in parallel
     """
-    import csv
-    import io
-    
-    csv_output = io.StringIO()
-    writer = csv.writer(csv_output)
-    
     # Define columns: basic info + detailed fields
     headers = ['#', 'Tender Title', 'Ref / Tender ID', 'Closing Date', 'Opening Date', 'Link', 'Details Summary']
-    writer.writerow(headers)
-    
-    logger.info(f"Starting bulk export with details for {len(tender_data_list)} tenders...")
-    
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            args=['--disable-dev-shm-usage', '--no-sandbox']
-        )
-        context = await browser.new_context(
-            user_agent=random.choice(USER_AGENTS),
-            viewport={'width': 1920, 'height': 1080}
-        )
-        
-        for idx, tender in enumerate(tender_data_list, 1):
-            try:
-                tender_url = tender.get('url') or tender.get('link')
-                if not tender_url:
-                    logger.warning(f"Tender {idx} has no URL, skipping details fetch")
-                    writer.writerow([
-                        idx,
-                        tender.get('title', ''),
-                        tender.get('ref', ''),
-                        tender.get('closing', ''),
-                        tender.get('opening', ''),
-                        tender.get('link', ''),
-                        "No URL available"
-                    ])
-                    continue
-                
-                logger.info(f"Fetching details for tender {idx}/{len(tender_data_list)}: {tender_url}")
-                
-                page = await context.new_page()
-                details_summary = ""
-                
+    yield _csv_line(headers)
+
+    total = len(tender_data_list)
+    logger.info(f"Starting bulk export with details for {total} tenders...")
+
+    work: asyncio.Queue = asyncio.Queue()
+    for idx, tender in enumerate(tender_data_list, 1):
+        work.put_nowait((idx, tender))
+    # Bounded so a slow client applies back-pressure instead of rows piling up in memory
+    finished: asyncio.Queue = asyncio.Queue(maxsize=max(1, concurrency) * 2)
+
+    def _row(idx: int, tender: Dict[str, Any], details_summary: str) -> str:
+        return _csv_line([
+            idx,
+            tender.get('title', ''),
+            tender.get('ref', ''),
+            tender.get('closing', ''),
+            tender.get('opening', ''),
+            tender.get('link', ''),
+            details_summary
+        ])
+
+    fetch_tiers: Dict[str, str] = {}
+    # Exported tenders come from one portal search; use that portal's session
+    first_url = next((t.get('url') or t.get('link') for t in tender_data_list if t.get('url') or t.get('link')), None)
+
+    # The browser context is only taken once a tender page has to be rendered or the
+    # session replayed; cached and plain-HTTP pages use the session's stored cookies. A
+    # stale session is replayed when its first page comes back expired
+    network_stats = None
+
+    async def _prepare(context):
+        nonlocal network_stats
+        network_stats = await apply_routing_profile(context)
+
+    registry = await get_registry()
+    async with registry.lazy_context(first_url, _prepare) as context:
+
+        async def _worker():
+            while not work.empty():
+                idx, tender = work.get_nowait()
                 try:
-                    # Navigate to tender details
-                    await page.goto(tender_url, wait_until="networkidle", timeout=45000)
-                    
-                    # Check for session timeout early
-                    content = await page.content()
-                    if "session has timed out" in content.lower() or "session expired" in content.lower():
-                        logger.warning(f"Session timeout for tender {idx}: {tender_url}")
-                        details_summary = "Session Expired - Refresh needed"
+                    tender_url = tender.get('url') or tender.get('link')
+                    if not tender_url:
+                        logger.warning(f"Tender {idx} has no URL, skipping details fetch")
+                        line = _row(idx, tender, "No URL available")
                     else:
-                        # Wait for content to load
-                        try:
-                            await page.wait_for_selector("table, [class*='detail'], [class*='info']", timeout=5000)
-                        except Exception:
-                            pass
-                        
-                        # Additional wait for JS rendering
-                        await page.evaluate("() => new Promise(r => setTimeout(r, 2000))")
-                        
-                        soup = BeautifulSoup(content, 'html.parser')
-                        
-                        # Extract key details
-                        key_fields = {
-                            'Organisation': '(Organisation|Procuring Entity|Ministry|Department)',
-                            'Tender Type': '(Tender Type|Type of Tender|Category)',
-                            'Estimated Value': '(Estimated Value|Estimated Cost|Budget)',
-                            'Bid Submission': '(Bid Submission|Submit.*[Bb]id)',
-                            'Status': '(Status|Tender Status)',
-                        }
-                        
-                        details_parts = []
-                        
-                        # Extract from tables
-                        tables = soup.find_all('table')[:10]  # Limit to first 10 tables
-                        for table in tables:
-                            rows = table.find_all('tr')
-                            for row in rows:
-                                cols = row.find_all(['th', 'td'])
-                                if len(cols) >= 2:
-                                    key_text = cols[0].get_text(strip=True).lower()
-                                    val_text = " ".join(cols[1].get_text(strip=True).split())[:150]  # Limit length
-                                    
-                                    for field, pattern in key_fields.items():
-                                        import re
-                                        if re.search(pattern, key_text, re.IGNORECASE) and val_text and field not in str(details_parts):
-                                            details_parts.append(f"{field}: {val_text}")
-                                            break
-                        
-                        # Extract from structured text if no tables
-                        if not details_parts:
-                            text_content = soup.get_text()
-                            for line in text_content.split('\n')[:50]:  # Check first 50 lines
-                                line = line.strip()
-                                if ':' in line and len(line) < 300:
-                                    for field, pattern in key_fields.items():
-                                        import re
-                                        if re.search(pattern, line, re.IGNORECASE):
-                                            details_parts.append(line[:200])
-                                            break
-                        
-                        details_summary = " | ".join(details_parts[:3]) if details_parts else "Details extracted"
-                        if not details_summary:
-                            details_summary = "Available online"
-                    
-                except Exception as detail_error:
-                    logger.warning(f"Error fetching details for tender {idx}: {detail_error}")
-                    details_summary = "Details fetch error - see link"
-                finally:
-                    try:
-                        await page.close()
-                    except Exception:
-                        pass
-                
-                # Write row with details
-                writer.writerow([
-                    idx,
-                    tender.get('title', ''),
-                    tender.get('ref', ''),
-                    tender.get('closing', ''),
-                    tender.get('opening', ''),
-                    tender.get('link', ''),
-                    details_summary
-                ])
-                
-            except Exception as e:
-                logger.error(f"Error processing tender {idx}: {e}")
-                writer.writerow([
-                    idx,
-                    tender.get('title', ''),
-                    tender.get('ref', ''),
-                    tender.get('closing', ''),
-                    tender.get('opening', ''),
-                    tender.get('link', ''),
-                    f"Error: {str(e)[:100]}"
-                ])
-        
-        await browser.close()
-    
-    logger.info(f"Bulk export with details completed for {len(tender_data_list)} tenders")
-    return csv_output.getvalue()
+                        logger.info(f"Fetching details for tender {idx}/{total}: {tender_url}")
+                        tender_id = find_tender_id(f"{tender.get('ref', '')} {tender.get('title', '')}")
+                        summary = await _fetch_tender_summary(context, tender_url, idx, tender_id, fetch_tiers)
+                        line = _row(idx, tender, summary)
+                except Exception as e:
+                    logger.error(f"Error processing tender {idx}: {e}")
+                    line = _row(idx, tender, f"Error: {str(e)[:100]}")
+                await finished.put(line)
+
+        workers = [asyncio.create_task(_worker()) for _ in range(max(1, min(concurrency, total)))]
+        try:
+            for _ in range(total):
+                yield await finished.get()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    logger.info(
+        f"Bulk export with details completed for {total} tenders "
+        f"(network: {network_stats.as_dict() if network_stats else 'no browser'}, tiers: {_tier_summary(fetch_tiers)['counts']})"
+    )
+
+
+async def export_all_tenders_with_details_csv(tender_data_list: List[Dict[str, Any]]) -> str:
+    """
+    Exports all tenders from search results with enriched details fetched from each tender URL.
+
+    Args:
+        tender_data_list: List of tender dictionaries with keys: title, ref, closing, opening, link, url
+
+    Returns:
+        CSV string with tender data enriched with details
+    """
+    return "".join([line async for line in stream_all_tenders_with_details_csv(tender_data_list)])
 
 
 if __name__ == "__main__":
     url = "https://etenders.gov.in/eprocure/app"
     keyword = "11/OandM/IE/NH-19/2025-2026"
-    print(asyncio.run(scrape_dynamic_page(url, search_keyword=keyword, max_depth=1)))
+
+    async def _main():
+        async with BrowserPool(size=2) as pool:
+            set_default_pool(pool)
+            return await scrape_dynamic_page(url, search_keyword=keyword, max_depth=1)
+
+    print(asyncio.run(_main()))
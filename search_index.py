@@ -0,0 +1,350 @@
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import math
+import os
+import pathlib
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, List, Dict, Any, Tuple
+
+from html_parsing import make_soup
+from page_cache import CACHE_DIR, normalize_url
+
+logger = logging.getLogger(__name__)
+
+# Full-text index (SQLite FTS5, a file of its own) over stored tenders and fetched pages.
+# Writes go through one background thread as pages are scraped; /api/search reads it
+# without touching the portals. An empty SEARCH_INDEX_PATH disables the index.
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "search_index.db")
+# How much the crawler's relevance score (1000 for exact keyword tables, 20 for
+# tender-like tables, +50 for keyword pages) lifts a match, per log unit
+SEARCH_RELEVANCE_WEIGHT = float(os.getenv("SEARCH_RELEVANCE_WEIGHT", "0.5"))
+MAX_RESULTS = 100
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tender_fts USING fts5(
+    title, ref, tender_id, organisation, body,
+    tender_hash UNINDEXED, portal UNINDEXED, url UNINDEXED, closing_raw UNINDEXED,
+    relevance UNINDEXED, boost UNINDEXED, indexed_at UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS page_fts USING fts5(
+    title, body,
+    url UNINDEXED, relevance UNINDEXED, boost UNINDEXED, indexed_at UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+# bm25 column weights: IDs and refs count most, free text least
+_TENDER_RANK = "bm25(tender_fts, 4.0, 8.0, 10.0, 2.0, 1.0)"
+_PAGE_RANK = "bm25(page_fts, 3.0, 1.0)"
+_TERM_RE = re.compile(r'[^\W_]+', re.UNICODE)
+
+
+def _rowid(key: str) -> int:
+    """Stable 60-bit rowid for a document key, so re-indexing replaces the old entry."""
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:15], 16)
+
+
+def _boost(relevance: float) -> float:
+    return math.log1p(max(0.0, relevance or 0.0))
+
+
+def build_match(query: str) -> Optional[str]:
+    """
+    FTS5 MATCH expression for a user query. A single token like a tender ID or ref
+    ("2026_PWD_123456_1", "11/OandM/IE/NH-19") becomes a phrase of its parts; separate
+    words must all match. The last term is a prefix unless the query ends in a space.
+    """
+    terms = _TERM_RE.findall(query.lower())
+    if not terms:
+        return None
+    prefix = "*" if not query.endswith(" ") else ""
+    if len(query.split()) == 1 and len(terms) > 1:
+        return '"' + " ".join(terms) + '"' + prefix
+    return " ".join(f'"{t}"' for t in terms[:-1]) + (" " if len(terms) > 1 else "") + f'"{terms[-1]}"{prefix}'
+
+
+def _html_text(html: str) -> Tuple[str, str]:
+    soup = make_soup(html)
+    for tag in soup(["script", "style", "noscript"]):
+        tag.decompose()
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    return title, " ".join(soup.get_text(" ").split())
+
+
+class SearchIndex:
+    """
+    FTS5 index in its own SQLite file. `index_*` calls only queue work for the writer
+    thread, so they are safe to make from the event loop; `search` reads through a
+    per-thread connection (WAL lets reads run while the writer commits).
+    """
+
+    def __init__(self, path: Optional[str] = SEARCH_INDEX_PATH):
+        self.path = path
+        self._queue: "queue.Queue[Optional[Tuple[str, Any]]]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self.indexed = {"tenders": 0, "pages": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def start(self):
+        if not self.enabled or self._writer is not None:
+            return self
+        conn = self._connect()
+        try:
+            conn.executescript(_SCHEMA)
+            empty = conn.execute(
+                "SELECT (SELECT count(*) FROM tender_fts) + (SELECT count(*) FROM page_fts)"
+            ).fetchone()[0] == 0
+        finally:
+            conn.close()
+        self._writer = threading.Thread(target=self._write_loop, name="search-index", daemon=True)
+        self._writer.start()
+        if empty:
+            self._queue.put(("backfill", None))
+        return self
+
+    def close(self, timeout: float = 10.0):
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join(timeout)
+            self._writer = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ------------------------------------------------------------------
+    # Writes (queued)
+    # ------------------------------------------------------------------
+
+    def index_tenders(self, tenders: List[Dict[str, Any]]):
+        """Queue tender records (tender_store fields plus `data`/`details` JSON and `relevance`)."""
+        if self._writer is not None and tenders:
+            self._queue.put(("tenders", tenders))
+
+    def index_page(self, url: str, title: str, text: str, relevance: float = 0):
+        """Queue a page whose text has already been extracted (crawled listing pages)."""
+        if self._writer is not None and url and text:
+            self._queue.put(("page", (url, title, text, relevance)))
+
+    def index_html(self, url: str, html: str, relevance: float = 0):
+        """Queue a raw HTML page (detail pages); its text is extracted in the writer thread."""
+        if self._writer is not None and url and html:
+            self._queue.put(("html", (url, html, relevance)))
+
+    def _write_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                # Drain whatever else is queued into the same transaction
+                batch = [item]
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(item)
+                try:
+                    with conn:
+                        for kind, payload in batch:
+                            if kind == "flush":
+                                continue
+                            try:
+                                self._apply(conn, kind, payload)
+                            except Exception as e:
+                                logger.error(f"Search index {kind} write failed: {e}", exc_info=True)
+                except sqlite3.Error as e:
+                    logger.error(f"Search index commit failed: {e}")
+                for kind, payload in batch:
+                    if kind == "flush":
+                        payload.set()
+        finally:
+            conn.close()
+
+    def _apply(self, conn: sqlite3.Connection, kind: str, payload: Any):
+        if kind == "tenders":
+            for tender in payload:
+                self._write_tender(conn, tender)
+        elif kind == "page":
+            self._write_page(conn, *payload)
+        elif kind == "html":
+            url, html, relevance = payload
+            title, text = _html_text(html)
+            self._write_page(conn, url, title, text, relevance)
+        elif kind == "backfill":
+            self._backfill(conn)
+
+    def _write_tender(self, conn: sqlite3.Connection, tender: Dict[str, Any]):
+        rowid = _rowid("tender:" + tender["tender_hash"])
+        data = json.loads(tender["data"]) if isinstance(tender.get("data"), str) else (tender.get("data") or {})
+        details = json.loads(tender["details"]) if isinstance(tender.get("details"), str) else (tender.get("details") or {})
+        body = " ".join(
+            [str(v) for k, v in data.items() if not k.startswith('_')]
+            + [f"{k} {v}" for k, v in details.items() if not k.startswith('_')]
+        )
+        relevance = tender.get("relevance") or 0
+        conn.execute("DELETE FROM tender_fts WHERE rowid = ?", (rowid,))
+        conn.execute(
+            "INSERT INTO tender_fts (rowid, title, ref, tender_id, organisation, body, tender_hash, portal, url,"
+            " closing_raw, relevance, boost, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                rowid, tender.get("title") or "", tender.get("ref") or "", tender.get("tender_id") or "",
+                tender.get("organisation") or "", body, tender["tender_hash"], tender.get("portal"),
+                tender.get("url"), tender.get("closing_raw"), relevance, _boost(relevance), time.time(),
+            ),
+        )
+        self.indexed["tenders"] += 1
+
+    def _write_page(self, conn: sqlite3.Connection, url: str, title: str, text: str, relevance: float):
+        rowid = _rowid("url:" + normalize_url(url))
+        conn.execute("DELETE FROM page_fts WHERE rowid = ?", (rowid,))
+        conn.execute(
+            "INSERT INTO page_fts (rowid, title, body, url, relevance, boost, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (rowid, title or "", text, url, relevance, _boost(relevance), time.time()),
+        )
+        self.indexed["pages"] += 1
+
+    def _backfill(self, conn: sqlite3.Connection, cache_dir: str = CACHE_DIR):
+        """
+        Index everything that already exists: cached page snapshots, the committed
+        *.html captures next to them and stored tenders. The captures carry no header,
+        so they are indexed under their file:// URL.
+        """
+        started = time.monotonic()
+        pages = 0
+        for path in sorted(glob.glob(os.path.join(cache_dir, "*.html"))):
+            try:
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    html = f.read()
+            except OSError:
+                continue
+            title, text = _html_text(html)
+            self._write_page(conn, pathlib.Path(path).resolve().as_uri(), title, text, 0)
+            pages += 1
+        for path in glob.glob(os.path.join(cache_dir, "*.html.gz")):
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    header = json.loads(f.readline())
+                    html = f.read()
+            except (OSError, ValueError, EOFError):
+                continue
+            url = header.get("url")
+            if url and (header.get("key") or "").startswith("url:"):
+                title, text = _html_text(html)
+                self._write_page(conn, url, title, text, 0)
+                pages += 1
+
+        tenders = 0
+        try:
+            from database import SessionLocal, ensure_db
+            from models import Tender
+            ensure_db()
+            with SessionLocal() as session:
+                for tender in session.query(Tender).yield_per(500):
+                    self._write_tender(conn, {c.name: getattr(tender, c.name) for c in Tender.__table__.columns})
+                    tenders += 1
+        except Exception as e:
+            logger.warning(f"Search index backfill could not read stored tenders: {e}")
+        logger.info(
+            f"Search index backfilled {pages} cached pages and {tenders} tenders "
+            f"in {time.monotonic() - started:.1f}s"
+        )
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until everything queued so far has been written (for scripts and tests)."""
+        if self._writer is None:
+            return True
+        written = threading.Event()
+        self._queue.put(("flush", written))
+        return written.wait(timeout)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.row_factory = sqlite3.Row
+        return conn
+
+    def search(
+        self,
+        query: str,
+        scope: str = "all",
+        limit: int = 20,
+        portal: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Ranked matches for `query` among tenders and/or pages (`scope`: tenders, pages
+        or all). Rank is bm25 lifted by the crawler's relevance score.
+        """
+        if scope not in ("all", "tenders", "pages"):
+            raise ValueError(f"Unknown scope '{scope}' (expected all, tenders or pages)")
+        started = time.perf_counter()
+        limit = max(1, min(limit, MAX_RESULTS))
+        match = build_match(query or "")
+        result: Dict[str, Any] = {"query": query, "match": match}
+        if match is None:
+            return {**result, "tenders": [], "pages": [], "took_ms": 0.0}
+
+        conn = self._reader()
+        if scope in ("all", "tenders"):
+            portal_filter = "AND portal = ?" if portal else ""
+            rows = conn.execute(
+                f"SELECT tender_hash, portal, title, ref, tender_id, organisation, url, closing_raw, relevance,"
+                f" {_TENDER_RANK} - boost * ? AS rank,"
+                f" snippet(tender_fts, 4, '[', ']', '…', 12) AS snippet"
+                f" FROM tender_fts WHERE tender_fts MATCH ? {portal_filter} ORDER BY rank LIMIT ?",
+                (SEARCH_RELEVANCE_WEIGHT, match, *([portal.lower()] if portal else []), limit),
+            ).fetchall()
+            result["tenders"] = [{**dict(r), "rank": round(r["rank"], 4)} for r in rows]
+        if scope in ("all", "pages"):
+            rows = conn.execute(
+                f"SELECT url, title, relevance, {_PAGE_RANK} - boost * ? AS rank,"
+                f" snippet(page_fts, 1, '[', ']', '…', 16) AS snippet"
+                f" FROM page_fts WHERE page_fts MATCH ? ORDER BY rank LIMIT ?",
+                (SEARCH_RELEVANCE_WEIGHT, match, limit),
+            ).fetchall()
+            result["pages"] = [{**dict(r), "rank": round(r["rank"], 4)} for r in rows]
+        result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "queued": self._queue.qsize(), "indexed": dict(self.indexed)}
+
+
+_default_index: Optional[SearchIndex] = None
+
+
+def set_default_search_index(index: Optional[SearchIndex]):
+    """Install the search index owned by the application lifespan."""
+    global _default_index
+    _default_index = index
+
+
+def get_search_index() -> SearchIndex:
+    """The shared index. Outside the FastAPI lifespan it is not started, so writes are dropped."""
+    global _default_index
+    if _default_index is None:
+        _default_index = SearchIndex()
+    return _default_index
@@ -0,0 +1,489 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Optional, List, Dict, Any, Callable, Iterable
+from urllib.parse import urlparse
+
+from sqlalchemy import func, or_, select
+
+from database import SessionLocal, ensure_db
+from metrics import collect_timings, timed
+from models import Tender, TenderSearch, utcnow
+from page_cache import normalize_url, find_tender_id
+from scraper_engine import scrape_dynamic_page
+from search_index import get_search_index
+
+logger = logging.getLogger(__name__)
+
+# Extracted tender rows are upserted into the `tenders` table after every scrape, and a
+# repeat of a search made within STORE_SEARCH_TTL seconds is answered from the store.
+STORE_ENABLED = os.getenv("TENDER_STORE", "1") != "0"
+STORE_SEARCH_TTL = float(os.getenv("STORE_SEARCH_TTL", "1800"))
+STORE_BATCH_SIZE = int(os.getenv("STORE_BATCH_SIZE", "500"))
+MAX_PAGE_SIZE = 200
+
+# Column names are matched the same way the web UI picks its title/ref/date columns
+_TITLE_KEY = re.compile(r'title|subject|description|tender\s*name|name|item\s*desc', re.I)
+_REF_KEY = re.compile(r'^ref\.?\s*no|reference\s*no|tender\s*id|tender\s*no|ref\s*no|tender\s*ref|bid\s*id|srn', re.I)
+_CLOSING_KEYS = [
+    re.compile(r'bid\s*submission.*(end|closing|close|last|due|upto)', re.I),
+    re.compile(r'(tender|bid).*closing', re.I),
+    re.compile(r'(submission|bid).*(end|last)', re.I),
+    re.compile(r'closing|last\s*date|due\s*date', re.I),
+]
+_OPENING_KEY = re.compile(r'bid\s*opening|opening\s*date|open\s*date', re.I)
+_ORG_KEY = re.compile(r'organi[sz]ation|department|ministry|procuring', re.I)
+_DATE_RE = re.compile(
+    r'\d{1,2}-[A-Za-z]{3}-\d{4}\s+\d{1,2}:\d{2}\s*(?:AM|PM)?|\d{1,2}/\d{1,2}/\d{4}\s+\d{1,2}:\d{2}\s*(?:AM|PM)?'
+    r'|\d{1,2}-[A-Za-z]{3}-\d{4}|\d{1,2}/\d{1,2}/\d{4}|\d{4}-\d{2}-\d{2}(?:\s+\d{2}:\d{2})?',
+    re.I,
+)
+_DATE_FORMATS = (
+    "%d-%b-%Y %I:%M %p", "%d-%b-%Y %H:%M", "%d-%b-%Y",
+    "%d/%m/%Y %I:%M %p", "%d/%m/%Y %H:%M", "%d/%m/%Y",
+    "%Y-%m-%d %H:%M", "%Y-%m-%d",
+)
+# GePNIC prints "[Title] [Ref No][Tender ID]" in one cell
+_BRACKETED_RE = re.compile(r'\[([^\]]*)\]')
+
+def parse_date(text: Optional[str]) -> Optional[datetime.datetime]:
+    """First date in a portal date string ("08-Feb-2026 05:00 PM", "08/02/2026", ...), or None."""
+    match = _DATE_RE.search(text or "")
+    if not match:
+        return None
+    value = " ".join(match.group(0).upper().split())
+    value = re.sub(r'(\d)(AM|PM)$', r'\1 \2', value)
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.title() if "%b" in fmt else value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _find_key(keys: Iterable[str], pattern: re.Pattern, exclude: Optional[re.Pattern] = None) -> Optional[str]:
+    for key in keys:
+        if pattern.search(key) and not (exclude and exclude.search(key)):
+            return key
+    return None
+
+
+def _clean(value: Any, limit: int) -> Optional[str]:
+    text = " ".join(str(value).split()) if value is not None else ""
+    return text[:limit] or None
+
+
+def tender_fields(row: Dict[str, Any], details: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Tender ID, ref, title, organisation, dates and link picked out of a result row (and its details)."""
+    details = details or {}
+    keys = [k for k in row if not k.startswith('_')]
+    row_text = " ".join(str(row[k]) for k in keys)
+
+    title_key = _find_key(keys, _TITLE_KEY)
+    ref_key = _find_key(keys, _REF_KEY, exclude=_TITLE_KEY) or _find_key(keys, _REF_KEY)
+    title = str(row.get(title_key, "")) if title_key else ""
+    ref = str(row.get(ref_key, "")) if ref_key and ref_key != title_key else ""
+
+    bracketed = _BRACKETED_RE.findall(title)
+    if len(bracketed) >= 2:
+        title, ref = bracketed[0], ref or bracketed[1]
+
+    closing_key = next((k for p in _CLOSING_KEYS for k in keys if p.search(k)), None)
+    opening_key = _find_key(keys, _OPENING_KEY)
+    closing_raw = str(row.get(closing_key, "")) if closing_key else ""
+    opening_raw = str(row.get(opening_key, "")) if opening_key else ""
+    dates = _DATE_RE.findall(row_text)
+    if len(dates) >= 3 and not (closing_key and opening_key):
+        # Listing rows that print published, closing and opening dates in sequence
+        closing_raw, opening_raw = closing_raw or dates[1], opening_raw or dates[2]
+
+    org_key = _find_key(keys, _ORG_KEY)
+    organisation = row.get(org_key) if org_key else None
+    if not organisation:
+        detail_org = _find_key(details.keys(), _ORG_KEY)
+        organisation = details.get(detail_org) if detail_org else None
+
+    links = row.get('_links') or {}
+    link = (links.get(title_key) or next(iter(links.values()), None) or {}).get('url')
+
+    return {
+        "tender_id": find_tender_id(row_text) or find_tender_id(details.get("Tender ID", "")),
+        "ref": _clean(ref or details.get("Tender Reference Number"), 255),
+        "title": _clean(title, 5000),
+        "organisation": _clean(organisation, 500),
+        "closing_date": parse_date(closing_raw),
+        "closing_raw": _clean(closing_raw, 100),
+        "opening_raw": _clean(opening_raw, 100),
+        "url": _clean(link, 1000),
+    }
+
+
+def tender_hash(portal: str, fields: Dict[str, Any], row: Dict[str, Any]) -> str:
+    """
+    Stable identity of a tender: its portal plus the GePNIC tender ID, else the ref
+    number, else the row's own text. Session tokens in links never take part.
+    """
+    if fields["tender_id"]:
+        identity = "id:" + fields["tender_id"]
+    elif fields["ref"]:
+        identity = "ref:" + fields["ref"].lower()
+    else:
+        identity = "row:" + " ".join(" ".join(str(row[k]).split()) for k in sorted(row) if not k.startswith('_')).lower()
+    return hashlib.sha256(f"{portal}|{identity}".encode("utf-8")).hexdigest()
+
+
+def _insert_for(dialect: str):
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+    else:
+        raise ValueError(
+            f"DATABASE_URL uses the {dialect} dialect; the tender store supports sqlite, postgresql, mysql and mariadb"
+        )
+    return insert
+
+
+def _upsert_tenders(session, records: List[Dict[str, Any]]):
+    """Insert or update tenders by tender_hash in multi-row statements of STORE_BATCH_SIZE."""
+    dialect = session.get_bind().dialect.name
+    insert = _insert_for(dialect)
+    table = Tender.__table__
+    refreshed = [c for c in records[0] if c not in ("tender_hash", "first_seen_at", "details")]
+    for start in range(0, len(records), STORE_BATCH_SIZE):
+        stmt = insert(table).values(records[start:start + STORE_BATCH_SIZE])
+        if dialect in ("mysql", "mariadb"):
+            new = stmt.inserted
+            stmt = stmt.on_duplicate_key_update(
+                {**{c: new[c] for c in refreshed}, "details": func.coalesce(new.details, table.c.details)}
+            )
+        else:
+            new = stmt.excluded
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["tender_hash"],
+                # A row scraped without its detail page keeps the details stored earlier
+                set_={**{c: new[c] for c in refreshed}, "details": func.coalesce(new.details, table.c.details)},
+            )
+        session.execute(stmt)
+
+
+def save_scrape(
+    result: Dict[str, Any],
+    url: str,
+    search_keyword: Optional[str],
+    max_depth: int,
+    record_search: bool = True,
+) -> Dict[str, Any]:
+    """
+    Upsert every row of a scrape result into `tenders` (one transaction, batched
+    statements) and, with `record_search`, record the search with its page/table
+    layout for later recall.
+    """
+    ensure_db()
+    now = utcnow()
+    records: Dict[str, Dict[str, Any]] = {}
+    relevance: Dict[str, float] = {}
+    layout: List[Dict[str, Any]] = []
+
+    for page in result.get("pages", []):
+        tables = page.get("extracted_tables") or []
+        if not tables:
+            continue
+        portal = urlparse(page.get("url") or url).netloc.lower()
+        page_layout = {k: v for k, v in page.items() if k != "extracted_tables"}
+        page_layout["tables"] = []
+        for table in tables:
+            rows = []
+            for row in table.get("data", []):
+                details = row.get("_details")
+                fields = tender_fields(row, details)
+                key = tender_hash(portal, fields, row)
+                data = {k: v for k, v in row.items() if k not in ("_details", "_highlight", "_change")}
+                previous = records.get(key)
+                records[key] = {
+                    "tender_hash": key,
+                    "portal": portal,
+                    **fields,
+                    "data": json.dumps(data, ensure_ascii=False),
+                    "details": json.dumps(details, ensure_ascii=False) if details else (previous or {}).get("details"),
+                    "first_seen_at": now,
+                    "last_seen_at": now,
+                }
+                relevance[key] = max(relevance.get(key, 0), table.get("relevance") or 0)
+                rows.append([key, bool(row.get("_highlight"))])
+            page_layout["tables"].append({
+                "table_index": table.get("table_index"),
+                "is_likely_tender": table.get("is_likely_tender"),
+                "relevance": table.get("relevance"),
+                "rows": rows,
+            })
+        layout.append(page_layout)
+
+    if not records:
+        return {"tenders": 0, "search_id": None}
+
+    search_id = None
+    with SessionLocal() as session:
+        _upsert_tenders(session, list(records.values()))
+        # Rows scraped without details keep the stored ones; the search index needs them too
+        missing = [key for key, record in records.items() if record["details"] is None]
+        for start in range(0, len(missing), 500):
+            for key, details in session.execute(
+                select(Tender.tender_hash, Tender.details).where(Tender.tender_hash.in_(missing[start:start + 500]))
+            ):
+                records[key]["details"] = details
+        if record_search:
+            search = TenderSearch(
+                url=normalize_url(url),
+                keyword=(search_keyword or "").strip().lower(),
+                max_depth=max_depth,
+                scraped_at=now,
+                row_count=sum(len(t["rows"]) for p in layout for t in p["tables"]),
+                layout=json.dumps(layout, ensure_ascii=False),
+            )
+            session.add(search)
+        session.commit()
+        if record_search:
+            search_id = search.id
+    get_search_index().index_tenders([{**record, "relevance": relevance[key]} for key, record in records.items()])
+    logger.info(f"Stored {len(records)} tenders from {url}" + (f" (search {search_id})" if search_id else ""))
+    return {"tenders": len(records), "search_id": search_id}
+
+
+def _load_tenders(session, hashes: List[str]) -> Dict[str, Tender]:
+    found: Dict[str, Tender] = {}
+    for start in range(0, len(hashes), 500):
+        chunk = hashes[start:start + 500]
+        for tender in session.scalars(select(Tender).where(Tender.tender_hash.in_(chunk))):
+            found[tender.tender_hash] = tender
+    return found
+
+
+def recall_search(
+    url: str,
+    search_keyword: Optional[str],
+    max_depth: int,
+    max_age: float = STORE_SEARCH_TTL,
+) -> Optional[Dict[str, Any]]:
+    """
+    The result of the same search (URL, keyword, depth) made within `max_age` seconds,
+    rebuilt from the store with each row's latest data and details, or None.
+    """
+    ensure_db()
+    since = utcnow() - datetime.timedelta(seconds=max_age)
+    with SessionLocal() as session:
+        search = session.scalars(
+            select(TenderSearch)
+            .where(
+                TenderSearch.url == normalize_url(url),
+                TenderSearch.keyword == (search_keyword or "").strip().lower(),
+                TenderSearch.max_depth == max_depth,
+                TenderSearch.scraped_at >= since,
+            )
+            .order_by(TenderSearch.scraped_at.desc())
+            .limit(1)
+        ).first()
+        if search is None:
+            return None
+        layout = json.loads(search.layout)
+        tenders = _load_tenders(session, list({h for p in layout for t in p["tables"] for h, _ in t["rows"]}))
+
+    pages = []
+    for page_layout in layout:
+        tables = []
+        for table in page_layout.pop("tables"):
+            data = []
+            for key, highlight in table.pop("rows"):
+                tender = tenders.get(key)
+                if tender is None:
+                    continue
+                row = json.loads(tender.data)
+                if highlight:
+                    row["_highlight"] = True
+                if tender.details:
+                    row["_details"] = json.loads(tender.details)
+                data.append(row)
+            tables.append({**table, "row_count": len(data), "data": data})
+        pages.append({**page_layout, "extracted_tables": tables})
+    return {
+        "base_url": url,
+        "total_pages_scraped": len(pages),
+        "pages": pages,
+        "from_store": True,
+        "stored_at": search.scraped_at.isoformat() + "Z",
+        "search_id": search.id,
+    }
+
+
+def _tender_dict(tender: Tender) -> Dict[str, Any]:
+    return {
+        "tender_hash": tender.tender_hash,
+        "portal": tender.portal,
+        "tender_id": tender.tender_id,
+        "ref": tender.ref,
+        "title": tender.title,
+        "organisation": tender.organisation,
+        "closing_date": tender.closing_date.isoformat() if tender.closing_date else None,
+        "closing_raw": tender.closing_raw,
+        "opening_raw": tender.opening_raw,
+        "url": tender.url,
+        "data": json.loads(tender.data),
+        "details": json.loads(tender.details) if tender.details else None,
+        "first_seen_at": tender.first_seen_at.isoformat() + "Z",
+        "last_seen_at": tender.last_seen_at.isoformat() + "Z",
+    }
+
+
+_SORTS = {
+    "closing": (Tender.closing_date.is_(None), Tender.closing_date.asc()),
+    "-closing": (Tender.closing_date.is_(None), Tender.closing_date.desc()),
+    "last_seen": (Tender.last_seen_at.asc(),),
+    "-last_seen": (Tender.last_seen_at.desc(),),
+}
+
+
+def query_tenders(
+    q: Optional[str] = None,
+    portal: Optional[str] = None,
+    organisation: Optional[str] = None,
+    ref: Optional[str] = None,
+    closing_from: Optional[datetime.datetime] = None,
+    closing_to: Optional[datetime.datetime] = None,
+    page: int = 1,
+    page_size: int = 50,
+    sort: str = "-last_seen",
+) -> Dict[str, Any]:
+    """One page of stored tenders matching the filters, plus the total match count."""
+    ensure_db()
+    if sort not in _SORTS:
+        raise ValueError(f"Unknown sort '{sort}' (expected one of {', '.join(_SORTS)})")
+    page = max(1, page)
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    conditions = []
+    if q:
+        pattern = f"%{q.strip()}%"
+        conditions.append(or_(
+            Tender.title.ilike(pattern), Tender.ref.ilike(pattern),
+            Tender.tender_id.ilike(pattern), Tender.organisation.ilike(pattern),
+        ))
+    if portal:
+        conditions.append(Tender.portal == portal.lower())
+    if organisation:
+        conditions.append(Tender.organisation.ilike(f"%{organisation.strip()}%"))
+    if ref:
+        conditions.append(or_(Tender.ref == ref.strip(), Tender.tender_id == ref.strip()))
+    if closing_from:
+        conditions.append(Tender.closing_date >= closing_from)
+    if closing_to:
+        conditions.append(Tender.closing_date <= closing_to)
+
+    with SessionLocal() as session:
+        total = session.scalar(select(func.count()).select_from(Tender).where(*conditions))
+        tenders = session.scalars(
+            select(Tender).where(*conditions).order_by(*_SORTS[sort], Tender.id)
+            .offset((page - 1) * page_size).limit(page_size)
+        ).all()
+        items = [_tender_dict(t) for t in tenders]
+    return {"total": total, "page": page, "page_size": page_size, "items": items}
+
+
+async def _recall(
+    url: str,
+    search_keyword: Optional[str],
+    max_depth: int,
+    on_event: Optional[Callable[[Dict[str, Any]], None]],
+    **event_fields,
+) -> Optional[Dict[str, Any]]:
+    """A stored result for the search (replayed to `on_event` as page events), or None."""
+    try:
+        stored = await asyncio.to_thread(recall_search, url, search_keyword, max_depth)
+    except Exception as e:
+        logger.warning(f"Tender store lookup failed, scraping instead: {e}")
+        return None
+    if stored is not None:
+        logger.info(f"Answering search for {url} ({search_keyword!r}) from the store ({stored['stored_at']})")
+        if on_event is not None:
+            on_event({"type": "store", "stored_at": stored["stored_at"], **event_fields})
+            for page in stored["pages"]:
+                on_event({"type": "page", "page": page, **event_fields})
+    return stored
+
+
+async def _save(result: Dict[str, Any], url: str, search_keyword: Optional[str], max_depth: int, incremental: bool):
+    if not STORE_ENABLED or "error" in result:
+        return
+    try:
+        with timed("store"):
+            result["store"] = await asyncio.to_thread(
+                save_scrape, result, url, search_keyword, max_depth, not incremental
+            )
+    except Exception as e:
+        logger.warning(f"Could not store scrape results for {url}: {e}")
+
+
+async def scrape_with_store(
+    url: str,
+    search_keyword: Optional[str] = None,
+    max_depth: int = 1,
+    refresh: bool = False,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    search_keywords: Optional[List[str]] = None,
+    **scrape_options,
+) -> Dict[str, Any]:
+    """
+    `scrape_dynamic_page` backed by the tender store: a recent identical search is
+    answered from the store unless `refresh` is set, and fresh results are stored.
+    With `search_keywords` this holds per keyword, and only the keywords not answered
+    from the store are searched on the portal (in one session).
+    Incremental scrapes (only new or changed rows) always go to the portal, and their
+    partial results are not recorded as a search. Store failures are logged and never
+    fail the scrape. Fresh results carry the `timings` of the scrape and its storing.
+    """
+    with collect_timings() as timings:
+        incremental = scrape_options.get("incremental", False)
+        use_stored = STORE_ENABLED and not refresh and not incremental
+        if search_keywords:
+            keywords = list(dict.fromkeys(k.strip() for k in search_keywords if k and k.strip()))
+            per_keyword: Dict[str, Dict[str, Any]] = {}
+            if use_stored:
+                for keyword in keywords:
+                    stored = await _recall(url, keyword, max_depth, on_event, keyword=keyword)
+                    if stored is not None:
+                        per_keyword[keyword] = stored
+
+            result: Dict[str, Any] = {"base_url": url}
+            remaining = [k for k in keywords if k not in per_keyword]
+            if remaining:
+                result = await scrape_dynamic_page(
+                    url, max_depth=max_depth, on_event=on_event, search_keywords=remaining, **scrape_options
+                )
+                if "error" in result:
+                    return result
+                for keyword, keyword_result in result["keywords"].items():
+                    await _save(keyword_result, url, keyword, max_depth, incremental)
+                    per_keyword[keyword] = keyword_result
+            result["search_keywords"] = keywords
+            result["keywords"] = {k: per_keyword[k] for k in keywords}
+            result["total_pages_scraped"] = sum(r.get("total_pages_scraped", 0) for r in per_keyword.values())
+            result["timings"] = timings.as_dict()
+            return result
+
+        if use_stored:
+            stored = await _recall(url, search_keyword, max_depth, on_event)
+            if stored is not None:
+                return stored
+
+        result = await scrape_dynamic_page(
+            url, search_keyword=search_keyword, max_depth=max_depth, on_event=on_event, **scrape_options
+        )
+        await _save(result, url, search_keyword, max_depth, incremental)
+        if "error" not in result:
+            result["timings"] = timings.as_dict()
+        return result